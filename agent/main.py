@@ -4,9 +4,14 @@ Infra AI Agent メインスクリプト
 Google Cloud Platform インフラを自律的に運用するAIエージェント
 """
 
+import json
 import os
 import sys
+import time
+from contextlib import nullcontext
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import Dict
 
 # プロジェクトルートをPythonパスに追加
 project_root = Path(__file__).parent.parent
@@ -16,7 +21,33 @@ import click
 import structlog
 from dotenv import load_dotenv
 
-from agent.tools import GCPTools, MonitoringTools
+from agent.tools import (
+    GCPTools,
+    MonitoringTools,
+    BackupTools,
+    CapacityForecaster,
+    TriageEngine,
+    RemediationEngine,
+    ActionExecutor,
+    LogAnalyzer,
+    DriftDetector,
+    Inventory,
+    InventorySync,
+    BaselineStore,
+    ProjectFanOut,
+    SlowQueryAnalyzer,
+    CacheLogAnalyzer,
+    ActionJournal,
+    ErrorBudgetStore,
+)
+from agent.tools.inventory import FileFeedSource, PubSubFeedSource
+from agent.tools.tool_calling import ToolRegistry, ToolSession, AnthropicModel, run_agent
+from agent.tools.scheduler import Scheduler, JobContext
+from agent.tools.projects import resolve_projects
+from agent.tools.log_analysis import download_archives
+from agent.tools.slow_query import CLOUDSQL_SLOW_LOG, iter_logging_entries
+from agent.tools.slo import DEFAULT_OBJECTIVE, SLI_SOURCES, refresh
+from agent.tools.timeseries import align_series, to_epoch
 
 # 環境変数の読み込み
 load_dotenv()
@@ -32,14 +63,76 @@ structlog.configure(
 
 logger = structlog.get_logger()
 
+# 容量予測のしきい値（requirements.md §6.2）
+FORECAST_THRESHOLDS = {
+    'disk': 85.0,
+    'memory': 90.0,
+    'cpu': 80.0,
+}
+
+# LLM に渡すシステムプロンプト
+AGENT_SYSTEM_PROMPT = (
+    "あなたは GCP 上の WordPress ホスティング基盤を運用するSREです。"
+    "ツールで実際の状態とメトリクスを確認してから、原因と対処を日本語で簡潔に答えてください。"
+    "独立した確認は1回の応答でまとめてツールを呼び出してください。"
+)
+
+# 変更操作を記録するジャーナルのディレクトリ
+JOURNAL_DIR = os.getenv('AGENT_JOURNAL_DIR', str(project_root / '.journal'))
+
+# トリアージで突き合わせるメトリクス
+TRIAGE_METRICS = ('cpu', 'memory', 'disk_read', 'disk_write', 'log_errors')
+
+
+def project_fanout(ctx) -> ProjectFanOut:
+    """読み取り系コマンドの対象プロジェクトに対する ProjectFanOut"""
+    return ProjectFanOut(
+        ctx.obj['projects'],
+        per_project=ctx.obj['per_project_concurrency'],
+        metrics_scope=ctx.obj['metrics_scope'],
+    )
+
+
+def parse_labels(ctx, param, value) -> Dict[str, str]:
+    """key=value 形式のラベル条件を辞書にする（click のコールバック）"""
+    labels = {}
+    for label in value:
+        key, sep, label_value = label.partition('=')
+        if not sep or not key.strip():
+            raise click.BadParameter(f"key=value の形式で指定してください: {label}")
+        labels[key.strip()] = label_value.strip()
+    return labels
+
+
+def echo_project_errors(fanout: ProjectFanOut):
+    """失敗したプロジェクトのクエリを標準エラーに表示（結果はそのプロジェクトの分が欠けている）"""
+    for project, errors in fanout.errors.items():
+        click.echo(f"⚠️  {project}: {errors[0]}", err=True)
+
 
 @click.group()
 @click.option('--project-id', envvar='GCP_PROJECT_ID', help='GCPプロジェクトID')
+@click.option('--projects', envvar='GCP_PROJECT_IDS',
+              help='読み取り系コマンドの対象プロジェクト（カンマ区切り、例: wp-dev,wp-prod）')
+@click.option('--folder', help='対象プロジェクトを検索するフォルダID')
+@click.option('--project-label', 'project_labels', multiple=True, callback=parse_labels, help='対象プロジェクトのラベル条件（key=value）')
+@click.option('--metrics-scope', envvar='GCP_METRICS_SCOPE',
+              help='対象プロジェクトを監視対象に含む指標スコープのプロジェクト（メトリクスを1回のクエリで取得）')
+@click.option('--per-project-concurrency', default=2, help='1プロジェクトあたりの同時クエリ数')
 @click.pass_context
-def cli(ctx, project_id):
+def cli(ctx, project_id, projects, folder, project_labels, metrics_scope, per_project_concurrency):
     """Infra AI Agent - GCPインフラ運用AIエージェント"""
     ctx.ensure_object(dict)
+
+    project_ids = [p.strip() for p in (projects or '').split(',') if p.strip()]
+    if folder or project_labels:
+        project_ids = resolve_projects(project_ids, folder, project_labels)
+    project_id = project_id or (project_ids[0] if project_ids else None)
+
     ctx.obj['project_id'] = project_id
+    ctx.obj['projects'] = project_ids or [project_id]
+    ctx.obj['metrics_scope'] = metrics_scope
+    ctx.obj['per_project_concurrency'] = per_project_concurrency
     
     if not project_id:
         click.echo("❌ GCP_PROJECT_ID が設定されていません", err=True)
@@ -53,17 +146,19 @@ def status(ctx):
     """インフラの現在の状態を確認"""
     click.echo("📊 インフラステータスチェック\n")
     
-    project_id = ctx.obj['project_id']
-    gcp_tools = GCPTools(project_id)
+    fanout = project_fanout(ctx)
+    multi = len(fanout.project_ids) > 1
+    if multi:
+        click.echo(f"対象プロジェクト: {', '.join(fanout.project_ids)}\n")
     
     # VMインスタンス一覧
     click.echo("💻 VMインスタンス:")
-    instances = gcp_tools.list_instances()
+    instances = fanout.list_instances()
     
     if instances:
         for instance in instances:
             status_icon = "🟢" if instance['status'] == "RUNNING" else "🔴"
-            click.echo(f"  {status_icon} {instance['name']}")
+            click.echo(f"  {status_icon} {instance['project'] + '/' if multi else ''}{instance['name']}")
             click.echo(f"     状態: {instance['status']}")
             click.echo(f"     タイプ: {instance['machine_type']}")
             click.echo(f"     内部IP: {instance['internal_ip']}")
@@ -75,17 +170,19 @@ def status(ctx):
     
     # Cloud Storage バケット
     click.echo("🪣 Cloud Storage バケット:")
-    buckets = gcp_tools.list_buckets()
+    buckets = fanout.list_buckets()
     
     if buckets:
         for bucket in buckets:
-            click.echo(f"  📦 {bucket['name']}")
+            click.echo(f"  📦 {bucket['name']}" + (f"（{bucket['project']}）" if multi else ""))
             click.echo(f"     ロケーション: {bucket['location']}")
             click.echo(f"     ストレージクラス: {bucket['storage_class']}")
             click.echo()
     else:
         click.echo("  バケットが見つかりません\n")
 
+    echo_project_errors(fanout)
+
 
 @cli.command()
 @click.argument('instance_name')
@@ -143,9 +240,11 @@ def start(ctx, instance_name, zone):
     
     click.echo(f"🚀 {instance_name} を起動中...")
     
-    gcp_tools = GCPTools(project_id)
+    with ActionJournal(JOURNAL_DIR) as journal:
+        gcp_tools = GCPTools(project_id, journal=journal)
+        success = gcp_tools.start_instance(instance_name, zone)
     
-    if gcp_tools.start_instance(instance_name, zone):
+    if success:
         click.echo(f"✅ {instance_name} の起動を開始しました")
     else:
         click.echo(f"❌ {instance_name} の起動に失敗しました", err=True)
@@ -163,15 +262,621 @@ def stop(ctx, instance_name, zone):
     
     click.echo(f"⏸️  {instance_name} を停止中...")
     
-    gcp_tools = GCPTools(project_id)
+    with ActionJournal(JOURNAL_DIR) as journal:
+        gcp_tools = GCPTools(project_id, journal=journal)
+        success = gcp_tools.stop_instance(instance_name, zone)
     
-    if gcp_tools.stop_instance(instance_name, zone):
+    if success:
         click.echo(f"✅ {instance_name} の停止を開始しました")
     else:
         click.echo(f"❌ {instance_name} の停止に失敗しました", err=True)
         sys.exit(1)
 
 
+@cli.command()
+@click.option('--metric', 'metrics', multiple=True, type=click.Choice(sorted(FORECAST_THRESHOLDS)),
+              help='予測するメトリクス（未指定の場合は disk と memory）')
+@click.option('--hours', default=168, help='学習に使う過去データの時間数')
+@click.option('--horizon-days', default=30, help='何日先まで予測するか')
+@click.option('--step', default=900, help='集計間隔（秒）')
+@click.pass_context
+def forecast(ctx, metrics, hours, horizon_days, step):
+    """ディスク・メモリがしきい値に到達する時期を予測"""
+    click.echo("🔮 容量予測\n")
+
+    fanout = project_fanout(ctx)
+    metrics = metrics or ('disk', 'memory')
+    horizon = horizon_days * 86400 // step
+
+    for metric in metrics:
+        threshold = FORECAST_THRESHOLDS[metric]
+        names, _, values = align_series(fanout.get_fleet_series(metric, hours, step), step)
+
+        click.echo(f"📊 {metric}（しきい値 {threshold}%）:")
+        if not names:
+            click.echo("  データがありません\n")
+            continue
+
+        forecaster = CapacityForecaster(step_seconds=step, season_length=86400 // step)
+        report = forecaster.fit(values).report(names, threshold, horizon)
+
+        # 到達が早い順に表示
+        for name, item in sorted(report.items(), key=lambda kv: kv[1]['earliest_hours'] or float('inf')):
+            if item['earliest_hours'] is None:
+                status_icon = "🟢"
+                eta = f"{horizon_days}日以内の到達なし"
+            else:
+                status_icon = "🔴" if item['expected_hours'] is not None else "🟡"
+                expected = f"{item['expected_hours']}h" if item['expected_hours'] is not None else "-"
+                latest = f"{item['latest_hours']}h" if item['latest_hours'] is not None else "-"
+                eta = f"予測 {expected}（{item['earliest_hours']}h 〜 {latest}）"
+            click.echo(f"  {status_icon} {name}: {item['current']:.1f}% → {eta}")
+        click.echo()
+
+    echo_project_errors(fanout)
+
+
+@cli.command()
+@click.option('--instance', 'instance_names', multiple=True,
+              help='対象インスタンス（「プロジェクトID/インスタンス名」も可、未指定の場合は全インスタンス）')
+@click.option('--hours', default=3, help='解析する過去データの時間数')
+@click.option('--step', default=60, help='共通グリッドの間隔（秒）')
+@click.option('--top', default=5, help='表示する候補数')
+@click.pass_context
+def triage(ctx, instance_names, hours, step, top):
+    """メトリクスの相関から障害の原因候補を絞り込む"""
+    click.echo("🩺 障害トリアージ\n")
+
+    fanout = project_fanout(ctx)
+
+    # インスタンス → メトリクス → データポイント
+    # 複数プロジェクトの系列名は「プロジェクトID/インスタンス名[:デバイス]」（どちらの名前にも '/' は含まれない）
+    series = {}
+    for metric in TRIAGE_METRICS:
+        for name, points in fanout.get_fleet_series(metric, hours, step).items():
+            qualified, _, device = name.partition(':')
+            instance = qualified.rpartition('/')[2]
+            if instance_names and instance not in instance_names and qualified not in instance_names:
+                continue
+            series.setdefault(qualified, {})[f"{metric}:{device}" if device else metric] = points
+    echo_project_errors(fanout)
+
+    result = TriageEngine(step_seconds=step).analyze(series)
+    click.echo(f"系列数: {result['series_count']} / グリッド数: {result['grid_points']}\n")
+
+    if not result['ranking']:
+        click.echo("  目立った変化は検出されませんでした")
+        return
+
+    for rank, candidate in enumerate(result['ranking'][:top], 1):
+        first_change = datetime.fromtimestamp(candidate['first_change'], timezone.utc).isoformat()
+        click.echo(f"{rank}. {candidate['instance']}（スコア {candidate['score']}）")
+        click.echo(f"   最初の変化: {candidate['metric']} @ {first_change}")
+        click.echo(f"   変化したメトリクス数: {candidate['changed_metrics']}")
+        for related in candidate['related']:
+            direction = "先行" if related['lag_seconds'] > 0 else "追従" if related['lag_seconds'] < 0 else "同時"
+            click.echo(
+                f"   ↔ {related['series']}: 相関 {related['correlation']:+.2f}"
+                f"（{direction} {abs(related['lag_seconds'])}秒）"
+            )
+        click.echo()
+
+
+@cli.command()
+@click.option('--rules', 'rules_path', type=click.Path(exists=True),
+              default=str(project_root / 'config' / 'remediation-rules.yml'), help='復旧ルール定義（YAML）')
+@click.option('--events', 'events_file', type=click.File('r'), default='-', help='イベント（JSON Lines、デフォルトは標準入力）')
+@click.option('--execute', is_flag=True, help='実際にアクションを実行（未指定の場合は dry-run）')
+@click.pass_context
+def remediate(ctx, rules_path, events_file, execute):
+    """イベントに復旧ルールを適用"""
+    click.echo(f"🛠️  自動復旧{'（実行モード）' if execute else '（dry-run）'}\n")
+
+    project_id = ctx.obj['project_id']
+    journal = ActionJournal(JOURNAL_DIR) if execute else nullcontext()
+    with journal:
+        executor = ActionExecutor(GCPTools(project_id, journal=journal) if execute else None, dry_run=not execute)
+        try:
+            engine = RemediationEngine.from_yaml(rules_path, executor)
+        except ValueError as e:
+            click.echo(f"❌ {e}", err=True)
+            sys.exit(1)
+
+        events = (json.loads(line) for line in events_file if line.strip())
+        for result in engine.process_many(events):
+            if 'suppressed' in result:
+                click.echo(f"  ⏭️  {result['rule']}: {result['action']} {result['resource']}（{result['suppressed']}）")
+            else:
+                status_icon = "✅" if result['success'] else "❌"
+                suffix = "（dry-run）" if result['dry_run'] else ""
+                click.echo(f"  {status_icon} {result['rule']}: {result['action']} {result['resource']}{suffix}")
+
+
+@cli.command('analyze-logs')
+@click.argument('paths', nargs=-1, type=click.Path(exists=True, dir_okay=False))
+@click.option('--bucket', help='ログアーカイブのバケット（指定した場合はダウンロードして解析）')
+@click.option('--prefix', default='', help='アーカイブのオブジェクト名プレフィックス')
+@click.option('--download-dir', type=click.Path(file_okay=False), default='.log-archive', help='ダウンロード先')
+@click.option('--workers', type=int, help='ワーカープロセス数（未指定の場合はCPUコア数）')
+@click.option('--top', default=10, help='上位何件を表示するか')
+@click.pass_context
+def analyze_logs(ctx, paths, bucket, prefix, download_dir, workers, top):
+    """アーカイブされた Nginx アクセスログを集計"""
+    click.echo("📜 アクセスログ解析\n")
+
+    paths = list(paths)
+    if bucket:
+        paths += download_archives(bucket, prefix, download_dir, ctx.obj['project_id'])
+
+    if not paths:
+        click.echo("❌ 解析するログファイルがありません", err=True)
+        sys.exit(1)
+
+    report = LogAnalyzer(workers=workers).analyze(paths).report(top)
+
+    click.echo(f"行数: {report['lines']:,}（解析不能 {report['unparsed']:,}）")
+    click.echo(f"送信バイト数: {report['bytes_sent']:,}\n")
+
+    click.echo("📊 ステータスコード:")
+    for status_code, count in report['status'].items():
+        click.echo(f"  {status_code}: {count:,}")
+
+    latency = report['latency']
+    if latency['count']:
+        click.echo("\n⏱️  応答時間:")
+        click.echo(f"  平均: {latency['mean'] * 1000:.1f}ms")
+        click.echo(f"  p50: {latency['p50'] * 1000:.1f}ms / p95: {latency['p95'] * 1000:.1f}ms / p99: {latency['p99'] * 1000:.1f}ms")
+
+    click.echo("\n🔝 パス:")
+    for path, count in report['top_paths']:
+        click.echo(f"  {count:>10,}  {path}")
+
+    click.echo("\n🔝 クライアント:")
+    for client, count in report['top_clients']:
+        click.echo(f"  {count:>10,}  {client}")
+
+
+@cli.command()
+@click.argument('state_paths', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option('--assets', 'assets_path', type=click.Path(exists=True, dir_okay=False),
+              help='`gcloud asset list --format=json` の出力（未指定の場合は Cloud Asset Inventory から取得）')
+@click.option('--json', 'as_json', is_flag=True, help='結果をJSONで出力')
+@click.pass_context
+def drift(ctx, state_paths, assets_path, as_json):
+    """Terraform state と稼働リソースの差分を検出"""
+    detector = DriftDetector(ctx.obj['project_id'])
+    assets = DriftDetector.load_assets(assets_path) if assets_path else None
+    result = detector.detect(list(state_paths), assets)
+
+    if as_json:
+        click.echo(json.dumps(result, ensure_ascii=False, indent=2, default=str))
+    else:
+        click.echo("🧭 構成ドリフト検出\n")
+        click.echo(f"一致: {result['matched']}")
+
+        for item in result['missing']:
+            click.echo(f"  🔴 欠落: {item['address']}")
+        for item in result['extra']:
+            click.echo(f"  🟡 管理外: {item['type']} {item['resource']}")
+        for item in result['drifted']:
+            click.echo(f"  🟠 差分: {item['address']}")
+            for diff in item['diffs']:
+                click.echo(f"     {diff['attribute']}: {diff['expected']} → {diff['actual']}")
+
+        if result['skipped_types']:
+            click.echo(f"\n比較対象外のタイプ: {', '.join(result['skipped_types'])}")
+
+    if result['missing'] or result['extra'] or result['drifted']:
+        sys.exit(1)
+
+
+@cli.command()
+@click.option('--subscription', help='アセットフィードの Pub/Sub サブスクリプション')
+@click.option('--feed-file', type=click.Path(dir_okay=False), help='変更通知の JSON Lines ファイル（ローカル検証用）')
+@click.option('--resync-interval', default=3600, help='一括取得で整合性を取り直す間隔（秒）')
+@click.option('--duration', type=int, help='同期を続ける秒数（未指定の場合は Ctrl+C まで）')
+@click.option('--snapshot', 'snapshot_path', type=click.Path(dir_okay=False),
+              help='スナップショットの保存先（Ansible インベントリが使う、例: .inventory/snapshot.json）')
+@click.pass_context
+def inventory(ctx, subscription, feed_file, resync_interval, duration, snapshot_path):
+    """アセットフィードでインベントリを差分同期"""
+    if bool(subscription) == bool(feed_file):
+        click.echo("❌ --subscription か --feed-file のどちらかを指定してください", err=True)
+        sys.exit(1)
+
+    project_id = ctx.obj['project_id']
+    source = PubSubFeedSource(subscription, project_id) if subscription else FileFeedSource(feed_file)
+    store = Inventory()
+    sync = InventorySync.from_project(store, source, project_id, resync_interval=resync_interval)
+
+    click.echo("📦 インベントリ同期（Ctrl+C で終了）\n")
+    deadline = time.monotonic() + duration if duration else None
+    saved = time.monotonic()
+    try:
+        while deadline is None or time.monotonic() < deadline:
+            resyncs = sync.stats['resyncs']
+            applied = sync.run_once(timeout=5.0)
+            if applied:
+                running = len(store.instances(status='RUNNING'))
+                click.echo(f"🔄 {len(store)}件（稼働中VM {running}台） 変更反映 {sync.stats['applied']}件")
+            # 変更があったとき以外も定期的に保存し、スナップショットの時点を進める
+            if snapshot_path and (applied or sync.stats['resyncs'] != resyncs or time.monotonic() - saved >= 60):
+                store.save(snapshot_path)
+                saved = time.monotonic()
+    except KeyboardInterrupt:
+        pass
+
+    click.echo(f"\n変更通知: {sync.stats['changes']}件（反映 {sync.stats['applied']}, 古い通知 {sync.stats['stale']}）")
+    click.echo(f"一括取得: {sync.stats['resyncs']}回")
+
+
+@cli.command()
+@click.option('--store', 'store_path', type=click.Path(dir_okay=False),
+              default=str(project_root / '.baselines' / 'metrics.bsl'), help='ベースラインファイル')
+@click.option('--metric', 'metrics', multiple=True, type=click.Choice(sorted(FORECAST_THRESHOLDS)),
+              help='対象メトリクス（未指定の場合は全て）')
+@click.option('--hours', default=24, help='取り込む過去データの時間数（取り込み済みの期間は無視される）')
+@click.option('--check-hours', default=1, help='異常判定する直近の時間数')
+@click.option('--sigma', default=3.0, help='平均から何標準偏差までを正常とするか')
+@click.option('--timezone', 'tz_name', help='曜日・時刻を判定するタイムゾーン（新規作成時のみ、デフォルトは Asia/Tokyo）')
+@click.pass_context
+def baseline(ctx, store_path, metrics, hours, check_hours, sigma, tz_name):
+    """曜日×時刻のベースラインを更新し、直近の値を判定"""
+    click.echo("📐 季節性ベースライン\n")
+
+    try:
+        store = BaselineStore.open(store_path, timezone=tz_name)
+    except ValueError as e:
+        click.echo(f"❌ {e}", err=True)
+        sys.exit(1)
+    fanout = project_fanout(ctx)
+    since = time.time() - check_hours * 3600
+
+    for metric in metrics or sorted(FORECAST_THRESHOLDS):
+        series = {
+            f"{metric}/{name}": points
+            for name, points in fanout.get_fleet_series(metric, hours).items()
+        }
+
+        # 直近の値を取り込む前のプロファイルで判定する
+        click.echo(f"📊 {metric}:")
+        for name, points in sorted(series.items()):
+            recent = [p for p in points if to_epoch(p['timestamp']) >= since]
+            anomalies = store.detect(name, recent, sigma=sigma)
+            if anomalies:
+                worst = max(anomalies, key=lambda a: abs(a['score']))
+                click.echo(
+                    f"  🔴 {name}: {len(anomalies)}件 "
+                    f"(最大 {worst['value']:.1f}, 想定 {worst['low']:.1f}〜{worst['high']:.1f})"
+                )
+        store.update(series)
+        click.echo(f"  {len(series)}系列を更新\n")
+
+    echo_project_errors(fanout)
+    store.save()
+
+
+@cli.command()
+@click.argument('question')
+@click.option('--model', envvar='ANTHROPIC_MODEL', default='claude-sonnet-4-5', help='モデル名')
+@click.option('--allow-actions', is_flag=True, help='インスタンスの起動・停止・リセットをモデルに許可')
+@click.option('--max-turns', default=10, help='最大ターン数')
+@click.pass_context
+def ask(ctx, question, model, allow_actions, max_turns):
+    """LLM にツールを使わせて運用の質問に答えさせる"""
+    project_id = ctx.obj['project_id']
+    # 例外で抜けても書き込み待ちの記録を確定させる
+    with ActionJournal(JOURNAL_DIR) if allow_actions else nullcontext() as journal:
+        registry = ToolRegistry.for_agent(
+            GCPTools(project_id, journal=journal), MonitoringTools(project_id), allow_mutations=allow_actions
+        )
+        with ToolSession(registry) as session:
+            result = run_agent(AnthropicModel(model), session, question, AGENT_SYSTEM_PROMPT, max_turns)
+
+    if result['text'] is None:
+        click.echo(f"❌ {max_turns}ターン以内に回答が得られませんでした", err=True)
+        sys.exit(1)
+
+    click.echo(result['text'])
+    click.echo(
+        f"\n（{result['turns']}ターン, ツール呼び出し {session.stats['calls']}回, "
+        f"実行 {session.stats['executed']}回, メモ {session.stats['cache_hits']}回）"
+    )
+
+
+@cli.command()
+@click.option('--config', 'config_path', type=click.Path(exists=True),
+              default=str(project_root / 'config' / 'schedule.yml'), help='ジョブ定義（YAML）')
+@click.option('--list', 'list_jobs', is_flag=True, help='ジョブと次回予定を表示して終了')
+@click.option('--run', 'run_now', help='指定したジョブを今すぐ1回実行して終了')
+@click.pass_context
+def scheduler(ctx, config_path, list_jobs, run_now):
+    """定期メンテナンスジョブを常駐実行"""
+    # 定義ファイル内の相対パスはリポジトリ直下を基準にする
+    sched = Scheduler.from_yaml(config_path, context=JobContext(ctx.obj['project_id']), base_dir=project_root)
+
+    if run_now:
+        if run_now not in sched.jobs:
+            click.echo(f"❌ 未定義のジョブです: {run_now}", err=True)
+            sys.exit(1)
+        state = sched.run_job(run_now)
+        status_icon = "✅" if state['last_status'] == 'success' else "❌"
+        click.echo(f"{status_icon} {run_now}: {state['last_status']} ({state['last_duration']}秒)")
+        click.echo(f"   {state['last_detail']}")
+        sys.exit(0 if state['last_status'] == 'success' else 1)
+
+    if list_jobs:
+        click.echo("🗓️  定期ジョブ\n")
+        sched.plan()
+        for name, state in sched.state.items():
+            next_run = datetime.fromtimestamp(state['next_run'], sched.tz).strftime('%Y-%m-%d %H:%M:%S')
+            last = state.get('last_status', '-')
+            click.echo(f"  {name}: 次回 {next_run}（前回 {last}）")
+        return
+
+    click.echo(f"🗓️  スケジューラ起動（{len(sched.jobs)}ジョブ, 同時実行 {sched.max_concurrency}）Ctrl+C で終了\n")
+    try:
+        sched.run()
+    except KeyboardInterrupt:
+        click.echo("\n⏹️  実行中のジョブの完了を待って終了します")
+
+
+@cli.command('slow-queries')
+@click.argument('paths', nargs=-1, type=click.Path(exists=True, dir_okay=False))
+@click.option('--from-logging', is_flag=True, help='Cloud Logging のスロークエリログを解析')
+@click.option('--log-name', default=CLOUDSQL_SLOW_LOG, help='ログ名（Ops Agent の場合は mysql_slow）')
+@click.option('--database-id', help='Cloud SQL インスタンス（プロジェクトID:インスタンス名）')
+@click.option('--hours', default=24, help='Cloud Logging から読む過去の時間数')
+@click.option('--database', help='表示するデータベース（未指定の場合は全データベース）')
+@click.option('--sort', default='total_time',
+              type=click.Choice(['total_time', 'count', 'p95', 'p99', 'max_time', 'rows_examined']), help='並べ替えの基準')
+@click.option('--workers', type=int, help='ワーカープロセス数（未指定の場合はCPUコア数）')
+@click.option('--top', default=10, help='上位何件を表示するか')
+@click.option('--json', 'as_json', is_flag=True, help='結果をJSONで出力')
+@click.pass_context
+def slow_queries(ctx, paths, from_logging, log_name, database_id, hours, database, sort, workers, top, as_json):
+    """MySQL スロークエリログをクエリの型ごとに集計"""
+    analyzer = SlowQueryAnalyzer(workers=workers)
+    if from_logging:
+        aggregate = analyzer.analyze_entries(
+            iter_logging_entries(ctx.obj['project_id'], hours, database_id, log_name)
+        )
+        if paths:
+            aggregate.merge(analyzer.analyze(list(paths)))
+    elif paths:
+        aggregate = analyzer.analyze(list(paths))
+    else:
+        click.echo("❌ 解析するログファイルがありません（--from-logging で Cloud Logging から読めます）", err=True)
+        sys.exit(1)
+
+    report = aggregate.report(top, sort, database)
+    if as_json:
+        click.echo(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+
+    click.echo("🐢 スロークエリ解析\n")
+    click.echo(f"件数: {report['entries']:,}（上限超過でまとめた型 {report['folded']:,}）\n")
+
+    click.echo("🗄️  データベース:")
+    for name, totals in report['databases'].items():
+        click.echo(f"  {name}: {totals['count']:,}件 / 合計 {totals['total_time']:.1f}s")
+
+    click.echo(f"\n🔝 クエリの型（{sort} 順）:")
+    for rank, query in enumerate(report['queries'], 1):
+        click.echo(f"{rank}. [{query['database']}] {query['fingerprint'][:200]}")
+        click.echo(
+            f"   {query['count']:,}件 / 合計 {query['total_time']:.1f}s / 平均 {query['avg_time']:.3f}s / "
+            f"p50 {query['p50']:.3f}s / p95 {query['p95']:.3f}s / p99 {query['p99']:.3f}s"
+        )
+        click.echo(f"   検査行数: 平均 {query['rows_examined_avg']:,.0f} / 返却行数: {query['rows_sent']:,}")
+
+
+@cli.command('cache-stats')
+@click.argument('paths', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option('--incremental', is_flag=True, help='前回の続きから読む（読み込み位置を --state に保存）')
+@click.option('--state', 'state_path', type=click.Path(dir_okay=False),
+              default=str(project_root / '.cache-stats' / 'state.json'), help='差分モードの状態ファイル')
+@click.option('--drop-threshold', default=0.1, help='ヒット率の低下とみなす差（0.1 = 10ポイント）')
+@click.option('--min-requests', default=100, help='ヒット率の判定に必要なリクエスト数')
+@click.option('--json', 'as_json', is_flag=True, help='結果をJSONで出力')
+@click.pass_context
+def cache_stats(ctx, paths, incremental, state_path, drop_threshold, min_requests, as_json):
+    """Nginx アクセスログからサイト別のキャッシュヒット率・応答時間を集計"""
+    analyzer = CacheLogAnalyzer(state_path if incremental else None)
+    aggregate, history = analyzer.analyze(list(paths))
+    report = aggregate.report()
+    report['drops'] = history.find_drops(drop_threshold, min_requests)
+
+    if as_json:
+        click.echo(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        click.echo("🗃️  キャッシュ解析\n")
+        click.echo(f"行数: {report['lines']:,}（解析不能 {report['unparsed']:,}）\n")
+
+        def ratio(value):
+            return f"{value * 100:.1f}%" if value is not None else "-"
+
+        def ms(value):
+            return f"{value * 1000:.0f}ms" if value is not None else "-"
+
+        for site, stats in report['sites'].items():
+            latency = stats['latency']
+            click.echo(f"🌐 {site}: {stats['requests']:,}件 / ヒット率 {ratio(stats['hit_ratio'])}")
+            click.echo(f"   p50 {ms(latency['p50'])} / p95 {ms(latency['p95'])} / p99 {ms(latency['p99'])}")
+            for url_class, item in stats['classes'].items():
+                statuses = ' '.join(f"{k}:{v:,}" for k, v in item['status'].items())
+                click.echo(
+                    f"   - {url_class:<8} {item['requests']:>9,}件  ヒット率 {ratio(item['hit_ratio']):>6}  "
+                    f"p95 {ms(item['latency']['p95']):>7}  {statuses}"
+                )
+            click.echo()
+
+        for drop in report['drops']:
+            click.echo(
+                f"🔴 {drop['site']}: ヒット率低下 {ratio(drop['baseline_ratio'])} → {ratio(drop['hit_ratio'])}"
+                f"（{drop['hour']}、{drop['requests']:,}件）"
+            )
+
+    if report['drops']:
+        sys.exit(1)
+
+
+@cli.command('journal')
+@click.option('--resource', help='対象リソース名（例: web-1）')
+@click.option('--hours', default=24, help='過去何時間分を表示するか')
+@click.option('--action', help='操作名（start_instance など）')
+@click.option('--replay', is_flag=True, help='記録した操作を dry-run で再生')
+@click.option('--json', 'as_json', is_flag=True, help='結果をJSONで出力')
+def journal_command(resource, hours, action, replay, as_json):
+    """エージェントが実行した変更操作の記録を表示・再生"""
+    since = time.time() - hours * 3600
+    # 表示・dry-run 再生だけなので、記録中の他のプロセスに触れない読み取り専用で開く
+    with ActionJournal(JOURNAL_DIR, read_only=True) as journal:
+        if replay:
+            records = journal.replay(resource=resource, since=since)
+        else:
+            records = journal.query(resource, since, action=action)
+
+    if as_json:
+        click.echo(json.dumps(records, ensure_ascii=False, indent=2))
+        return
+
+    click.echo(f"📒 操作ジャーナル{'（dry-run 再生）' if replay else ''}\n")
+    if not records:
+        click.echo("  記録がありません")
+        return
+
+    for record in records:
+        when = datetime.fromtimestamp(record['ts'], timezone.utc).astimezone().strftime('%Y-%m-%d %H:%M:%S')
+        if replay:
+            status_icon = "⏭️ " if record.get('skipped') else "✅" if record['success'] else "❌"
+            click.echo(f"  {status_icon} #{record['seq']} {when} {record['recorded_action']} {record['resource']}")
+        else:
+            status_icon = "✅" if record.get('success') else "❌"
+            where = '/'.join(filter(None, (record.get('project'), record.get('zone'))))
+            click.echo(f"  {status_icon} #{record['seq']} {when} {record['action']} {record['resource']}（{where}）")
+            if record.get('error'):
+                click.echo(f"     {record['error']}")
+
+
+@cli.command()
+@click.option('--objective', default=DEFAULT_OBJECTIVE, help='可用性の目標（0.995 = 99.5%）')
+@click.option('--source', 'sources', multiple=True, type=click.Choice(sorted(SLI_SOURCES)),
+              help='SLI の取得元（未指定の場合は全て）')
+@click.option('--store', 'store_path', type=click.Path(dir_okay=False),
+              default=str(project_root / '.slo' / 'state.npz'), help='カウンタの保存先')
+@click.option('--json', 'as_json', is_flag=True, help='結果をJSONで出力')
+@click.pass_context
+def slo(ctx, objective, sources, store_path, as_json):
+    """サイト別の可用性 SLI・エラーバジェット・バーンレートアラート"""
+    # 指標スコープがあれば、その配下の全プロジェクトを1回のクエリで集計する
+    monitoring_tools = MonitoringTools(ctx.obj['metrics_scope'] or ctx.obj['project_id'])
+    store = ErrorBudgetStore.open(store_path)
+    try:
+        refresh(store, monitoring_tools, tuple(sources) or tuple(SLI_SOURCES))
+    except Exception as e:
+        # 取り込み位置を進めずに終了する（次回は同じ期間から取り直す）
+        click.echo(f"❌ SLI の取得に失敗しました: {e}", err=True)
+        sys.exit(1)
+    store.save()
+    results = store.evaluate(objective)
+
+    if as_json:
+        click.echo(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        click.echo(f"🎯 SLO（目標 {objective * 100:.2f}% / 30日）\n")
+
+        def percent(value):
+            return f"{value * 100:.3f}%" if value is not None else "-"
+
+        for name, result in sorted(results.items()):
+            remaining = result['budget_remaining']
+            icon = "🔴" if result['alerts'] else ("🟡" if remaining is not None and remaining < 0.25 else "🟢")
+            click.echo(
+                f"{icon} {name}: SLI {percent(result['sli'])} / バジェット残 "
+                f"{f'{remaining * 100:.1f}%' if remaining is not None else '-'}（{result['total']:,.0f}件）"
+            )
+            burn = result['burn_rates']
+            click.echo("   バーンレート " + ' '.join(
+                f"{window}:{burn[window]:.1f}" if burn[window] is not None else f"{window}:-"
+                for window in ('5m', '1h', '6h', '1d', '3d')
+            ))
+            for alert in result['alerts']:
+                click.echo(
+                    f"   ⚠️  {alert['policy']} ({alert['severity']}): "
+                    f"{alert['long_burn_rate']:.1f}x / {alert['short_burn_rate']:.1f}x > {alert['burn_rate_threshold']}x"
+                )
+
+    if any(alert['severity'] == 'page' for result in results.values() for alert in result['alerts']):
+        sys.exit(1)
+
+
+@cli.command()
+@click.option('--schedule', 'schedule_path', type=click.Path(exists=True), help='バックアップスケジュール定義（YAML）')
+@click.option('--bucket', help='マニフェスト照合・内容検証の対象バケット')
+@click.option('--prefix', help='オブジェクト名のプレフィックス')
+@click.option('--manifest', type=click.Path(exists=True), help='記録済みマニフェスト（JSON）')
+@click.option('--local-dir', type=click.Path(exists=True, file_okay=False), help='ローカルのバックアップディレクトリ')
+@click.option('--content', 'content_objects', multiple=True, help='本体を読み込んで検証するオブジェクト名')
+@click.option('--workers', default=4, help='内容検証の並列読み込み数')
+@click.pass_context
+def backup(ctx, schedule_path, bucket, prefix, manifest, local_dir, content_objects, workers):
+    """バックアップの整合性・鮮度を検証"""
+    if not schedule_path and not (bucket and (manifest or local_dir or content_objects)):
+        click.echo("❌ --schedule か、--bucket と --manifest / --local-dir / --content を指定してください", err=True)
+        sys.exit(1)
+
+    click.echo("🗄️  バックアップ検証\n")
+
+    project_id = ctx.obj['project_id']
+    backup_tools = BackupTools(project_id)
+    failed = False
+
+    # サイトごとの鮮度・サイズ
+    if schedule_path:
+        click.echo("📅 サイト別バックアップ:")
+        for report in backup_tools.check_sites(BackupTools.load_schedule(schedule_path)):
+            status_icon = "🟢" if report['status'] == 'ok' else "🔴"
+            click.echo(f"  {status_icon} {report['site']}: {report['status']}")
+            if 'latest' in report:
+                click.echo(f"     最新: {report['latest']} ({report['age_hours']}時間前, {report['size']} bytes)")
+            for issue in report['issues']:
+                click.echo(f"     ⚠️  {issue}")
+            failed = failed or report['status'] != 'ok'
+        click.echo()
+
+    # チェックサムメタデータの照合
+    if bucket and (manifest or local_dir):
+        expected = (
+            BackupTools.load_manifest(manifest) if manifest
+            else BackupTools.build_local_manifest(local_dir, prefix or '')
+        )
+        result = backup_tools.verify_manifest(bucket, expected, prefix)
+        click.echo("🔐 マニフェスト照合:")
+        click.echo(f"  一致: {len(result['ok'])}")
+        for item in result['mismatched']:
+            click.echo(f"  🔴 不一致: {item['name']} ({', '.join(item['diffs'])})")
+        for name in result['missing']:
+            click.echo(f"  🔴 欠落: {name}")
+        if result['unexpected']:
+            click.echo(f"  マニフェスト外: {len(result['unexpected'])}")
+        click.echo()
+        failed = failed or bool(result['mismatched'] or result['missing'])
+
+    # 本体の再ハッシュ
+    if bucket and content_objects:
+        click.echo("🔍 内容検証:")
+        for name in content_objects:
+            result = backup_tools.verify_content(bucket, name, workers=workers)
+            status_icon = "🟢" if result['status'] == 'ok' else "🔴"
+            click.echo(f"  {status_icon} {name}: {result['status']}")
+            failed = failed or result['status'] != 'ok'
+        click.echo()
+
+    if failed:
+        sys.exit(1)
+
+
 @cli.command()
 @click.pass_context
 def zones(ctx):
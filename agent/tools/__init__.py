@@ -5,6 +5,47 @@ GCP操作、監視、デプロイなどの機能を提供
 
 from .gcp_tools import GCPTools
 from .monitoring import MonitoringTools
+from .backup import BackupTools
+from .forecasting import CapacityForecaster
+from .triage import TriageEngine
+from .remediation import RemediationEngine, RemediationRule, ActionExecutor
+from .log_analysis import LogAnalyzer
+from .drift import DriftDetector
+from .inventory import Inventory, InventorySync
+from .baselines import BaselineStore
+from .tool_calling import ToolRegistry, ToolSession
+from .scheduler import Scheduler
+from .projects import ProjectFanOut
+from .slow_query import SlowQueryAnalyzer
+from .cache_analysis import CacheLogAnalyzer
+from .journal import ActionJournal
+from .slo import ErrorBudgetStore
+from .preflight import Preflight
+from .ansible_inventory import AnsibleInventoryCache
 
-__all__ = ['GCPTools', 'MonitoringTools']
+__all__ = [
+    'GCPTools',
+    'MonitoringTools',
+    'BackupTools',
+    'CapacityForecaster',
+    'TriageEngine',
+    'RemediationEngine',
+    'RemediationRule',
+    'ActionExecutor',
+    'LogAnalyzer',
+    'DriftDetector',
+    'Inventory',
+    'InventorySync',
+    'BaselineStore',
+    'ToolRegistry',
+    'ToolSession',
+    'Scheduler',
+    'ProjectFanOut',
+    'SlowQueryAnalyzer',
+    'CacheLogAnalyzer',
+    'ActionJournal',
+    'ErrorBudgetStore',
+    'Preflight',
+    'AnsibleInventoryCache',
+]
 
@@ -0,0 +1,193 @@
+"""
+Ansible 動的インベントリ
+インベントリのスナップショットから、ansible/inventory/gcp.yml（gcp_compute プラグイン）と
+同じグループ・ホスト変数を持つ Ansible の JSON インベントリを作る
+"""
+
+import os
+import re
+import time
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+import structlog
+
+from .inventory import Inventory, list_assets
+
+logger = structlog.get_logger()
+
+# ansible/inventory/gcp.yml の compose と同じ既定値
+DEFAULT_SSH_USER = 'usr_0xchoux1_gmail_com'
+DEFAULT_SSH_KEY = '~/.ssh/google_compute_engine'
+
+INSTANCE_ASSET_TYPE = 'compute.googleapis.com/Instance'
+
+# スナップショットの既定の保存先
+DEFAULT_SNAPSHOT = Path(__file__).parent.parent.parent / '.inventory' / 'snapshot.json'
+
+# グループ名に使えない文字（Ansible の keyed_groups と同じく '_' に置き換える）
+INVALID_GROUP_CHARS = re.compile(r'[^A-Za-z0-9_]')
+
+
+def safe_group_name(name: str) -> str:
+    """グループ名に使えない文字を '_' に置き換える"""
+    return INVALID_GROUP_CHARS.sub('_', name)
+
+
+def host_vars(record: Dict[str, Any], project_id: str, ssh_user: str = DEFAULT_SSH_USER) -> Dict[str, Any]:
+    """
+    インスタンスのホスト変数（gcp.yml の compose と同じ）
+
+    Args:
+        record: インベントリのインスタンスレコード
+        project_id: GCPプロジェクトID
+        ssh_user: SSH接続ユーザー
+
+    Returns:
+        ホスト変数
+    """
+    name, zone = record['name'], record['zone']
+    return {
+        'ansible_host': name,
+        'gcp_zone': zone,
+        'gcp_project': project_id,
+        'ansible_ssh_common_args': (
+            f'-o ProxyCommand="gcloud compute start-iap-tunnel {name} %p --listen-on-stdin '
+            f'--project={project_id} --zone={zone} --verbosity=warning"'
+        ),
+        'ansible_user': ssh_user,
+        'ansible_ssh_private_key_file': DEFAULT_SSH_KEY,
+        'instance_type': record.get('machine_type'),
+        'gcp_labels': dict(record['labels']),
+        'status': record.get('status'),
+        'internal_ip': record.get('internal_ip'),
+        'external_ip': record.get('external_ip'),
+    }
+
+
+def build_ansible_inventory(
+    inventory: Inventory,
+    project_id: str,
+    region: Optional[str] = None,
+    ssh_user: str = DEFAULT_SSH_USER
+) -> Dict[str, Any]:
+    """
+    Ansible の JSON インベントリ（--list の出力）を作る
+
+    グループは gcp.yml の keyed_groups と同じく zone_<ゾーン>、label_<キー>_<値>、status_<状態>。
+    ホストはインスタンス名で、ホスト変数は _meta.hostvars にまとめて入れる（--host を呼ばせないため）。
+
+    Args:
+        inventory: インベントリ
+        project_id: GCPプロジェクトID
+        region: 対象リージョン（未指定の場合は全ゾーン）
+        ssh_user: SSH接続ユーザー
+
+    Returns:
+        Ansible の JSON インベントリ
+    """
+    groups = {}
+    hostvars = {}
+
+    for record in inventory.instances():
+        zone = record.get('zone') or ''
+        if region and not zone.startswith(f"{region}-"):
+            continue
+
+        name = record['name']
+        hostvars[name] = host_vars(record, project_id, ssh_user)
+        # keyed_groups と同じく、値の無いキーのグループ（status_None など）は作らない
+        keys = [f"{prefix}_{value}" for prefix, value in (('zone', zone), ('status', record.get('status'))) if value]
+        keys += [f"label_{key}_{value}" for key, value in record['labels'].items()]
+        for key in keys:
+            groups.setdefault(safe_group_name(key), []).append(name)
+
+    result = {group: {'hosts': sorted(hosts)} for group, hosts in sorted(groups.items())}
+    result['all'] = {'children': sorted(groups)}
+    result['_meta'] = {'hostvars': hostvars}
+
+    logger.info("Built Ansible inventory", hosts=len(hostvars), groups=len(groups))
+    return result
+
+
+class AnsibleInventoryCache:
+    """
+    スナップショットを使う Ansible インベントリ
+
+    インベントリのスナップショット（`agent.main inventory --snapshot` が差分同期で更新するもの、
+    または前回の一括取得の結果）が ttl 秒以内であればそれを使い、古ければ Cloud Asset Inventory
+    から一括取得してスナップショットを保存し直す（Compute API はインスタンス一覧に使わない）。
+    """
+
+    def __init__(
+        self,
+        project_id: Optional[str] = None,
+        snapshot_path: Optional[str] = None,
+        ttl: float = 300,
+        region: Optional[str] = None,
+        ssh_user: Optional[str] = None
+    ):
+        """
+        初期化
+
+        Args:
+            project_id: GCPプロジェクトID
+            snapshot_path: インベントリのスナップショット
+            ttl: スナップショットの有効期間（秒）
+            region: 対象リージョン
+            ssh_user: SSH接続ユーザー
+        """
+        self.project_id = project_id or os.getenv('GCP_PROJECT_ID')
+        if not self.project_id:
+            raise ValueError("GCP_PROJECT_ID が設定されていません")
+
+        self.snapshot_path = Path(snapshot_path or DEFAULT_SNAPSHOT)
+        self.ttl = ttl
+        self.region = region or os.getenv('GCP_REGION')
+        self.ssh_user = ssh_user or os.getenv('ANSIBLE_SSH_USER', DEFAULT_SSH_USER)
+
+    def snapshot(self, refresh: bool = False) -> Inventory:
+        """
+        期限内のスナップショット（古ければ一括取得して保存し直す）
+
+        Args:
+            refresh: 期限にかかわらず一括取得する
+
+        Returns:
+            Inventory（一括取得に失敗した場合は古いスナップショット）
+        """
+        stale = None
+        if self.snapshot_path.exists():
+            stale = Inventory.load(str(self.snapshot_path))
+            if not refresh and stale.as_of is not None and time.time() - stale.as_of < self.ttl:
+                return stale
+            if not refresh:
+                logger.info("Inventory snapshot expired", path=str(self.snapshot_path), as_of=stale.as_of)
+
+        as_of = time.time()
+        try:
+            assets = list_assets(self.project_id, [INSTANCE_ASSET_TYPE])
+        except Exception as e:
+            if stale is None:
+                raise
+            # 取得できなくても Ansible の実行は止めない（ログは標準エラーに出る）
+            logger.warning("Failed to refresh inventory, using stale snapshot",
+                           path=str(self.snapshot_path), as_of=stale.as_of, error=str(e))
+            return stale
+
+        inventory = Inventory()
+        inventory.resync(assets, as_of)
+        inventory.save(str(self.snapshot_path), as_of)
+        return inventory
+
+    def get(self, refresh: bool = False) -> Dict[str, Any]:
+        """
+        Ansible の JSON インベントリ
+
+        Args:
+            refresh: スナップショットの期限にかかわらず一括取得し直す
+
+        Returns:
+            Ansible の JSON インベントリ
+        """
+        return build_ansible_inventory(self.snapshot(refresh), self.project_id, self.region, self.ssh_user)
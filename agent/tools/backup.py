@@ -0,0 +1,386 @@
+"""
+バックアップ検証ツール
+Cloud Storage 上のバックアップの整合性・鮮度を検証
+"""
+
+import base64
+import hashlib
+import json
+import os
+import statistics
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+import google_crc32c
+import yaml
+from google.cloud import storage
+import structlog
+
+logger = structlog.get_logger()
+
+# 一覧取得時に要求するフィールド（本体はダウンロードしない）
+BLOB_LIST_FIELDS = 'items(name,size,crc32c,md5Hash,updated,generation),nextPageToken'
+
+# ファイルバックアップは1日1回（04:00 JST）なので、猶予込みで26時間
+DEFAULT_MAX_AGE_HOURS = 26
+# 直近バックアップの中央値に対してこの比率を下回ったらサイズ異常
+DEFAULT_MIN_SIZE_RATIO = 0.5
+# サイズ比較に使う過去世代数
+SIZE_HISTORY = 7
+
+
+def _b64(digest: bytes) -> str:
+    """GCSメタデータと同じ base64 表現に変換"""
+    return base64.b64encode(digest).decode('ascii')
+
+
+class BackupTools:
+    """バックアップ検証ツール"""
+
+    def __init__(self, project_id: Optional[str] = None):
+        """
+        初期化
+
+        Args:
+            project_id: GCPプロジェクトID（未指定の場合は環境変数から取得）
+        """
+        self.project_id = project_id or os.getenv('GCP_PROJECT_ID')
+
+        if not self.project_id:
+            raise ValueError("GCP_PROJECT_ID が設定されていません")
+
+        self.client = storage.Client(project=self.project_id)
+        logger.info("BackupTools initialized", project_id=self.project_id)
+
+    # ==================== マニフェスト ====================
+
+    def list_backup_objects(self, bucket_name: str, prefix: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        バックアップオブジェクトのメタデータを一括取得（本体はダウンロードしない）
+
+        Args:
+            bucket_name: バケット名
+            prefix: オブジェクト名のプレフィックス
+
+        Returns:
+            オブジェクト名 → メタデータ の辞書
+        """
+        objects = {}
+        for blob in self.client.list_blobs(bucket_name, prefix=prefix, fields=BLOB_LIST_FIELDS):
+            objects[blob.name] = {
+                'size': blob.size,
+                'crc32c': blob.crc32c,
+                'md5_hash': blob.md5_hash,
+                'updated': blob.updated,
+                'generation': blob.generation,
+            }
+
+        logger.info("Listed backup objects", bucket=bucket_name, prefix=prefix, count=len(objects))
+        return objects
+
+    def record_manifest(self, bucket_name: str, path: str, prefix: Optional[str] = None) -> int:
+        """
+        現在のバケット状態をマニフェストとして記録
+
+        Args:
+            bucket_name: バケット名
+            path: 出力先のマニフェストファイル
+            prefix: オブジェクト名のプレフィックス
+
+        Returns:
+            記録したオブジェクト数
+        """
+        objects = self.list_backup_objects(bucket_name, prefix)
+        manifest = {
+            'bucket': bucket_name,
+            'recorded_at': datetime.now(timezone.utc).isoformat(),
+            'objects': {
+                name: {'size': meta['size'], 'crc32c': meta['crc32c'], 'md5_hash': meta['md5_hash']}
+                for name, meta in objects.items()
+            },
+        }
+        Path(path).write_text(json.dumps(manifest, indent=2, ensure_ascii=False))
+
+        logger.info("Recorded manifest", bucket=bucket_name, path=path, count=len(objects))
+        return len(objects)
+
+    @staticmethod
+    def build_local_manifest(
+        directory: str,
+        prefix: str = '',
+        chunk_size: int = 8 * 1024 * 1024
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        ローカルのバックアップファイルからマニフェストを作成
+
+        Args:
+            directory: バックアップファイルのディレクトリ（相対パスがオブジェクト名になる）
+            prefix: オブジェクト名に付与するプレフィックス
+            chunk_size: 読み込み単位（バイト）
+
+        Returns:
+            オブジェクト名 → {size, crc32c, md5_hash} の辞書
+        """
+        root = Path(directory)
+        manifest = {}
+        for path in sorted(p for p in root.rglob('*') if p.is_file()):
+            md5 = hashlib.md5()
+            crc = google_crc32c.Checksum()
+            with open(path, 'rb') as f:
+                while True:
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        break
+                    md5.update(chunk)
+                    crc.update(chunk)
+            manifest[prefix + path.relative_to(root).as_posix()] = {
+                'size': path.stat().st_size,
+                'crc32c': _b64(crc.digest()),
+                'md5_hash': _b64(md5.digest()),
+            }
+
+        logger.info("Built local manifest", directory=directory, count=len(manifest))
+        return manifest
+
+    @staticmethod
+    def load_manifest(path: str) -> Dict[str, Dict[str, Any]]:
+        """
+        マニフェストファイルを読み込み
+
+        Args:
+            path: record_manifest で作成した JSON ファイル
+
+        Returns:
+            オブジェクト名 → {size, crc32c, md5_hash} の辞書
+        """
+        data = json.loads(Path(path).read_text())
+        return data.get('objects', data)
+
+    def verify_manifest(
+        self,
+        bucket_name: str,
+        manifest: Dict[str, Dict[str, Any]],
+        prefix: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        マニフェストとGCSのチェックサムメタデータを照合（ダウンロードなし）
+
+        Args:
+            bucket_name: バケット名
+            manifest: オブジェクト名 → {size, crc32c, md5_hash}
+            prefix: オブジェクト名のプレフィックス
+
+        Returns:
+            照合結果（ok/mismatched/missing/unexpected）
+        """
+        remote = self.list_backup_objects(bucket_name, prefix)
+
+        result = {'ok': [], 'mismatched': [], 'missing': [], 'unexpected': []}
+        for name, expected in manifest.items():
+            actual = remote.get(name)
+            if actual is None:
+                result['missing'].append(name)
+                continue
+
+            diffs = {}
+            for key in ('size', 'crc32c', 'md5_hash'):
+                # 複合オブジェクトには md5_hash が無いため、両方ある場合のみ比較
+                if expected.get(key) is None or actual.get(key) is None:
+                    continue
+                if expected[key] != actual[key]:
+                    diffs[key] = {'expected': expected[key], 'actual': actual[key]}
+
+            if diffs:
+                result['mismatched'].append({'name': name, 'diffs': diffs})
+            else:
+                result['ok'].append(name)
+
+        result['unexpected'] = sorted(set(remote) - set(manifest))
+
+        if result['mismatched'] or result['missing']:
+            logger.warning(
+                "Backup manifest mismatch",
+                bucket=bucket_name,
+                mismatched=len(result['mismatched']),
+                missing=len(result['missing'])
+            )
+        else:
+            logger.info("Backup manifest verified", bucket=bucket_name, count=len(result['ok']))
+
+        return result
+
+    # ==================== 内容検証 ====================
+
+    def verify_content(
+        self,
+        bucket_name: str,
+        blob_name: str,
+        chunk_size: int = 8 * 1024 * 1024,
+        workers: int = 4
+    ) -> Dict[str, Any]:
+        """
+        オブジェクト本体をストリーミングで読み、チェックサムを再計算して検証
+
+        範囲指定の読み込みを workers 個まで先行して並列発行し、ハッシュには
+        先頭から順に投入する。メモリ使用量は chunk_size × workers で一定。
+
+        Args:
+            bucket_name: バケット名
+            blob_name: オブジェクト名
+            chunk_size: 1回の範囲読み込みサイズ（バイト）
+            workers: 並列読み込み数
+
+        Returns:
+            検証結果
+        """
+        blob = self.client.bucket(bucket_name).get_blob(blob_name)
+        if blob is None:
+            logger.error("Backup object not found", bucket=bucket_name, name=blob_name)
+            return {'name': blob_name, 'status': 'missing'}
+
+        size = blob.size or 0
+        ranges = [(start, min(start + chunk_size, size) - 1) for start in range(0, size, chunk_size)]
+
+        def fetch(byte_range):
+            start, end = byte_range
+            # raw_download: gzip保存されたオブジェクトも保存バイト列のまま検証する
+            return blob.download_as_bytes(
+                client=self.client, start=start, end=end, raw_download=True, checksum=None
+            )
+
+        md5 = hashlib.md5()
+        crc = google_crc32c.Checksum()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            remaining = iter(ranges)
+            for byte_range in remaining:
+                pending.append(executor.submit(fetch, byte_range))
+                if len(pending) >= workers:
+                    break
+            while pending:
+                chunk = pending.popleft().result()
+                md5.update(chunk)
+                crc.update(chunk)
+                next_range = next(remaining, None)
+                if next_range is not None:
+                    pending.append(executor.submit(fetch, next_range))
+
+        actual = {'crc32c': _b64(crc.digest()), 'md5_hash': _b64(md5.digest())}
+        expected = {'crc32c': blob.crc32c, 'md5_hash': blob.md5_hash}
+        ok = all(
+            expected[key] is None or expected[key] == actual[key]
+            for key in ('crc32c', 'md5_hash')
+        )
+
+        result = {
+            'name': blob_name,
+            'status': 'ok' if ok else 'corrupted',
+            'size': size,
+            'expected': expected,
+            'actual': actual,
+        }
+
+        if ok:
+            logger.info("Backup content verified", bucket=bucket_name, name=blob_name, size=size)
+        else:
+            logger.error("Backup content checksum mismatch", bucket=bucket_name, name=blob_name)
+
+        return result
+
+    # ==================== 鮮度・サイズ検証 ====================
+
+    @staticmethod
+    def load_schedule(path: str) -> Dict[str, Any]:
+        """
+        バックアップスケジュール定義（YAML）を読み込み
+
+        例:
+            bucket: prod-wordpress-backups
+            max_age_hours: 26
+            sites:
+              - name: site-1
+                prefix: files/site-1/
+              - name: site-2
+                prefix: files/site-2/
+                min_size_bytes: 1048576
+
+        Args:
+            path: YAMLファイルのパス
+
+        Returns:
+            スケジュール定義
+        """
+        with open(path) as f:
+            return yaml.safe_load(f)
+
+    def check_sites(self, schedule: Dict[str, Any], now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """
+        サイトごとのバックアップ鮮度・サイズを検証
+
+        Args:
+            schedule: load_schedule で読み込んだ定義
+            now: 基準時刻（テスト用、未指定の場合は現在時刻）
+
+        Returns:
+            サイトごとの検証結果（status: ok/stale/size_anomaly/missing）
+        """
+        now = now or datetime.now(timezone.utc)
+        bucket_name = schedule['bucket']
+        default_max_age = schedule.get('max_age_hours', DEFAULT_MAX_AGE_HOURS)
+        default_ratio = schedule.get('min_size_ratio', DEFAULT_MIN_SIZE_RATIO)
+
+        reports = []
+        for site in schedule.get('sites', []):
+            objects = self.list_backup_objects(bucket_name, site['prefix'])
+            report = {'site': site['name'], 'prefix': site['prefix'], 'issues': []}
+
+            if not objects:
+                report['status'] = 'missing'
+                report['issues'].append('バックアップが存在しません')
+                reports.append(report)
+                continue
+
+            history = sorted(objects.items(), key=lambda item: item[1]['updated'])
+            latest_name, latest = history[-1]
+            age_hours = (now - latest['updated']).total_seconds() / 3600
+            report.update({
+                'latest': latest_name,
+                'age_hours': round(age_hours, 1),
+                'size': latest['size'],
+            })
+
+            max_age = site.get('max_age_hours', default_max_age)
+            if age_hours > max_age:
+                report['issues'].append(f'最新バックアップが{age_hours:.1f}時間前です（上限{max_age}時間）')
+
+            min_size = site.get('min_size_bytes')
+            if min_size is not None and latest['size'] < min_size:
+                report['issues'].append(f'サイズが最小値を下回っています（{latest["size"]} < {min_size}）')
+
+            previous = [meta['size'] for _, meta in history[-SIZE_HISTORY - 1:-1]]
+            if previous:
+                baseline = statistics.median(previous)
+                ratio = site.get('min_size_ratio', default_ratio)
+                if baseline and latest['size'] < baseline * ratio:
+                    report['issues'].append(
+                        f'サイズが過去の中央値から急減しています（{latest["size"]} / {int(baseline)}）'
+                    )
+
+            if not report['issues']:
+                report['status'] = 'ok'
+            elif age_hours > max_age:
+                report['status'] = 'stale'
+            else:
+                report['status'] = 'size_anomaly'
+            reports.append(report)
+
+        failed = [r['site'] for r in reports if r['status'] != 'ok']
+        if failed:
+            logger.warning("Backup check failed", sites=failed)
+        else:
+            logger.info("Backup check passed", sites=len(reports))
+
+        return reports
@@ -0,0 +1,369 @@
+"""
+季節性ベースライン
+メトリクスの曜日×時刻（週168スロット）ごとの平均・分散を保持し、時刻に応じた正常範囲を返す
+"""
+
+import json
+import os
+import struct
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import structlog
+
+from .timeseries import to_epoch
+
+logger = structlog.get_logger()
+
+SLOTS_PER_WEEK = 168
+# スロットごとの統計量: 重み（件数）、平均、偏差平方和
+FIELDS = ('count', 'mean', 'm2')
+
+FILE_MAGIC = b'BSL1'
+DEFAULT_TIMEZONE = 'Asia/Tokyo'
+# 1970-01-01 は木曜日なので、月曜 0 時をスロット 0 にするためのずらし
+_EPOCH_WEEKDAY_OFFSET = 3 * 24
+# 時差の切り替わり（夏時間など）は15分単位で起きるので、その単位で時差を引く
+_OFFSET_STEP_SECONDS = 900
+
+
+def utc_offsets(epoch: np.ndarray, timezone: str = DEFAULT_TIMEZONE) -> np.ndarray:
+    """
+    各時刻でのタイムゾーンのUTCからの時差（秒）
+
+    Args:
+        epoch: UNIX秒（スカラーまたは配列）
+        timezone: タイムゾーン名（IANA、例: Asia/Tokyo）
+
+    Returns:
+        時差（秒、epoch と同じ形状）
+    """
+    tz = ZoneInfo(timezone)
+    steps = np.floor_divide(np.asarray(epoch, dtype=float), _OFFSET_STEP_SECONDS).astype(np.int64)
+    unique, inverse = np.unique(steps, return_inverse=True)
+    offsets = np.array([
+        datetime.fromtimestamp(int(step) * _OFFSET_STEP_SECONDS, tz).utcoffset().total_seconds()
+        for step in unique
+    ])
+    return offsets[inverse].reshape(steps.shape)
+
+
+def hour_of_week(epoch: np.ndarray, timezone: str = DEFAULT_TIMEZONE) -> np.ndarray:
+    """
+    UNIX秒を曜日×時刻のスロット番号（月曜0時 = 0 〜 日曜23時 = 167）に変換
+
+    Args:
+        epoch: UNIX秒（スカラーまたは配列）
+        timezone: 曜日・時刻を判定するタイムゾーン名（夏時間の切り替えも反映する）
+
+    Returns:
+        スロット番号
+    """
+    epoch = np.asarray(epoch, dtype=float)
+    hours = np.floor_divide(epoch + utc_offsets(epoch, timezone), 3600).astype(np.int64)
+    return (hours + _EPOCH_WEEKDAY_OFFSET) % SLOTS_PER_WEEK
+
+
+def _legacy_timezone(utc_offset_hours: float) -> str:
+    """時差だけを保存していた古いファイルのタイムゾーン名（Etc/GMT は符号が逆）"""
+    if utc_offset_hours != int(utc_offset_hours):
+        raise ValueError(f"時差 {utc_offset_hours} 時間に対応するタイムゾーン名がありません")
+    return f"Etc/GMT{-int(utc_offset_hours):+d}" if utc_offset_hours else 'UTC'
+
+
+class BaselineStore:
+    """
+    系列ごとの曜日×時刻プロファイル
+
+    統計量は [系列数 × 168 × (件数, 平均, 偏差平方和)] の配列で持ち、新しいデータは
+    スロットごとに集計してから結合する（生データを再集計しない）。古いデータの重みは
+    half_life_weeks ごとに半分にして、季節パターンの変化に追従させる。
+
+    ファイルは「マジック + ヘッダ長 + JSONヘッダ（系列名の索引など）+ float64 配列」で、
+    読み込み時は配列部分を memmap するため、1点の参照は系列の行とスロットを引くだけで済む。
+    """
+
+    def __init__(
+        self,
+        timezone: str = DEFAULT_TIMEZONE,
+        half_life_weeks: float = 4.0,
+        path: Optional[str] = None
+    ):
+        """
+        初期化
+
+        Args:
+            timezone: 曜日・時刻を判定するタイムゾーン名
+            half_life_weeks: 古いデータの重みが半分になる週数（0 の場合は減衰させない）
+            path: 保存先ファイル
+
+        Raises:
+            ValueError: タイムゾーン名が不正な場合
+        """
+        try:
+            ZoneInfo(timezone)
+        except (ValueError, KeyError) as e:
+            raise ValueError(f"タイムゾーン名が不正です: {timezone}") from e
+        self.timezone = timezone
+        self.half_life_weeks = half_life_weeks
+        self.path = path
+        self.index = {}
+        self.watermarks = {}
+        self.stats = np.zeros((0, SLOTS_PER_WEEK, len(FIELDS)))
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def _row(self, name: str) -> int:
+        """系列の行番号（無ければ追加）"""
+        row = self.index.get(name)
+        if row is None:
+            row = len(self.index)
+            self.index[name] = row
+            if row >= len(self.stats):
+                grown = np.zeros((max(16, 2 * len(self.stats)), SLOTS_PER_WEEK, len(FIELDS)))
+                grown[:len(self.stats)] = self.stats
+                self.stats = grown
+        return row
+
+    def update(self, series: Dict[str, List[Dict[str, Any]]]) -> Dict[str, int]:
+        """
+        新しいデータポイントをプロファイルに取り込む
+
+        系列ごとの取り込み済み時刻（watermark）より新しい点だけを使うため、
+        重なった期間を渡しても二重に数えない。
+
+        Args:
+            series: 系列名 → データポイントリスト（timestamp, value）
+
+        Returns:
+            系列名 → 取り込んだ点数
+        """
+        if isinstance(self.stats, np.memmap):
+            # memmap で開いたファイルは読み取り専用なので、更新前にメモリにコピーする
+            self.stats = np.array(self.stats)
+
+        added = {}
+        for name, points in series.items():
+            watermark = self.watermarks.get(name, float('-inf'))
+            times = np.array([to_epoch(p['timestamp']) for p in points], dtype=float)
+            values = np.array([np.nan if p['value'] is None else p['value'] for p in points], dtype=float)
+            keep = (times > watermark) & np.isfinite(values)
+            if not keep.any():
+                added[name] = 0
+                continue
+            times, values = times[keep], values[keep]
+
+            row = self._row(name)
+            current = self.stats[row]
+
+            # 前回の取り込みからの経過週数に応じて既存の重みを減衰
+            if self.half_life_weeks and np.isfinite(watermark):
+                weeks = (times.max() - watermark) / (7 * 86400)
+                current[:, 0] *= 0.5 ** (weeks / self.half_life_weeks)
+                current[:, 2] *= 0.5 ** (weeks / self.half_life_weeks)
+
+            # 新しい点をスロットごとに集計
+            slots = hour_of_week(times, self.timezone)
+            n_b = np.bincount(slots, minlength=SLOTS_PER_WEEK).astype(float)
+            sum_b = np.bincount(slots, weights=values, minlength=SLOTS_PER_WEEK)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean_b = np.where(n_b > 0, sum_b / n_b, 0.0)
+            m2_b = np.bincount(slots, weights=(values - mean_b[slots]) ** 2, minlength=SLOTS_PER_WEEK)
+
+            # 既存の統計量と結合（並列分散アルゴリズム）
+            n_a, mean_a, m2_a = current[:, 0], current[:, 1], current[:, 2]
+            n = n_a + n_b
+            delta = mean_b - mean_a
+            with np.errstate(invalid='ignore', divide='ignore'):
+                ratio = np.where(n > 0, n_b / n, 0.0)
+            current[:, 1] = mean_a + delta * ratio
+            current[:, 2] = m2_a + m2_b + delta ** 2 * n_a * ratio
+            current[:, 0] = n
+
+            self.watermarks[name] = float(times.max())
+            added[name] = int(keep.sum())
+
+        logger.info("Baselines updated", series=len(series), points=sum(added.values()))
+        return added
+
+    def profile(self, name: str) -> Optional[np.ndarray]:
+        """系列のプロファイル [168 × (件数, 平均, 偏差平方和)]（無ければ None）"""
+        row = self.index.get(name)
+        return None if row is None else self.stats[row]
+
+    def expected(
+        self,
+        name: str,
+        timestamp: Any,
+        sigma: float = 3.0,
+        min_std: float = 1.0
+    ) -> Optional[Dict[str, float]]:
+        """
+        指定時刻の正常範囲
+
+        Args:
+            name: 系列名
+            timestamp: 時刻
+            sigma: 平均から何標準偏差までを正常とするか
+            min_std: 標準偏差の下限（ほぼ一定の系列で範囲が潰れないようにする）
+
+        Returns:
+            {'mean', 'std', 'low', 'high', 'count'}（プロファイルが無い場合は None）
+        """
+        row = self.index.get(name)
+        if row is None:
+            return None
+        count, mean, m2 = self.stats[row, int(hour_of_week(to_epoch(timestamp), self.timezone))]
+        if count <= 0:
+            return None
+        std = max(float(np.sqrt(m2 / count)), min_std)
+        return {
+            'mean': float(mean),
+            'std': std,
+            'low': float(mean) - sigma * std,
+            'high': float(mean) + sigma * std,
+            'count': float(count),
+        }
+
+    def detect(
+        self,
+        name: str,
+        points: List[Dict[str, Any]],
+        sigma: float = 3.0,
+        min_std: float = 1.0,
+        min_count: float = 3.0
+    ) -> List[Dict[str, Any]]:
+        """
+        プロファイルの正常範囲から外れた点を検出
+
+        Args:
+            name: 系列名
+            points: データポイントリスト（timestamp, value）
+            sigma: 平均から何標準偏差までを正常とするか
+            min_std: 標準偏差の下限
+            min_count: 判定に必要なスロットの最小件数（学習不足のスロットは判定しない）
+
+        Returns:
+            異常が検出されたデータポイント（MonitoringTools.detect_anomalies と同じ形式に範囲を追加）
+        """
+        row = self.index.get(name)
+        if row is None or not points:
+            return []
+
+        times = np.array([to_epoch(p['timestamp']) for p in points], dtype=float)
+        values = np.array([np.nan if p['value'] is None else p['value'] for p in points], dtype=float)
+        slot_stats = self.stats[row][hour_of_week(times, self.timezone)]
+        count, mean = slot_stats[:, 0], slot_stats[:, 1]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            std = np.maximum(np.sqrt(np.where(count > 0, slot_stats[:, 2] / count, 0.0)), min_std)
+            score = (values - mean) / std
+
+        anomalies = []
+        for i in np.flatnonzero((count >= min_count) & (np.abs(score) > sigma)):
+            anomalies.append({
+                'timestamp': points[i]['timestamp'],
+                'value': float(values[i]),
+                'expected': float(mean[i]),
+                'low': float(mean[i] - sigma * std[i]),
+                'high': float(mean[i] + sigma * std[i]),
+                'score': round(float(score[i]), 2),
+                'severity': 'high' if abs(score[i]) > sigma * 1.5 else 'medium',
+            })
+
+        if anomalies:
+            logger.warning("Seasonal anomalies detected", series=name, count=len(anomalies), sigma=sigma)
+        return anomalies
+
+    def save(self, path: Optional[str] = None):
+        """
+        ファイルに保存（一時ファイルに書いてから置き換える）
+
+        Args:
+            path: 保存先（未指定の場合は読み込み元）
+        """
+        path = Path(path or self.path)
+        header = json.dumps({
+            'version': 1,
+            'slots': SLOTS_PER_WEEK,
+            'fields': FIELDS,
+            'timezone': self.timezone,
+            'half_life_weeks': self.half_life_weeks,
+            'series': sorted(self.index, key=self.index.get),
+            'watermarks': self.watermarks,
+        }).encode()
+        # 配列部分を8バイト境界に揃える
+        header += b' ' * (-(len(FILE_MAGIC) + 4 + len(header)) % 8)
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # 同時に保存するプロセスと一時ファイルが衝突しないよう一意な名前にする
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name + '.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(FILE_MAGIC)
+                f.write(struct.pack('<I', len(header)))
+                f.write(header)
+                f.write(np.ascontiguousarray(self.stats[:len(self.index)], dtype='<f8').tobytes())
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self.path = str(path)
+        logger.info("Baselines saved", path=str(path), series=len(self.index))
+
+    @classmethod
+    def load(cls, path: str) -> 'BaselineStore':
+        """
+        ファイルから読み込む（配列部分は memmap で必要な箇所だけ読む）
+
+        Args:
+            path: ファイルパス
+
+        Returns:
+            BaselineStore
+        """
+        with open(path, 'rb') as f:
+            if f.read(len(FILE_MAGIC)) != FILE_MAGIC:
+                raise ValueError(f"ベースラインファイルではありません: {path}")
+            (length,) = struct.unpack('<I', f.read(4))
+            header = json.loads(f.read(length))
+
+        timezone = header.get('timezone') or _legacy_timezone(header['utc_offset_hours'])
+        store = cls(timezone, header['half_life_weeks'], path)
+        store.index = {name: row for row, name in enumerate(header['series'])}
+        store.watermarks = header['watermarks']
+        if store.index:
+            store.stats = np.memmap(
+                path, dtype='<f8', mode='r', offset=len(FILE_MAGIC) + 4 + length,
+                shape=(len(store.index), SLOTS_PER_WEEK, len(FIELDS))
+            )
+        return store
+
+    @classmethod
+    def open(cls, path: str, timezone: Optional[str] = None, **kwargs) -> 'BaselineStore':
+        """
+        ファイルがあれば読み込み、無ければ空のストアを作る
+
+        Args:
+            path: ファイルパス
+            timezone: タイムゾーン名（未指定の場合は既存ファイルの設定か DEFAULT_TIMEZONE）
+            **kwargs: 新しく作る場合の BaselineStore の引数
+
+        Returns:
+            BaselineStore
+
+        Raises:
+            ValueError: 既存ファイルと異なるタイムゾーンを指定した場合（スロットがずれるため）
+        """
+        if os.path.exists(path):
+            store = cls.load(path)
+            if timezone and timezone != store.timezone:
+                raise ValueError(
+                    f"ベースラインは {store.timezone} で集計されています（{timezone} を使うには別のファイルを指定してください）"
+                )
+            return store
+        return cls(timezone or DEFAULT_TIMEZONE, path=path, **kwargs)
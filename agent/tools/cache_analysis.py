@@ -0,0 +1,394 @@
+"""
+キャッシュ解析ツール
+Nginx アクセスログからサイト・URL種別ごとのキャッシュヒット率と応答時間を集計
+"""
+
+import gzip
+import json
+import os
+import re
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+
+import structlog
+
+from .sketches import LatencySketch
+
+logger = structlog.get_logger()
+
+# nginx.conf.j2 の log_format cache
+# （combined + $request_time $host $upstream_cache_status $upstream_response_time）
+CACHE_LOG_PATTERN = re.compile(
+    rb'^\S+ \S+ \S+ \[(?P<time>[^\]]+)\] '
+    rb'"(?P<method>[A-Z]+) (?P<uri>[^ "]*)[^"]*" (?P<status>\d{3}) \S+ "[^"]*" "[^"]*" '
+    rb'(?P<request_time>\d+(?:\.\d+)?) (?P<host>\S+) (?P<cache>\S+) (?P<upstream_time>.*)$'
+)
+_NUMBER_PATTERN = re.compile(rb'\d+(?:\.\d+)?')
+
+# URL種別（上から順に判定）
+URL_CLASSES = [
+    ('admin', re.compile(rb'^/wp-admin/')),
+    ('login', re.compile(rb'^/wp-login\.php')),
+    ('cron', re.compile(rb'^/wp-cron\.php')),
+    ('api', re.compile(rb'^/wp-json/|[?&]rest_route=')),
+    ('xmlrpc', re.compile(rb'^/xmlrpc\.php')),
+    ('search', re.compile(rb'[?&]s=')),
+    ('feed', re.compile(rb'/feed/?(?:\?|$)')),
+    ('static', re.compile(rb'\.(?:jpe?g|png|gif|ico|css|js|svg|woff2?|ttf|eot|webp)(?:\?|$)', re.I)),
+    ('preview', re.compile(rb'[?&]preview=')),
+]
+DEFAULT_URL_CLASS = 'page'
+
+# ヒットとして数えるキャッシュステータス
+HIT_STATUSES = frozenset({'HIT', 'STALE', 'UPDATING', 'REVALIDATED'})
+# キャッシュを通らなかったリクエスト（$upstream_cache_status が "-"）
+NO_CACHE_STATUS = 'NONE'
+
+# 1回に読み込むブロックサイズ
+BLOCK_SIZE = 16 * 1024 * 1024
+
+# ローテーション後の名前（access.log.1、access.log.2.gz）から元のログ名を取り出す
+ROTATED_SUFFIX = re.compile(r'(?:\.\d+)?(?:\.gz)?$')
+
+
+def classify_url(uri: bytes) -> str:
+    """URI を URL種別に分類"""
+    for name, pattern in URL_CLASSES:
+        if pattern.search(uri):
+            return name
+    return DEFAULT_URL_CLASS
+
+
+class CacheGroupStats:
+    """サイト × URL種別1つ分の集計"""
+
+    __slots__ = ('status', 'latency', 'upstream_latency')
+
+    def __init__(self):
+        self.status = Counter()
+        self.latency = LatencySketch()
+        self.upstream_latency = LatencySketch()
+
+    def merge(self, other: 'CacheGroupStats') -> 'CacheGroupStats':
+        """別の集計を結合"""
+        self.status.update(other.status)
+        self.latency.merge(other.latency)
+        self.upstream_latency.merge(other.upstream_latency)
+        return self
+
+    def report(self) -> Dict[str, Any]:
+        """集計結果をまとめる"""
+        hits = sum(self.status[s] for s in HIT_STATUSES)
+        cacheable = sum(self.status.values()) - self.status[NO_CACHE_STATUS]
+        return {
+            'requests': sum(self.status.values()),
+            'status': dict(self.status.most_common()),
+            'hit_ratio': hits / cacheable if cacheable else None,
+            'latency': self.latency.summary(),
+            'upstream_latency': self.upstream_latency.summary(),
+        }
+
+
+class CacheAggregate:
+    """
+    アクセスログのキャッシュ集計（ファイル・実行間で結合可能）
+
+    サイト × URL種別ごとにキャッシュステータスの件数と応答時間のスケッチを持ち、
+    ヒット率の低下を判定するため、サイトごとに1時間単位の (ヒット数, キャッシュ対象数) も持つ。
+    """
+
+    def __init__(self):
+        self.lines = 0
+        self.unparsed = 0
+        self.groups = {}
+        self.hourly = {}
+        self._hour_cache = {}
+        self._minute_cache = {}
+
+    def _hour(self, time_local: bytes) -> Optional[int]:
+        """"10/Oct/2025:13:55:36 +0900" → その時間の開始時刻（UNIX秒）"""
+        key = time_local[:14] + time_local[20:]
+        hour = self._hour_cache.get(key)
+        if hour is None:
+            try:
+                hour = int(datetime.strptime(key.decode(), '%d/%b/%Y:%H %z').timestamp())
+            except ValueError:
+                return None
+            self._hour_cache[key] = hour
+        return hour
+
+    def _epoch(self, time_local: bytes) -> Optional[int]:
+        """"10/Oct/2025:13:55:36 +0900" → UNIX秒"""
+        key = time_local[:17] + time_local[20:]
+        minute = self._minute_cache.get(key)
+        try:
+            if minute is None:
+                minute = self._minute_cache[key] = int(datetime.strptime(key.decode(), '%d/%b/%Y:%H:%M %z').timestamp())
+            return minute + int(time_local[18:20])
+        except ValueError:
+            return None
+
+    def add_lines(self, data: bytes, after: Optional[int] = None) -> Optional[int]:
+        """
+        改行区切りのログを集計
+
+        Args:
+            data: ログ
+            after: この時刻（UNIX秒）以前の行は読み飛ばす（集計済みの行）
+
+        Returns:
+            最後に集計した行の時刻（UNIX秒）
+        """
+        match = CACHE_LOG_PATTERN.match
+        groups = self.groups
+        last = None
+
+        for line in data.splitlines():
+            if not line:
+                continue
+            m = match(line)
+            if after is not None and m is not None:
+                epoch = self._epoch(m['time'])
+                if epoch is not None and epoch <= after:
+                    continue
+            self.lines += 1
+            if m is None:
+                self.unparsed += 1
+                continue
+            last = m
+
+            site = m['host'].decode('utf-8', 'replace').lower()
+            cache = m['cache'].decode()
+            cache = NO_CACHE_STATUS if cache == '-' else cache
+            key = (site, classify_url(m['uri']))
+            stats = groups.get(key)
+            if stats is None:
+                stats = groups[key] = CacheGroupStats()
+            stats.status[cache] += 1
+            stats.latency.add(float(m['request_time']))
+            # 内部リダイレクトなどで複数の上流を経由した場合は合計する
+            upstream = _NUMBER_PATTERN.findall(m['upstream_time'])
+            if upstream:
+                stats.upstream_latency.add(sum(float(v) for v in upstream))
+
+            if cache != NO_CACHE_STATUS:
+                hour = self._hour(m['time'])
+                if hour is not None:
+                    counts = self.hourly.setdefault(site, {}).setdefault(hour, [0, 0])
+                    counts[0] += cache in HIT_STATUSES
+                    counts[1] += 1
+
+        return self._epoch(last['time']) if last is not None else None
+
+    def merge(self, other: 'CacheAggregate') -> 'CacheAggregate':
+        """別の集計を結合"""
+        self.lines += other.lines
+        self.unparsed += other.unparsed
+        for key, stats in other.groups.items():
+            if key in self.groups:
+                self.groups[key].merge(stats)
+            else:
+                self.groups[key] = stats
+        self.merge_hourly(other.hourly)
+        return self
+
+    def merge_hourly(self, hourly: Dict[str, Dict[int, List[int]]]):
+        """サイトごとの時間別件数を加算"""
+        for site, hours in hourly.items():
+            mine = self.hourly.setdefault(site, {})
+            for hour, (hits, total) in hours.items():
+                counts = mine.setdefault(int(hour), [0, 0])
+                counts[0] += hits
+                counts[1] += total
+
+    def find_drops(self, threshold: float = 0.1, min_requests: int = 100) -> List[Dict[str, Any]]:
+        """
+        ヒット率が下がったサイトを検出
+
+        サイトごとに最新の1時間のヒット率を、それより前の時間の合計と比べる。
+
+        Args:
+            threshold: 低下とみなすヒット率の差（0.1 = 10ポイント）
+            min_requests: 判定に必要なキャッシュ対象リクエスト数（最新・過去それぞれ）
+
+        Returns:
+            {'site', 'hour', 'hit_ratio', 'baseline_ratio', 'requests'} のリスト（低下幅の大きい順）
+        """
+        drops = []
+        for site, hours in self.hourly.items():
+            if len(hours) < 2:
+                continue
+            latest = max(hours)
+            hits, total = hours[latest]
+            base_hits = sum(h for hour, (h, _) in hours.items() if hour != latest)
+            base_total = sum(t for hour, (_, t) in hours.items() if hour != latest)
+            if total < min_requests or base_total < min_requests:
+                continue
+
+            ratio, baseline = hits / total, base_hits / base_total
+            if baseline - ratio >= threshold:
+                drops.append({
+                    'site': site,
+                    'hour': datetime.fromtimestamp(latest).astimezone().isoformat(),
+                    'hit_ratio': round(ratio, 4),
+                    'baseline_ratio': round(baseline, 4),
+                    'requests': total,
+                })
+
+        if drops:
+            logger.warning("Cache hit ratio dropped", sites=[d['site'] for d in drops])
+        return sorted(drops, key=lambda d: d['baseline_ratio'] - d['hit_ratio'], reverse=True)
+
+    def report(self) -> Dict[str, Any]:
+        """
+        集計結果をまとめる
+
+        Returns:
+            {'lines', 'unparsed', 'sites': {サイト: {合計 + 'classes': {URL種別: 集計}}}}
+        """
+        sites = {}
+        for (site, url_class), stats in sorted(self.groups.items()):
+            entry = sites.setdefault(site, {'total': CacheGroupStats(), 'classes': {}})
+            entry['total'].merge(stats)
+            entry['classes'][url_class] = stats.report()
+
+        return {
+            'lines': self.lines,
+            'unparsed': self.unparsed,
+            'sites': {
+                site: {**entry['total'].report(), 'classes': entry['classes']}
+                for site, entry in sites.items()
+            },
+        }
+
+
+class CacheLogAnalyzer:
+    """
+    アクセスログのキャッシュ解析
+
+    ログは1回の走査で集計する。state_file を指定した場合は、ファイル（inode）ごとの読み込み位置・
+    最後の行の時刻とサイトごとの時間別ヒット数を保存し、次回は前回の続きだけを読む。ローテーションで
+    access.log.1 に名前が変わったファイルは続きから、新しい access.log は先頭から読む。
+    圧縮済みの .gz は初めて見たときだけ読み、圧縮で inode が変わっても二重に数えないよう、
+    同じログ（access.log.2.gz なら access.log）で前回までに読んだ最後の時刻以前の行は読み飛ばす。
+    """
+
+    def __init__(self, state_file: Optional[str] = None, history_hours: int = 24):
+        """
+        初期化
+
+        Args:
+            state_file: 読み込み位置などを保存するファイル（未指定の場合は毎回全体を読む）
+            history_hours: ヒット率低下の比較に使う時間別件数の保持期間
+        """
+        self.state_file = Path(state_file) if state_file else None
+        self.history_hours = history_hours
+        self.state = {'files': {}, 'hourly': {}}
+        if self.state_file and self.state_file.exists():
+            with open(self.state_file) as f:
+                self.state = json.load(f)
+
+    def _save_state(self):
+        """状態を保存（一時ファイルに書いてから置き換える）"""
+        if self.state_file is None:
+            return
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_file.with_name(self.state_file.name + '.tmp')
+        tmp.write_text(json.dumps(self.state, ensure_ascii=False))
+        os.replace(tmp, self.state_file)
+
+    def _start_offset(self, cursor: Optional[Dict[str, Any]], path: str, size: int) -> Optional[int]:
+        """前回の続きの読み込み位置（読む必要が無ければ None）"""
+        if self.state_file is None or cursor is None:
+            return 0
+        if path.endswith('.gz'):
+            # 圧縮済みのファイルは1回読めば十分
+            return None
+        return cursor['offset'] if cursor['offset'] <= size else 0
+
+    def _read(
+        self, path: str, start: int, aggregate: CacheAggregate, after: Optional[int] = None
+    ) -> Tuple[int, Optional[int]]:
+        """start から読んで集計し、(次の読み込み位置, 最後の行の時刻) を返す"""
+        compressed = path.endswith('.gz')
+        consumed = start
+        rest = b''
+        last_time = None
+        with (gzip.open(path, 'rb') if compressed else open(path, 'rb')) as f:
+            if start:
+                f.seek(start)
+            while True:
+                block = f.read(BLOCK_SIZE)
+                if not block:
+                    break
+                block = rest + block
+                complete = block[:block.rfind(b'\n') + 1]
+                last_time = aggregate.add_lines(complete, after) or last_time
+                consumed += len(complete)
+                rest = block[len(complete):]
+
+        if compressed:
+            last_time = aggregate.add_lines(rest, after) or last_time
+            return os.path.getsize(path), last_time
+        if self.state_file is None:
+            last_time = aggregate.add_lines(rest, after) or last_time
+        # 差分モードでは書きかけの最後の行を次回に回す
+        return consumed, last_time
+
+    def analyze(self, paths: List[str]) -> Tuple[CacheAggregate, CacheAggregate]:
+        """
+        ログファイルを集計
+
+        Args:
+            paths: ログファイルのパス（.gz は gzip として扱う）
+
+        Returns:
+            (今回読んだ範囲の集計, 保存済みの時間別件数を合わせたヒット率判定用の集計)
+        """
+        aggregate = CacheAggregate()
+        # ログごとの、前回までに読んだ最後の行の時刻
+        read_until = {}
+        for cursor in self.state['files'].values():
+            if cursor.get('last_time') is not None:
+                name = ROTATED_SUFFIX.sub('', cursor['path'])
+                read_until[name] = max(read_until.get(name, cursor['last_time']), cursor['last_time'])
+
+        cursors = {}
+        for path in paths:
+            stat = os.stat(path)
+            # ローテーションで名前が変わっても続きから読めるよう、inode で位置を覚える
+            key = f"{stat.st_dev}:{stat.st_ino}"
+            cursor = self.state['files'].get(key)
+            start = self._start_offset(cursor, path, stat.st_size)
+            if start is None:
+                offset, last_time = cursor['offset'], cursor.get('last_time')
+            else:
+                # 初めて見る .gz は圧縮前に読んだ行を含む（compress + delaycompress で inode が変わる）
+                after = read_until.get(ROTATED_SUFFIX.sub('', path)) if path.endswith('.gz') else None
+                offset, last_time = self._read(path, start, aggregate, after)
+                if last_time is None and cursor is not None:
+                    last_time = cursor.get('last_time')
+            cursors[key] = {'path': path, 'offset': offset, 'last_time': last_time}
+        self.state['files'] = cursors
+
+        history = CacheAggregate()
+        if self.state_file:
+            history.merge_hourly(self.state['hourly'])
+        history.merge_hourly(aggregate.hourly)
+        if history.hourly:
+            # 保持期間より古い時間別件数は捨てる
+            cutoff = max(max(hours) for hours in history.hourly.values() if hours) - self.history_hours * 3600
+            history.hourly = {
+                site: {hour: counts for hour, counts in hours.items() if hour > cutoff}
+                for site, hours in history.hourly.items()
+            }
+        self.state['hourly'] = {
+            site: {str(hour): counts for hour, counts in hours.items()}
+            for site, hours in history.hourly.items()
+        }
+        self._save_state()
+
+        logger.info("Analyzed cache logs", files=len(paths), lines=aggregate.lines, sites=len(history.hourly))
+        return aggregate, history
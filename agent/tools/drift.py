@@ -0,0 +1,446 @@
+"""
+構成ドリフト検出ツール
+Terraform の state と稼働中のリソース（Cloud Asset Inventory）を突き合わせる
+"""
+
+import json
+import os
+import re
+from collections import defaultdict
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+
+import ijson
+from ijson.common import ObjectBuilder
+import structlog
+
+from .inventory import list_assets
+
+logger = structlog.get_logger()
+
+# Terraform のリソースタイプ → Cloud Asset Inventory のアセットタイプと比較する属性
+# 属性は (Terraform 側のパス, アセット側のパス, 比較方法) で、パスはドット区切り（数字はリストの添字）
+RESOURCE_TYPES = {
+    'google_compute_instance': {
+        'asset_type': 'compute.googleapis.com/Instance',
+        'attributes': [
+            ('machine_type', 'machineType', 'basename'),
+            ('labels', 'labels', 'value'),
+            ('tags', 'tags.items', 'set'),
+        ],
+    },
+    'google_compute_network': {
+        'asset_type': 'compute.googleapis.com/Network',
+        'attributes': [
+            ('auto_create_subnetworks', 'autoCreateSubnetworks', 'value'),
+            ('routing_mode', 'routingConfig.routingMode', 'value'),
+        ],
+    },
+    'google_compute_subnetwork': {
+        'asset_type': 'compute.googleapis.com/Subnetwork',
+        'attributes': [
+            ('ip_cidr_range', 'ipCidrRange', 'value'),
+            ('private_ip_google_access', 'privateIpGoogleAccess', 'value'),
+        ],
+    },
+    'google_compute_firewall': {
+        'asset_type': 'compute.googleapis.com/Firewall',
+        'attributes': [
+            ('direction', 'direction', 'value'),
+            ('priority', 'priority', 'value'),
+            ('disabled', 'disabled', 'value'),
+            ('source_ranges', 'sourceRanges', 'set'),
+            ('target_tags', 'targetTags', 'set'),
+        ],
+    },
+    'google_compute_router': {
+        'asset_type': 'compute.googleapis.com/Router',
+        'attributes': [
+            ('network', 'network', 'basename'),
+        ],
+    },
+    'google_compute_global_address': {
+        'asset_type': 'compute.googleapis.com/GlobalAddress',
+        'attributes': [
+            ('address', 'address', 'value'),
+            ('purpose', 'purpose', 'value'),
+        ],
+    },
+    'google_compute_health_check': {
+        'asset_type': 'compute.googleapis.com/HealthCheck',
+        'attributes': [
+            ('check_interval_sec', 'checkIntervalSec', 'value'),
+            ('timeout_sec', 'timeoutSec', 'value'),
+            ('healthy_threshold', 'healthyThreshold', 'value'),
+            ('unhealthy_threshold', 'unhealthyThreshold', 'value'),
+        ],
+    },
+    'google_compute_backend_service': {
+        'asset_type': 'compute.googleapis.com/BackendService',
+        'attributes': [
+            ('protocol', 'protocol', 'value'),
+            ('timeout_sec', 'timeoutSec', 'value'),
+            ('enable_cdn', 'enableCDN', 'value'),
+            ('security_policy', 'securityPolicy', 'basename'),
+        ],
+    },
+    'google_compute_url_map': {
+        'asset_type': 'compute.googleapis.com/UrlMap',
+        'attributes': [
+            ('default_service', 'defaultService', 'basename'),
+        ],
+    },
+    'google_compute_target_http_proxy': {
+        'asset_type': 'compute.googleapis.com/TargetHttpProxy',
+        'attributes': [
+            ('url_map', 'urlMap', 'basename'),
+        ],
+    },
+    'google_compute_target_https_proxy': {
+        'asset_type': 'compute.googleapis.com/TargetHttpsProxy',
+        'attributes': [
+            ('url_map', 'urlMap', 'basename'),
+        ],
+    },
+    'google_compute_global_forwarding_rule': {
+        'asset_type': 'compute.googleapis.com/GlobalForwardingRule',
+        'attributes': [
+            ('ip_address', 'IPAddress', 'value'),
+            ('port_range', 'portRange', 'value'),
+            ('target', 'target', 'basename'),
+        ],
+    },
+    'google_compute_security_policy': {
+        'asset_type': 'compute.googleapis.com/SecurityPolicy',
+        'attributes': [],
+    },
+    'google_compute_managed_ssl_certificate': {
+        'asset_type': 'compute.googleapis.com/SslCertificate',
+        'attributes': [
+            ('managed.0.domains', 'managed.domains', 'set'),
+        ],
+    },
+    'google_compute_region_instance_group_manager': {
+        'asset_type': 'compute.googleapis.com/InstanceGroupManager',
+        'attributes': [
+            ('base_instance_name', 'baseInstanceName', 'value'),
+            ('version.0.instance_template', 'versions.0.instanceTemplate', 'basename'),
+        ],
+    },
+    'google_compute_region_autoscaler': {
+        'asset_type': 'compute.googleapis.com/Autoscaler',
+        'attributes': [
+            ('autoscaling_policy.0.min_replicas', 'autoscalingPolicy.minNumReplicas', 'value'),
+            ('autoscaling_policy.0.max_replicas', 'autoscalingPolicy.maxNumReplicas', 'value'),
+        ],
+    },
+    'google_sql_database_instance': {
+        'asset_type': 'sqladmin.googleapis.com/Instance',
+        'attributes': [
+            ('database_version', 'databaseVersion', 'value'),
+            ('settings.0.tier', 'settings.tier', 'value'),
+            ('settings.0.availability_type', 'settings.availabilityType', 'value'),
+        ],
+    },
+    'google_filestore_instance': {
+        'asset_type': 'file.googleapis.com/Instance',
+        'attributes': [
+            ('tier', 'tier', 'value'),
+            ('file_shares.0.capacity_gb', 'fileShares.0.capacityGb', 'value'),
+        ],
+    },
+    'google_storage_bucket': {
+        'asset_type': 'storage.googleapis.com/Bucket',
+        'attributes': [
+            ('location', 'location', 'upper'),
+            ('storage_class', 'storageClass', 'value'),
+            ('versioning.0.enabled', 'versioning.enabled', 'value'),
+        ],
+    },
+    'google_service_account': {
+        'asset_type': 'iam.googleapis.com/ServiceAccount',
+        'key': ('email', 'email'),
+        'attributes': [
+            ('display_name', 'displayName', 'value'),
+        ],
+    },
+}
+
+ASSET_TYPES = {spec['asset_type']: tf_type for tf_type, spec in RESOURCE_TYPES.items()}
+
+# `terraform show -json` 内のリソース配列の位置
+#   values.root_module(.child_modules.item)*.resources.item
+RESOURCE_PREFIX = re.compile(r'^(?:resources|values\.root_module(?:\.child_modules\.item)*\.resources)\.item$')
+
+
+def normalize_link(link: str) -> str:
+    """
+    self-link / リソース名を比較用の形式に揃える
+
+    "https://www.googleapis.com/compute/v1/projects/p/global/networks/n" と
+    "//compute.googleapis.com/projects/p/global/networks/n" はどちらも
+    "projects/p/global/networks/n" に、"projects/" を含まないもの（バケット等）は末尾の名前になる。
+    """
+    pos = link.find('projects/')
+    if pos >= 0:
+        return link[pos:]
+    return link.rstrip('/').rsplit('/', 1)[-1]
+
+
+def _lookup(data: Any, path: str) -> Any:
+    """ドット区切りのパスで値を取り出す（途中で無ければ None）"""
+    for part in path.split('.'):
+        if isinstance(data, list):
+            index = int(part) if part.isdigit() else None
+            data = data[index] if index is not None and index < len(data) else None
+        elif isinstance(data, dict):
+            data = data.get(part)
+        else:
+            return None
+        if data is None:
+            return None
+    return data
+
+
+def _normalize_value(value: Any, how: str) -> Any:
+    """比較方法に従って値を揃える（API が省略する既定値は None とみなす）"""
+    if value in (None, '', [], {}, False, 0):
+        return None
+    if how == 'basename':
+        return str(value).rstrip('/').rsplit('/', 1)[-1]
+    if how == 'set':
+        return sorted(str(v) for v in value)
+    if how == 'upper':
+        return str(value).upper()
+    if isinstance(value, str):
+        # Asset Inventory は int64 を文字列で返す
+        try:
+            return float(value) if '.' in value else int(value)
+        except ValueError:
+            return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value) if isinstance(value, float) and not value.is_integer() else int(value)
+    return value
+
+
+def _iter_raw_resources(f) -> Iterator[Dict[str, Any]]:
+    """リソース配列の要素を1件ずつ組み立てる"""
+    # state ファイルはリソース配列が1つなので C 実装の items() でそのまま取り出せる
+    for prefix, event, value in ijson.parse(f):
+        if event == 'map_key':
+            break
+    f.seek(0)
+    if value != 'format_version':
+        yield from ijson.items(f, 'resources.item', use_float=True)
+        return
+
+    # terraform show -json は child_modules が任意の深さで入れ子になるため、イベントから組み立てる
+    builder = None
+    for prefix, event, value in ijson.parse(f, use_float=True):
+        if builder is None:
+            if event != 'start_map' or not RESOURCE_PREFIX.match(prefix):
+                continue
+            builder = ObjectBuilder()
+
+        builder.event(event, value)
+        if not builder.containers:
+            yield builder.value
+            builder = None
+
+
+def iter_state_resources(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Terraform の state / `terraform show -json` の出力からリソースを1件ずつ取り出す
+
+    ドキュメント全体は読み込まず、リソース配列の要素ごとにオブジェクトを組み立てる。
+
+    Args:
+        path: JSON ファイルのパス
+
+    Yields:
+        {'address', 'type', 'attributes'}（managed リソースのインスタンス単位）
+    """
+    with open(path, 'rb') as f:
+        for resource in _iter_raw_resources(f):
+            if resource.get('mode', 'managed') != 'managed':
+                continue
+
+            if 'instances' in resource:
+                # state ファイル (v4)
+                base = resource['type'] + '.' + resource['name']
+                if resource.get('module'):
+                    base = resource['module'] + '.' + base
+                for instance in resource['instances']:
+                    address = base
+                    if 'index_key' in instance:
+                        address += '[' + json.dumps(instance['index_key']) + ']'
+                    yield {'address': address, 'type': resource['type'], 'attributes': instance.get('attributes') or {}}
+            else:
+                # terraform show -json
+                yield {'address': resource['address'], 'type': resource['type'], 'attributes': resource.get('values') or {}}
+
+
+def _is_managed_by_group(data: Dict[str, Any]) -> bool:
+    """マネージドインスタンスグループが作成したVMかどうか"""
+    items = (data.get('metadata') or {}).get('items') or []
+    return any(item.get('key') == 'created-by' for item in items)
+
+
+class DriftDetector:
+    """Terraform state と稼働リソースの差分検出"""
+
+    def __init__(self, project_id: Optional[str] = None):
+        """
+        初期化
+
+        Args:
+            project_id: GCPプロジェクトID（未指定の場合は環境変数から取得）
+        """
+        self.project_id = project_id or os.getenv('GCP_PROJECT_ID')
+        if not self.project_id:
+            raise ValueError("GCP_PROJECT_ID が設定されていません")
+
+        logger.info("DriftDetector initialized", project_id=self.project_id)
+
+    def fetch_assets(self) -> List[Dict[str, Any]]:
+        """
+        対象タイプのリソースを Cloud Asset Inventory から一括取得
+
+        Returns:
+            アセットのリスト（`gcloud asset list --format=json` と同じ形式）
+        """
+        return list_assets(self.project_id, ASSET_TYPES)
+
+    @staticmethod
+    def load_assets(path: str) -> List[Dict[str, Any]]:
+        """`gcloud asset list --content-type=resource --format=json` の出力を読み込む"""
+        with open(path) as f:
+            return json.load(f)
+
+    @staticmethod
+    def index_assets(assets: List[Dict[str, Any]]) -> Tuple[Dict[Tuple[str, str], Dict], Dict[Tuple[str, str], List]]:
+        """
+        稼働リソースを索引化
+
+        Returns:
+            ((Terraformタイプ, 正規化リンク) → エントリ, (Terraformタイプ, 名前) → エントリのリスト)
+        """
+        by_link = {}
+        by_name = defaultdict(list)
+        for asset in assets:
+            tf_type = ASSET_TYPES.get(asset.get('assetType'))
+            if tf_type is None:
+                continue
+            data = (asset.get('resource') or {}).get('data') or {}
+            if tf_type == 'google_compute_instance' and _is_managed_by_group(data):
+                continue
+
+            key_attr = RESOURCE_TYPES[tf_type].get('key')
+            if key_attr:
+                link = data.get(key_attr[1]) or asset['name']
+            else:
+                link = normalize_link(data.get('selfLink') or asset['name'])
+
+            entry = {'type': tf_type, 'name': asset['name'], 'key': link, 'data': data, 'matched': False}
+            by_link[(tf_type, link)] = entry
+            by_name[(tf_type, link.rsplit('/', 1)[-1])].append(entry)
+
+        return by_link, by_name
+
+    @staticmethod
+    def _match(resource, by_link, by_name) -> Optional[Dict[str, Any]]:
+        """state のリソースに対応する稼働リソースを探す（self-link → 名前の順）"""
+        tf_type = resource['type']
+        attributes = resource['attributes']
+
+        key_attr = RESOURCE_TYPES[tf_type].get('key')
+        if key_attr:
+            candidates = [attributes.get(key_attr[0])]
+        else:
+            candidates = [attributes.get('self_link'), attributes.get('id')]
+        for link in candidates:
+            if link:
+                entry = by_link.get((tf_type, link if key_attr else normalize_link(link)))
+                if entry is not None:
+                    return entry
+
+        # self-link の表記が揃わない場合（プロジェクト番号表記など）は名前が一意なら対応付ける
+        name = attributes.get('name') or (candidates[0] or '').rsplit('/', 1)[-1]
+        entries = [e for e in by_name.get((tf_type, name), ()) if not e['matched']]
+        return entries[0] if len(entries) == 1 else None
+
+    @staticmethod
+    def diff_attributes(tf_type: str, attributes: Dict[str, Any], data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """比較対象の属性の差分を返す"""
+        diffs = []
+        for tf_path, asset_path, how in RESOURCE_TYPES[tf_type]['attributes']:
+            expected = _lookup(attributes, tf_path)
+            if expected is None:
+                # state 側で未設定の属性は比較しない
+                continue
+            actual = _lookup(data, asset_path)
+            if _normalize_value(expected, how) != _normalize_value(actual, how):
+                diffs.append({'attribute': tf_path, 'expected': expected, 'actual': actual})
+        return diffs
+
+    def detect(self, state_paths: List[str], assets: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """
+        ドリフトを検出
+
+        稼働リソースを一度だけ取得して索引化し、state はリソースごとに
+        ストリーミングで読みながら索引を引いて突き合わせる。
+
+        Args:
+            state_paths: state / `terraform show -json` の出力ファイル
+            assets: 稼働リソース（未指定の場合は Cloud Asset Inventory から取得）
+
+        Returns:
+            missing（state にあって稼働していない）、extra（state に無い）、
+            drifted（属性が異なる）の各リスト
+        """
+        if assets is None:
+            assets = self.fetch_assets()
+        by_link, by_name = self.index_assets(assets)
+
+        missing = []
+        drifted = []
+        matched = 0
+        skipped = defaultdict(int)
+
+        for path in state_paths:
+            for resource in iter_state_resources(path):
+                if resource['type'] not in RESOURCE_TYPES:
+                    skipped[resource['type']] += 1
+                    continue
+
+                entry = self._match(resource, by_link, by_name)
+                if entry is None:
+                    missing.append({'address': resource['address'], 'type': resource['type']})
+                    continue
+
+                entry['matched'] = True
+                matched += 1
+                diffs = self.diff_attributes(resource['type'], resource['attributes'], entry['data'])
+                if diffs:
+                    drifted.append({'address': resource['address'], 'resource': entry['key'], 'diffs': diffs})
+
+        extra = [
+            {'type': e['type'], 'resource': e['key']}
+            for e in sorted(by_link.values(), key=lambda e: (e['type'], e['key']))
+            if not e['matched']
+        ]
+
+        logger.info(
+            "Drift detection completed",
+            matched=matched,
+            missing=len(missing),
+            extra=len(extra),
+            drifted=len(drifted)
+        )
+
+        return {
+            'matched': matched,
+            'missing': missing,
+            'extra': extra,
+            'drifted': drifted,
+            'skipped_types': dict(sorted(skipped.items())),
+        }
@@ -0,0 +1,294 @@
+"""
+容量予測ツール
+フリート全体のメトリクス系列にトレンド・季節モデルをまとめて当てはめ、
+しきい値到達までの時間を予測
+"""
+
+import warnings
+from typing import Dict, Any, Optional, Sequence, Union
+
+import numpy as np
+import structlog
+
+logger = structlog.get_logger()
+
+# パラメータ探索の候補（全系列・全候補を一度に評価する）
+DEFAULT_ALPHAS = (0.05, 0.1, 0.2, 0.4)
+# トレンドの平滑化係数（alpha に対する比率）
+DEFAULT_BETA_RATIOS = (0.01, 0.05, 0.2)
+DEFAULT_GAMMA = 0.1
+
+# 信頼水準 → 正規分布の両側z値
+Z_SCORES = {0.8: 1.2816, 0.9: 1.6449, 0.95: 1.96, 0.99: 2.5758}
+
+
+class CapacityForecaster:
+    """
+    加法型 Holt-Winters（ETS(A,A,A)、季節なしの場合は Holt の線形トレンド）による容量予測
+
+    状態は [系列数] の配列で保持し、時間方向のループ1回ごとに全系列を
+    まとめて更新する。パラメータ探索も候補軸を追加した配列演算で行う。
+    """
+
+    def __init__(
+        self,
+        step_seconds: int = 300,
+        season_length: int = 0,
+        alphas: Sequence[float] = DEFAULT_ALPHAS,
+        beta_ratios: Sequence[float] = DEFAULT_BETA_RATIOS,
+        gamma: float = DEFAULT_GAMMA
+    ):
+        """
+        初期化
+
+        Args:
+            step_seconds: 系列のグリッド間隔（秒）
+            season_length: 季節周期（グリッド数、0の場合は季節成分なし。5分間隔の日次周期なら288）
+            alphas: レベル平滑化係数の候補
+            beta_ratios: トレンド平滑化係数の候補（alpha に対する比率）
+            gamma: 季節成分の平滑化係数
+        """
+        self.step_seconds = step_seconds
+        self.season_length = season_length
+        self.gamma = gamma
+
+        grid = np.array([(a, a * r) for a in alphas for r in beta_ratios])
+        self._alpha_grid = grid[:, 0:1]
+        self._beta_grid = grid[:, 1:2]
+
+        self.alpha = None
+        self.beta = None
+        self.level = None
+        self.trend = None
+        self.season = None
+        self.sse = None
+        self.count = None
+        self.steps = 0
+
+    @property
+    def fitted(self) -> bool:
+        """学習済みかどうか"""
+        return self.level is not None
+
+    @staticmethod
+    def _initial_state(values: np.ndarray, season_length: int):
+        """系列の先頭からレベル・トレンド・季節成分の初期値を求める"""
+        n, length = values.shape
+        season = np.zeros((n, max(season_length, 1)))
+
+        with warnings.catch_warnings():
+            # 全て欠損の系列は NaN になるが、後で 0 に置き換える
+            warnings.simplefilter('ignore', RuntimeWarning)
+            if season_length and length >= 2 * season_length:
+                cycles = values[:, :2 * season_length].reshape(n, 2, season_length)
+                cycle_means = np.nanmean(cycles, axis=2)
+                level = cycle_means[:, 0]
+                trend = (cycle_means[:, 1] - cycle_means[:, 0]) / season_length
+                season = np.nanmean(cycles - cycle_means[:, :, None], axis=1)
+            else:
+                head = values[:, :12]
+                level = np.nanmean(head, axis=1)
+                trend = np.nanmean(np.diff(head, axis=1), axis=1)
+
+        return (
+            np.nan_to_num(level),
+            np.nan_to_num(trend),
+            np.nan_to_num(season),
+        )
+
+    def _run(self, values, alpha, beta, level, trend, season, sse, count, start_step):
+        """
+        平滑化の更新式を時間方向に適用（先頭軸以外の形状は任意）
+
+        values: [系列数 × 時間]、その他の状態は [..., 系列数]（season は [..., 系列数, 周期]）
+        """
+        m = season.shape[-1]
+        use_season = self.season_length > 0
+
+        for t in range(values.shape[1]):
+            y = values[:, t]
+            observed = ~np.isnan(y)
+            idx = (start_step + t) % m
+
+            seasonal = season[..., idx] if use_season else 0.0
+            error = np.where(observed, np.nan_to_num(y) - (level + trend + seasonal), 0.0)
+
+            level = level + trend + alpha * error
+            trend = trend + beta * error
+            if use_season:
+                season[..., idx] = seasonal + self.gamma * error
+
+            sse = sse + error * error
+            count = count + observed
+
+        return level, trend, season, sse, count
+
+    def fit(self, values: np.ndarray) -> 'CapacityForecaster':
+        """
+        全系列にモデルを当てはめる
+
+        Args:
+            values: [系列数 × 時間] の行列（欠損は NaN）
+
+        Returns:
+            self
+        """
+        values = np.asarray(values, dtype=float)
+        n = values.shape[0]
+        g = self._alpha_grid.shape[0]
+
+        level, trend, season = self._initial_state(values, self.season_length)
+
+        # 候補軸 [候補数, 系列数] に拡張して全候補を一度に評価
+        level_g = np.broadcast_to(level, (g, n)).copy()
+        trend_g = np.broadcast_to(trend, (g, n)).copy()
+        season_g = np.broadcast_to(season, (g,) + season.shape).copy()
+        zeros = np.zeros((g, n))
+
+        level_g, trend_g, season_g, sse_g, count_g = self._run(
+            values, self._alpha_grid, self._beta_grid,
+            level_g, trend_g, season_g, zeros, zeros.copy(), 0
+        )
+
+        mse = sse_g / np.maximum(count_g, 1)
+        best = np.argmin(mse, axis=0)
+        cols = np.arange(n)
+
+        self.alpha = self._alpha_grid[best, 0]
+        self.beta = self._beta_grid[best, 0]
+        self.level = level_g[best, cols]
+        self.trend = trend_g[best, cols]
+        self.season = season_g[best, cols]
+        self.sse = sse_g[best, cols]
+        self.count = count_g[best, cols]
+        self.steps = values.shape[1]
+
+        logger.info("Fitted capacity forecaster", series=n, points=values.shape[1])
+        return self
+
+    def update(self, values: np.ndarray) -> 'CapacityForecaster':
+        """
+        新しいデータポイントで状態を更新（再学習なし）
+
+        Args:
+            values: [系列数] または [系列数 × 新規時間] の行列（欠損は NaN）
+
+        Returns:
+            self
+        """
+        if not self.fitted:
+            raise RuntimeError("fit() を先に実行してください")
+
+        values = np.asarray(values, dtype=float)
+        if values.ndim == 1:
+            values = values[:, None]
+
+        self.level, self.trend, self.season, self.sse, self.count = self._run(
+            values, self.alpha, self.beta,
+            self.level, self.trend, self.season, self.sse, self.count, self.steps
+        )
+        self.steps += values.shape[1]
+        return self
+
+    def forecast(self, horizon: int, confidence: float = 0.95) -> Dict[str, np.ndarray]:
+        """
+        将来の値と予測区間を計算
+
+        Args:
+            horizon: 予測するグリッド数
+            confidence: 予測区間の信頼水準（0.8 / 0.9 / 0.95 / 0.99）
+
+        Returns:
+            mean / lower / upper（いずれも [系列数 × horizon]）
+        """
+        if not self.fitted:
+            raise RuntimeError("fit() を先に実行してください")
+
+        h = np.arange(1, horizon + 1, dtype=float)
+        mean = self.level[:, None] + self.trend[:, None] * h
+        if self.season_length:
+            idx = (self.steps + np.arange(horizon)) % self.season_length
+            mean = mean + self.season[:, idx]
+
+        # ETS(A,A,N) の h期先予測分散（季節成分の寄与は無視した近似）
+        sigma2 = self.sse / np.maximum(self.count, 1)
+        a = self.alpha[:, None]
+        b = self.beta[:, None]
+        variance = sigma2[:, None] * (
+            1 + (h - 1) * (a * a + a * b * h + b * b * h * (2 * h - 1) / 6)
+        )
+        spread = Z_SCORES[confidence] * np.sqrt(variance)
+
+        return {'mean': mean, 'lower': mean - spread, 'upper': mean + spread}
+
+    def time_to_threshold(
+        self,
+        thresholds: Union[float, np.ndarray],
+        horizon: int,
+        confidence: float = 0.95
+    ) -> Dict[str, np.ndarray]:
+        """
+        しきい値に到達するまでの時間（時間単位）を推定
+
+        Args:
+            thresholds: しきい値（スカラーまたは [系列数]）
+            horizon: 探索するグリッド数
+            confidence: 予測区間の信頼水準
+
+        Returns:
+            expected（予測値が到達）/ earliest（上限が到達）/ latest（下限が到達）。
+            horizon 内に到達しない場合は NaN
+        """
+        paths = self.forecast(horizon, confidence)
+        thresholds = np.broadcast_to(np.asarray(thresholds, dtype=float), self.level.shape)[:, None]
+        hours_per_step = self.step_seconds / 3600
+
+        def first_crossing(path):
+            crossed = path >= thresholds
+            steps = np.argmax(crossed, axis=1) + 1.0
+            return np.where(crossed.any(axis=1), steps * hours_per_step, np.nan)
+
+        return {
+            'expected': first_crossing(paths['mean']),
+            'earliest': first_crossing(paths['upper']),
+            'latest': first_crossing(paths['lower']),
+        }
+
+    def report(
+        self,
+        names: Sequence[str],
+        thresholds: Union[float, np.ndarray],
+        horizon: int,
+        confidence: float = 0.95,
+        current: Optional[np.ndarray] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        系列ごとのしきい値到達予測をまとめる
+
+        Args:
+            names: 系列名（fit に渡した行列の行順）
+            thresholds: しきい値
+            horizon: 探索するグリッド数
+            confidence: 予測区間の信頼水準
+            current: 現在値（未指定の場合は平滑化後のレベル）
+
+        Returns:
+            系列名 → {current, trend_per_hour, expected_hours, earliest_hours, latest_hours}
+        """
+        ttt = self.time_to_threshold(thresholds, horizon, confidence)
+        current = self.level if current is None else current
+        trend_per_hour = self.trend * 3600 / self.step_seconds
+
+        def value(x):
+            return None if np.isnan(x) else round(float(x), 1)
+
+        return {
+            name: {
+                'current': float(current[i]),
+                'trend_per_hour': float(trend_per_hour[i]),
+                'expected_hours': value(ttt['expected'][i]),
+                'earliest_hours': value(ttt['earliest'][i]),
+                'latest_hours': value(ttt['latest'][i]),
+            }
+            for i, name in enumerate(names)
+        }
@@ -16,14 +16,16 @@ logger = structlog.get_logger()
 class GCPTools:
     """Google Cloud Platform 操作ツール"""
     
-    def __init__(self, project_id: Optional[str] = None):
+    def __init__(self, project_id: Optional[str] = None, journal=None):
         """
         初期化
         
         Args:
             project_id: GCPプロジェクトID（未指定の場合は環境変数から取得）
+            journal: 変更操作を記録する ActionJournal（未指定の場合は記録しない）
         """
         self.project_id = project_id or os.getenv('GCP_PROJECT_ID')
+        self.journal = journal
         self.region = os.getenv('GCP_REGION', 'asia-northeast1')
         self.zone = os.getenv('GCP_ZONE', 'asia-northeast1-a')
         
@@ -33,6 +35,22 @@ class GCPTools:
         self.credentials, _ = default()
         logger.info("GCPTools initialized", project_id=self.project_id)
     
+    def _record(self, action: str, instance_name: str, zone: str, success: bool, error: Optional[str] = None):
+        """
+        変更操作をジャーナルに記録
+
+        記録に失敗しても操作の結果は変わらないので、警告を出すだけにする。
+        """
+        if self.journal is None:
+            return
+        fields = {'project': self.project_id, 'zone': zone, 'success': success}
+        if error:
+            fields['error'] = error
+        try:
+            self.journal.append(action, instance_name, **fields)
+        except Exception as e:
+            logger.warning("Failed to record action", action=action, name=instance_name, error=str(e))
+
     # ==================== 安全な操作（読み取り専用） ====================
     
     def list_instances(self, zone: Optional[str] = None) -> List[Dict[str, Any]]:
@@ -182,10 +200,13 @@ class GCPTools:
             
             operation = client.start(request=request)
             logger.info("Started instance", name=instance_name, zone=zone)
-            return True
         except Exception as e:
             logger.error("Failed to start instance", name=instance_name, error=str(e))
+            self._record('start_instance', instance_name, zone, False, str(e))
             return False
+
+        self._record('start_instance', instance_name, zone, True)
+        return True
     
     def stop_instance(self, instance_name: str, zone: Optional[str] = None) -> bool:
         """
@@ -210,11 +231,45 @@ class GCPTools:
             
             operation = client.stop(request=request)
             logger.warning("Stopped instance", name=instance_name, zone=zone)
-            return True
         except Exception as e:
             logger.error("Failed to stop instance", name=instance_name, error=str(e))
+            self._record('stop_instance', instance_name, zone, False, str(e))
             return False
+
+        self._record('stop_instance', instance_name, zone, True)
+        return True
     
+    def reset_instance(self, instance_name: str, zone: Optional[str] = None) -> bool:
+        """
+        VMインスタンスをリセット（再起動）
+
+        Args:
+            instance_name: インスタンス名
+            zone: ゾーン名
+
+        Returns:
+            成功したかどうか
+        """
+        zone = zone or self.zone
+        client = compute_v1.InstancesClient()
+
+        try:
+            request = compute_v1.ResetInstanceRequest(
+                project=self.project_id,
+                zone=zone,
+                instance=instance_name,
+            )
+
+            operation = client.reset(request=request)
+            logger.warning("Reset instance", name=instance_name, zone=zone)
+        except Exception as e:
+            logger.error("Failed to reset instance", name=instance_name, error=str(e))
+            self._record('reset_instance', instance_name, zone, False, str(e))
+            return False
+
+        self._record('reset_instance', instance_name, zone, True)
+        return True
+
     # ==================== 危険な操作（削除） ====================
     
     def delete_instance(self, instance_name: str, zone: Optional[str] = None, 
@@ -246,8 +301,11 @@ class GCPTools:
             
             operation = client.delete(request=request)
             logger.critical("Deleted instance", name=instance_name, zone=zone)
-            return True
         except Exception as e:
             logger.error("Failed to delete instance", name=instance_name, error=str(e))
+            self._record('delete_instance', instance_name, zone, False, str(e))
             return False
 
+        self._record('delete_instance', instance_name, zone, True)
+        return True
+
@@ -0,0 +1,582 @@
+"""
+インベントリツール
+Cloud Asset Inventory のフィードで差分更新する、索引付きのインメモリ・インベントリ
+"""
+
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Callable, Iterable, Tuple
+
+import structlog
+
+from .timeseries import to_epoch
+
+logger = structlog.get_logger()
+
+# インベントリで追跡するアセットタイプ
+INVENTORY_ASSET_TYPES = (
+    'compute.googleapis.com/Instance',
+    'storage.googleapis.com/Bucket',
+)
+
+
+def list_assets(project_id: str, asset_types: Iterable[str]) -> List[Dict[str, Any]]:
+    """
+    Cloud Asset Inventory からリソースを一括取得
+
+    Args:
+        project_id: GCPプロジェクトID
+        asset_types: 取得するアセットタイプ
+
+    Returns:
+        アセットのリスト（`gcloud asset list --format=json` と同じ形式）
+    """
+    # 一括取得のときだけ必要な依存なので遅延インポート
+    from google.cloud import asset_v1
+    from google.protobuf import json_format
+
+    try:
+        client = asset_v1.AssetServiceClient()
+        request = asset_v1.ListAssetsRequest(
+            parent=f"projects/{project_id}",
+            asset_types=sorted(asset_types),
+            content_type=asset_v1.ContentType.RESOURCE,
+            page_size=1000,
+        )
+        assets = [json_format.MessageToDict(asset._pb) for asset in client.list_assets(request=request)]
+        logger.info("Listed assets", project_id=project_id, count=len(assets))
+        return assets
+
+    except Exception as e:
+        logger.error("Failed to list assets", project_id=project_id, error=str(e))
+        raise
+
+
+def create_feed(project_id: str, feed_id: str, topic: str, asset_types: Iterable[str] = INVENTORY_ASSET_TYPES) -> str:
+    """
+    アセット変更を Pub/Sub トピックに送るフィードを作成
+
+    Args:
+        project_id: GCPプロジェクトID
+        feed_id: フィードID
+        topic: 送信先トピック（projects/PROJECT/topics/TOPIC）
+        asset_types: 対象アセットタイプ
+
+    Returns:
+        作成したフィードの名前
+    """
+    from google.cloud import asset_v1
+
+    client = asset_v1.AssetServiceClient()
+    feed = client.create_feed(request={
+        'parent': f"projects/{project_id}",
+        'feed_id': feed_id,
+        'feed': {
+            'asset_types': list(asset_types),
+            'content_type': asset_v1.ContentType.RESOURCE,
+            'feed_output_config': {'pubsub_destination': {'topic': topic}},
+        },
+    })
+    logger.info("Created asset feed", feed=feed.name, topic=topic)
+    return feed.name
+
+
+def record_from_asset(asset: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    アセットをインベントリのレコードに変換
+
+    Args:
+        asset: アセット（assetType, name, resource.data, updateTime）
+
+    Returns:
+        レコード（name, type, zone, status, labels など）
+    """
+    data = (asset.get('resource') or {}).get('data') or {}
+    record = {
+        'id': asset['name'],
+        'type': asset.get('assetType'),
+        'name': data.get('name') or asset['name'].rsplit('/', 1)[-1],
+        'zone': None,
+        'status': None,
+        'labels': dict(data.get('labels') or {}),
+        'updated': to_epoch(asset['updateTime']) if asset.get('updateTime') else 0.0,
+    }
+
+    if record['type'] == 'compute.googleapis.com/Instance':
+        interfaces = data.get('networkInterfaces') or [{}]
+        access_configs = interfaces[0].get('accessConfigs') or [{}]
+        record.update({
+            'zone': (data.get('zone') or '').rsplit('/', 1)[-1] or None,
+            'status': data.get('status'),
+            'machine_type': (data.get('machineType') or '').rsplit('/', 1)[-1] or None,
+            'internal_ip': interfaces[0].get('networkIP'),
+            'external_ip': access_configs[0].get('natIP'),
+            'tags': (data.get('tags') or {}).get('items', []),
+        })
+    elif record['type'] == 'storage.googleapis.com/Bucket':
+        record.update({
+            'location': data.get('location'),
+            'storage_class': data.get('storageClass'),
+        })
+
+    return record
+
+
+class Inventory:
+    """
+    索引付きのインメモリ・インベントリ
+
+    レコードはアセットの完全名をキーに保持し、名前・ゾーン・ラベル・状態・タイプごとの
+    索引（値 → キーの集合）を更新のたびに付け替える。検索は指定された条件の
+    索引を小さい順に積集合する。
+    """
+
+    INDEXED_FIELDS = ('name', 'zone', 'status', 'type')
+
+    def __init__(self):
+        """初期化"""
+        self.records = {}
+        self._index = {field: defaultdict(set) for field in self.INDEXED_FIELDS}
+        self._labels = defaultdict(set)
+        # 削除済みアセットの最終更新時刻（遅れて届いた古い更新で復活させないため）
+        self._tombstones = {}
+        self.last_resync = None
+        # スナップショットから復元した場合、その時点（UNIX秒）
+        self.as_of = None
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def _add_to_index(self, record: Dict[str, Any]):
+        key = record['id']
+        for field in self.INDEXED_FIELDS:
+            if record.get(field) is not None:
+                self._index[field][record[field]].add(key)
+        for label in record['labels'].items():
+            self._labels[label].add(key)
+
+    def _remove_from_index(self, record: Dict[str, Any]):
+        key = record['id']
+        for field in self.INDEXED_FIELDS:
+            value = record.get(field)
+            if value is not None:
+                keys = self._index[field][value]
+                keys.discard(key)
+                if not keys:
+                    del self._index[field][value]
+        for label in record['labels'].items():
+            keys = self._labels[label]
+            keys.discard(key)
+            if not keys:
+                del self._labels[label]
+
+    def upsert(self, record: Dict[str, Any]) -> bool:
+        """
+        レコードを追加・更新
+
+        Returns:
+            反映した場合 True（手元より古い更新は無視して False）
+        """
+        with self._lock:
+            key = record['id']
+            current = self.records.get(key)
+            latest = current['updated'] if current else self._tombstones.get(key, -1.0)
+            if record['updated'] < latest:
+                return False
+
+            if current:
+                self._remove_from_index(current)
+            self._tombstones.pop(key, None)
+            self.records[key] = record
+            self._add_to_index(record)
+            return True
+
+    def remove(self, key: str, updated: float = 0.0) -> bool:
+        """
+        レコードを削除
+
+        Returns:
+            削除した場合 True
+        """
+        with self._lock:
+            current = self.records.get(key)
+            if current is None:
+                # 作成より先に削除が届いた場合に備えて記録だけ残す
+                self._tombstones[key] = max(updated, self._tombstones.get(key, updated))
+                return False
+            if updated < current['updated']:
+                return False
+            self._remove_from_index(current)
+            del self.records[key]
+            self._tombstones[key] = updated
+            return True
+
+    def apply_change(self, change: Dict[str, Any]) -> bool:
+        """
+        フィードの変更通知（TemporalAsset）を反映
+
+        Args:
+            change: {'asset': ..., 'deleted': bool, 'window': {'startTime': ...}}
+
+        Returns:
+            反映した場合 True
+        """
+        asset = change['asset']
+        updated = change.get('window', {}).get('startTime') or asset.get('updateTime')
+        updated = to_epoch(updated) if updated else time.time()
+
+        if change.get('deleted'):
+            return self.remove(asset['name'], updated)
+
+        record = record_from_asset(asset)
+        record['updated'] = updated
+        return self.upsert(record)
+
+    def resync(self, assets: List[Dict[str, Any]], as_of: float) -> Dict[str, int]:
+        """
+        一括取得した全アセットで整合性を取り直す
+
+        レコードの更新時刻はアセット自身の updateTime のままにする（一覧はフィードより遅れることがあり、
+        取得時刻を付けると古い状態が新しく見え、後から届いた本当の更新を古いとして捨ててしまうため）。
+        as_of は一覧に無いレコードの削除判定と、その削除記録の時刻にだけ使う。
+
+        Args:
+            assets: 一括取得したアセット
+            as_of: 一括取得を開始した時刻（UNIX秒）
+
+        Returns:
+            追加・更新・削除の件数
+        """
+        with self._lock:
+            counts = {'upserted': 0, 'removed': 0}
+            seen = set()
+            for asset in assets:
+                record = record_from_asset(asset)
+                seen.add(record['id'])
+                current = self.records.get(record['id'])
+                # 手元（フィードで反映済み）より古い状態は upsert が無視する
+                if self.upsert(record) and current != record:
+                    counts['upserted'] += 1
+
+            # 一覧からも消えた以前の削除記録はもう不要（一覧に残っている間は、遅れた状態で復活させないため残す）
+            self._tombstones = {k: t for k, t in self._tombstones.items() if t > as_of or k in seen}
+
+            for key in [k for k, r in self.records.items() if k not in seen and r['updated'] <= as_of]:
+                if self.remove(key, as_of):
+                    counts['removed'] += 1
+            self.last_resync = as_of
+
+        logger.info("Inventory resynced", records=len(self.records), **counts)
+        return counts
+
+    def find(
+        self,
+        name: Optional[str] = None,
+        zone: Optional[str] = None,
+        status: Optional[str] = None,
+        asset_type: Optional[str] = None,
+        labels: Optional[Dict[str, str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        条件に一致するレコードを検索
+
+        Args:
+            name: リソース名
+            zone: ゾーン
+            status: 状態（RUNNING, TERMINATED など）
+            asset_type: アセットタイプ
+            labels: ラベル（すべて一致するもの）
+
+        Returns:
+            レコードのリスト（名前順）
+        """
+        with self._lock:
+            conditions = [
+                self._index[field].get(value, set())
+                for field, value in (('name', name), ('zone', zone), ('status', status), ('type', asset_type))
+                if value is not None
+            ]
+            conditions += [self._labels.get((k, v), set()) for k, v in (labels or {}).items()]
+
+            if conditions:
+                conditions.sort(key=len)
+                keys = set(conditions[0]).intersection(*conditions[1:])
+            else:
+                keys = self.records.keys()
+
+            return sorted((self.records[k] for k in keys), key=lambda r: (r['name'], r['id']))
+
+    def instances(self, **conditions) -> List[Dict[str, Any]]:
+        """VMインスタンスを検索（条件は find と同じ）"""
+        return self.find(asset_type='compute.googleapis.com/Instance', **conditions)
+
+    def save(self, path: str, as_of: Optional[float] = None):
+        """
+        スナップショットをファイルに保存（一時ファイルに書いてから置き換える）
+
+        Args:
+            path: 保存先
+            as_of: スナップショットの時点（UNIX秒、未指定の場合は現在時刻）
+        """
+        with self._lock:
+            snapshot = {
+                'version': 1,
+                'as_of': as_of if as_of is not None else time.time(),
+                'last_resync': self.last_resync,
+                'records': list(self.records.values()),
+                'tombstones': self._tombstones,
+            }
+            data = json.dumps(snapshot, ensure_ascii=False)
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # 同じスナップショットを別プロセス（inventory --snapshot と Ansible）が保存するので一時ファイル名は毎回変える
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name + '.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        logger.info("Inventory snapshot saved", path=str(path), records=len(snapshot['records']))
+
+    @classmethod
+    def load(cls, path: str) -> 'Inventory':
+        """
+        スナップショットから復元（索引は読み込み時に作り直す）
+
+        Args:
+            path: スナップショットファイル
+
+        Returns:
+            Inventory（as_of にスナップショットの時点を持つ）
+        """
+        snapshot = json.loads(Path(path).read_text())
+        inventory = cls()
+        for record in snapshot['records']:
+            inventory.upsert(record)
+        inventory._tombstones = dict(snapshot.get('tombstones') or {})
+        inventory.last_resync = snapshot.get('last_resync')
+        inventory.as_of = snapshot.get('as_of')
+        return inventory
+
+
+class QueueFeedSource:
+    """プロセス内キューの変更通知（テスト・ローカル用）"""
+
+    def __init__(self, changes: Optional['queue.Queue'] = None):
+        """
+        初期化
+
+        Args:
+            changes: 変更通知（TemporalAsset の dict）を入れるキュー
+        """
+        self.changes = changes or queue.Queue()
+
+    def pull(self, max_messages: int = 100, timeout: float = 1.0) -> List[Tuple[Any, Dict[str, Any]]]:
+        """変更通知を取り出す（(ack_id, 変更) のリスト）"""
+        batch = []
+        try:
+            batch.append((None, self.changes.get(timeout=timeout)))
+            while len(batch) < max_messages:
+                batch.append((None, self.changes.get_nowait()))
+        except queue.Empty:
+            pass
+        return batch
+
+    def ack(self, ack_ids: List[Any]):
+        """キューは取り出した時点で消えるので何もしない"""
+
+
+class FileFeedSource:
+    """
+    JSON Lines ファイルの変更通知（テスト・ローカル用）
+
+    ファイル末尾を追いかけ、読み終えた位置を ack で進める。
+    """
+
+    def __init__(self, path: str):
+        """
+        初期化
+
+        Args:
+            path: 変更通知を1行1件で追記するファイル
+        """
+        self.path = Path(path)
+        self.offset = 0
+
+    def pull(self, max_messages: int = 100, timeout: float = 1.0) -> List[Tuple[Any, Dict[str, Any]]]:
+        """変更通知を取り出す（ack_id は読み終えた位置）"""
+        deadline = time.monotonic() + timeout
+        while True:
+            batch = []
+            if self.path.exists():
+                with open(self.path, 'rb') as f:
+                    f.seek(self.offset)
+                    position = self.offset
+                    for line in f:
+                        if not line.endswith(b'\n'):
+                            # 書き込み途中の行は次回に読む
+                            break
+                        position += len(line)
+                        if line.strip():
+                            batch.append((position, json.loads(line)))
+                        if len(batch) >= max_messages:
+                            break
+            if batch or time.monotonic() >= deadline:
+                return batch
+            time.sleep(min(0.2, max(0.0, deadline - time.monotonic())))
+
+    def ack(self, ack_ids: List[Any]):
+        """読み終えた位置まで進める"""
+        if ack_ids:
+            self.offset = max(self.offset, max(ack_ids))
+
+
+class PubSubFeedSource:
+    """Cloud Asset Inventory フィードの Pub/Sub サブスクリプション"""
+
+    def __init__(self, subscription: str, project_id: Optional[str] = None):
+        """
+        初期化
+
+        Args:
+            subscription: サブスクリプション名（完全名、または project_id と組み合わせる短い名前）
+            project_id: GCPプロジェクトID（未指定の場合は環境変数から取得）
+        """
+        from google.cloud import pubsub_v1
+
+        if not subscription.startswith('projects/'):
+            project_id = project_id or os.getenv('GCP_PROJECT_ID')
+            if not project_id:
+                raise ValueError("GCP_PROJECT_ID が設定されていません")
+            subscription = f"projects/{project_id}/subscriptions/{subscription}"
+
+        self.subscription = subscription
+        self.client = pubsub_v1.SubscriberClient()
+
+    def pull(self, max_messages: int = 100, timeout: float = 10.0) -> List[Tuple[Any, Dict[str, Any]]]:
+        """変更通知を取り出す（ack_id は Pub/Sub の ack ID）"""
+        from google.api_core import exceptions
+
+        try:
+            response = self.client.pull(
+                request={'subscription': self.subscription, 'max_messages': max_messages},
+                timeout=timeout,
+            )
+        except exceptions.DeadlineExceeded:
+            return []
+
+        return [(m.ack_id, json.loads(m.message.data)) for m in response.received_messages]
+
+    def ack(self, ack_ids: List[Any]):
+        """反映済みのメッセージを確認応答"""
+        if ack_ids:
+            self.client.acknowledge(request={'subscription': self.subscription, 'ack_ids': list(ack_ids)})
+
+
+class InventorySync:
+    """
+    変更フィードによるインベントリの同期
+
+    通常はフィードの差分だけを反映し、resync_interval ごとに一括取得で整合性を取り直す。
+    """
+
+    def __init__(
+        self,
+        inventory: Inventory,
+        source,
+        fetch_all: Callable[[], List[Dict[str, Any]]],
+        resync_interval: float = 3600,
+        clock: Callable[[], float] = time.time
+    ):
+        """
+        初期化
+
+        Args:
+            inventory: 更新するインベントリ
+            source: 変更通知の取得元（pull / ack を持つもの）
+            fetch_all: 全アセットを一括取得する関数
+            resync_interval: 一括取得の間隔（秒）
+            clock: 時刻関数（テスト用）
+        """
+        self.inventory = inventory
+        self.source = source
+        self.fetch_all = fetch_all
+        self.resync_interval = resync_interval
+        self.clock = clock
+        self.stats = {'changes': 0, 'applied': 0, 'stale': 0, 'resyncs': 0}
+
+    @classmethod
+    def from_project(
+        cls,
+        inventory: Inventory,
+        source,
+        project_id: Optional[str] = None,
+        asset_types: Iterable[str] = INVENTORY_ASSET_TYPES,
+        resync_interval: float = 3600
+    ) -> 'InventorySync':
+        """Cloud Asset Inventory の一括取得を使って生成"""
+        project_id = project_id or os.getenv('GCP_PROJECT_ID')
+        if not project_id:
+            raise ValueError("GCP_PROJECT_ID が設定されていません")
+        asset_types = tuple(asset_types)
+        return cls(inventory, source, lambda: list_assets(project_id, asset_types), resync_interval)
+
+    def resync(self) -> Dict[str, int]:
+        """一括取得して整合性を取り直す"""
+        as_of = self.clock()
+        counts = self.inventory.resync(self.fetch_all(), as_of)
+        self.stats['resyncs'] += 1
+        return counts
+
+    def run_once(self, max_messages: int = 100, timeout: float = 1.0) -> int:
+        """
+        変更通知を1バッチ反映（期限が来ていれば一括取得も行う）
+
+        Returns:
+            反映した変更の件数
+        """
+        last = self.inventory.last_resync
+        if last is None or self.clock() - last >= self.resync_interval:
+            self.resync()
+
+        batch = self.source.pull(max_messages=max_messages, timeout=timeout)
+        applied = 0
+        for _, change in batch:
+            if self.inventory.apply_change(change):
+                applied += 1
+
+        # 反映し終えてから確認応答する（途中で落ちた場合は再配信される）
+        self.source.ack([ack_id for ack_id, _ in batch])
+
+        self.stats['changes'] += len(batch)
+        self.stats['applied'] += applied
+        self.stats['stale'] += len(batch) - applied
+        if batch:
+            logger.info("Applied inventory changes", changes=len(batch), applied=applied)
+        return applied
+
+    def run(self, stop: Optional[threading.Event] = None, timeout: float = 10.0):
+        """
+        停止されるまで同期を続ける
+
+        Args:
+            stop: 停止イベント
+            timeout: 1回の取得の待ち時間（秒）
+        """
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            try:
+                self.run_once(timeout=timeout)
+            except Exception as e:
+                logger.error("Inventory sync failed", error=str(e))
+                stop.wait(min(timeout, 5.0))
@@ -0,0 +1,481 @@
+"""
+操作ジャーナル
+エージェントが実行した変更操作を追記専用のファイルに記録し、監査・再生に使う
+"""
+
+import fcntl
+import json
+import os
+import queue
+import struct
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Callable, Iterator, Tuple
+
+import google_crc32c
+import structlog
+
+logger = structlog.get_logger()
+
+# レコードの枠: ペイロード長, ペイロードの CRC32C（いずれも little endian の uint32）
+RECORD_HEADER = struct.Struct('<II')
+SEGMENT_SUFFIX = '.log'
+INDEX_SUFFIX = '.idx'
+# 書き込むプロセスが排他ロックを取るファイル
+LOCK_NAME = 'LOCK'
+
+# 再生時に ActionExecutor のアクション名へ読み替える操作
+REPLAY_ACTIONS = {
+    'start_instance': 'start_instance',
+    'stop_instance': 'stop_instance',
+    'reset_instance': 'restart_instance',
+}
+
+
+def _encode(record: Dict[str, Any]) -> bytes:
+    payload = json.dumps(record, ensure_ascii=False, separators=(',', ':'), default=str).encode()
+    return RECORD_HEADER.pack(len(payload), google_crc32c.value(payload)) + payload
+
+
+def scan_segment(path: Path, start: int = 0) -> Tuple[List[Tuple[int, Dict[str, Any]]], int]:
+    """
+    セグメントファイルを検証しながら読む
+
+    Args:
+        path: セグメントファイル
+        start: 読み始めるオフセット（レコードの境界）
+
+    Returns:
+        ([(オフセット, レコード)], 正しく読めた末尾のオフセット)
+        末尾が書きかけ・チェックサム不一致の場合はその手前で止まる
+    """
+    records = []
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read()
+    pos = 0
+    while pos + RECORD_HEADER.size <= len(data):
+        length, crc = RECORD_HEADER.unpack_from(data, pos)
+        body = pos + RECORD_HEADER.size
+        payload = data[body:body + length]
+        if len(payload) < length or google_crc32c.value(payload) != crc:
+            break
+        records.append((start + pos, json.loads(payload)))
+        pos = body + length
+    return records, start + pos
+
+
+class _Segment:
+    """セグメント1つ分の索引（リソース → [(時刻, オフセット)]）"""
+
+    def __init__(self, path: Path, first_seq: int):
+        self.path = path
+        self.first_seq = first_seq
+        self.min_ts = None
+        self.max_ts = None
+        self.count = 0
+        self.resources = {}
+
+    def add(self, offset: int, record: Dict[str, Any]):
+        ts = record['ts']
+        self.min_ts = ts if self.min_ts is None else min(self.min_ts, ts)
+        self.max_ts = ts if self.max_ts is None else max(self.max_ts, ts)
+        self.count += 1
+        entries = self.resources.setdefault(record.get('resource') or '', [])
+        if entries and entries[-1][0] > ts:
+            # 時計が戻った場合も時刻順を保つ
+            entries.insert(bisect_right(entries, (ts, offset)), (ts, offset))
+        else:
+            entries.append((ts, offset))
+
+    def overlaps(self, since: Optional[float], until: Optional[float]) -> bool:
+        if self.count == 0:
+            return False
+        return (since is None or self.max_ts >= since) and (until is None or self.min_ts <= until)
+
+    def save_index(self):
+        """封印したセグメントの索引を保存（一時ファイルに書いてから置き換える）"""
+        index_path = self.path.with_suffix(INDEX_SUFFIX)
+        tmp = index_path.with_name(index_path.name + '.tmp')
+        tmp.write_text(json.dumps({
+            'first_seq': self.first_seq,
+            'min_ts': self.min_ts,
+            'max_ts': self.max_ts,
+            'count': self.count,
+            'resources': self.resources,
+        }))
+        os.replace(tmp, index_path)
+
+    @classmethod
+    def load_index(cls, path: Path) -> Optional['_Segment']:
+        index_path = path.with_suffix(INDEX_SUFFIX)
+        if not index_path.exists():
+            return None
+        with open(index_path) as f:
+            data = json.load(f)
+        segment = cls(path, data['first_seq'])
+        segment.min_ts, segment.max_ts, segment.count = data['min_ts'], data['max_ts'], data['count']
+        segment.resources = {k: [tuple(e) for e in v] for k, v in data['resources'].items()}
+        return segment
+
+
+class ActionJournal:
+    """
+    追記専用の操作ジャーナル
+
+    レコードは「長さ + CRC32C + JSON」の枠で追記し、segment_bytes を超えたら新しい
+    セグメントファイルに切り替える。書き込みは専用スレッドがまとめて行い、溜まった
+    レコードを1回の fsync で確定させる（グループコミット）ため、操作が集中しても
+    fsync の回数はバッチ数で済む。
+
+    封印したセグメントはリソース → (時刻, オフセット) の索引を .idx に保存するので、
+    起動時に読み直すのは書き込み中のセグメントだけで、検索は該当レコードだけを読む。
+
+    start / stop / remediate / ask は別々のプロセスで同じディレクトリに書くため、
+    書き込みはバッチごとに LOCK ファイルの排他ロック（flock）を取り、他のプロセスが
+    追記したレコードを取り込んでから通し番号を振って書く。ロック中に見つかった壊れた末尾
+    （書き込み途中で止まったプロセスのもの）は切り詰める。read_only で開いた場合は
+    ロックも書き込みスレッドも使わず、壊れた末尾は読み飛ばすだけにする。
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_bytes: int = 64 * 1024 * 1024,
+        max_batch: int = 1024,
+        clock: Callable[[], float] = time.time,
+        read_only: bool = False
+    ):
+        """
+        初期化
+
+        Args:
+            directory: ジャーナルのディレクトリ
+            segment_bytes: セグメントを切り替えるサイズ
+            max_batch: 1回の fsync でまとめる最大レコード数
+            clock: 時刻関数（テスト用）
+            read_only: 検索・再生だけに使う（記録はできない）
+        """
+        self.directory = Path(directory)
+        self.segment_bytes = segment_bytes
+        self.max_batch = max_batch
+        self.clock = clock
+        self.read_only = read_only
+        self.stats = {'records': 0, 'batches': 0}
+
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._segments = []
+        self._file = None
+        self._size = 0
+        self._next_seq = 1
+        self._error = None
+        self._lock_file = None
+        self._writer = None
+
+        if read_only:
+            self._refresh()
+        else:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._lock_file = open(self.directory / LOCK_NAME, 'a')
+            with self._exclusive():
+                self._refresh()
+                if not self._segments:
+                    self._new_segment(self._next_seq)
+            self._writer = threading.Thread(target=self._write_loop, name='action-journal', daemon=True)
+            self._writer.start()
+
+        logger.info(
+            "ActionJournal opened",
+            directory=str(self.directory),
+            segments=len(self._segments),
+            next_seq=self._next_seq,
+            read_only=read_only
+        )
+
+    @contextmanager
+    def _exclusive(self):
+        """他のプロセスの書き込みと排他する"""
+        fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _refresh(self):
+        """
+        ディスク上のセグメントを索引に取り込む（書き込みモードでは排他ロック中に呼ぶ）
+
+        前回読んだセグメントはその続きから、新しいセグメントは封印済みなら .idx から読む。
+        """
+        paths = sorted(self.directory.glob('*' + SEGMENT_SUFFIX))
+        if not paths:
+            return
+        if self._segments:
+            # 他のプロセスが追記した分（封印済みになっていることもある）
+            segment = self._segments[-1]
+            self._scan(segment, self._size, segment.path == paths[-1])
+        for path in paths[len(self._segments):]:
+            last = path == paths[-1]
+            segment = None if last else _Segment.load_index(path)
+            if segment is None:
+                segment = _Segment(path, int(path.stem))
+                self._scan(segment, 0, last)
+                if not last and not self.read_only:
+                    segment.save_index()
+            else:
+                self._next_seq = max(self._next_seq, segment.first_seq + segment.count)
+            with self._lock:
+                self._segments.append(segment)
+
+        if not self.read_only and (self._file is None or Path(self._file.name) != paths[-1]):
+            if self._file is not None:
+                self._file.close()
+            self._file = open(paths[-1], 'ab')
+
+    def _scan(self, segment: _Segment, start: int, last: bool):
+        """セグメントの start 以降を索引に取り込む（最後のセグメントなら壊れた末尾を切り詰める）"""
+        records, end = scan_segment(segment.path, start)
+        with self._lock:
+            for offset, record in records:
+                segment.add(offset, record)
+        if records:
+            self._next_seq = max(self._next_seq, records[-1][1]['seq'] + 1)
+        if not last:
+            return
+        self._size = end
+        # 排他ロック中に残っている書きかけは、書き込み途中で止まったプロセスのもの
+        if not self.read_only and end < segment.path.stat().st_size:
+            logger.warning("Truncating torn journal tail", segment=str(segment.path), offset=end)
+            with open(segment.path, 'r+b') as f:
+                f.truncate(end)
+                os.fsync(f.fileno())
+
+    def _new_segment(self, first_seq: int):
+        """新しいセグメントに切り替える（前のセグメントは索引を保存して封印）"""
+        if self._file is not None:
+            self._file.close()
+            self._segments[-1].save_index()
+        path = self.directory / f"{first_seq:020d}{SEGMENT_SUFFIX}"
+        self._file = open(path, 'ab')
+        self._size = 0
+        # 新しいファイルのディレクトリエントリも確定させる
+        dir_fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+        with self._lock:
+            self._segments.append(_Segment(path, first_seq))
+
+    def append(
+        self,
+        action: str,
+        resource: Optional[str],
+        wait: bool = True,
+        **fields
+    ) -> Optional[int]:
+        """
+        操作を記録
+
+        Args:
+            action: 操作名（start_instance など）
+            resource: 対象リソース名
+            wait: True の場合はディスクに確定するまで待つ
+            **fields: zone / project / success / dry_run / error など任意の項目
+
+        Returns:
+            レコードの通し番号（wait=False の場合は None、番号は書き込み時に振る）
+        """
+        if self.read_only:
+            raise RuntimeError("読み取り専用で開いたジャーナルには記録できません")
+        if self._error is not None:
+            raise RuntimeError(f"ジャーナルの書き込みに失敗しています: {self._error}")
+
+        done = threading.Event() if wait else None
+        record = {'seq': None, 'ts': self.clock(), 'action': action, 'resource': resource, **fields}
+        self._queue.put((record, done))
+
+        if done is None:
+            return None
+        done.wait()
+        if self._error is not None:
+            raise RuntimeError(f"ジャーナルの書き込みに失敗しました: {self._error}")
+        return record['seq']
+
+    def _write_loop(self):
+        """溜まったレコードをまとめて書き込み、1回の fsync で確定させる"""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+
+            try:
+                with self._exclusive():
+                    self._write_batch(batch)
+                self.stats['batches'] += 1
+                self.stats['records'] += len(batch)
+            except Exception as e:
+                logger.error("Failed to write journal", error=str(e))
+                self._error = str(e)
+            finally:
+                for _, done in batch:
+                    if done is not None:
+                        done.set()
+
+    def _write_batch(self, batch: List[Tuple[Dict[str, Any], Optional[threading.Event]]]):
+        """他のプロセスの追記を取り込んでから、通し番号を振って書き込む（排他ロック中に呼ぶ）"""
+        self._refresh()
+        written = []
+        for record, _ in batch:
+            if self._size >= self.segment_bytes:
+                self._flush(written)
+                written = []
+                self._new_segment(self._next_seq)
+            record['seq'] = self._next_seq
+            self._next_seq += 1
+            frame = _encode(record)
+            self._file.write(frame)
+            written.append((self._size, record))
+            self._size += len(frame)
+        self._flush(written)
+
+    def _flush(self, written: List[Tuple[int, Dict[str, Any]]]):
+        """書き込み済みのレコードを fsync してから索引に載せる"""
+        if not written:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        with self._lock:
+            segment = self._segments[-1]
+            for offset, record in written:
+                segment.add(offset, record)
+
+    def _read_at(self, path: Path, offsets: List[int]) -> Iterator[Dict[str, Any]]:
+        """指定したオフセットのレコードを読む（チェックサムが合わないものは飛ばす）"""
+        with open(path, 'rb') as f:
+            for offset in offsets:
+                f.seek(offset)
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    continue
+                length, crc = RECORD_HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) == length and google_crc32c.value(payload) == crc:
+                    yield json.loads(payload)
+                else:
+                    logger.warning("Corrupt journal record", segment=str(path), offset=offset)
+
+    def query(
+        self,
+        resource: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        action: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        記録を検索
+
+        Args:
+            resource: 対象リソース名（未指定の場合は全リソース）
+            since: この時刻（UNIX秒）以降
+            until: この時刻（UNIX秒）以前
+            action: 操作名
+
+        Returns:
+            レコードのリスト（時刻順）
+        """
+        low = float('-inf') if since is None else since
+        high = float('inf') if until is None else until
+        with self._lock:
+            plan = []
+            for segment in self._segments:
+                if not segment.overlaps(since, until):
+                    continue
+                names = [resource] if resource is not None else list(segment.resources)
+                offsets = []
+                for name in names:
+                    entries = segment.resources.get(name, [])
+                    i = bisect_left(entries, (low, -1))
+                    j = bisect_right(entries, (high, float('inf')))
+                    offsets.extend(offset for _, offset in entries[i:j])
+                if offsets:
+                    plan.append((segment.path, sorted(offsets)))
+
+        records = [
+            record
+            for path, offsets in plan
+            for record in self._read_at(path, offsets)
+            if action is None or record['action'] == action
+        ]
+        return sorted(records, key=lambda r: (r['ts'], r['seq']))
+
+    def replay(
+        self,
+        executor=None,
+        resource: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        記録した操作を ActionExecutor で再生する
+
+        Args:
+            executor: ActionExecutor（未指定の場合は dry-run の ActionExecutor）
+            resource: 対象リソース名
+            since: この時刻（UNIX秒）以降
+            until: この時刻（UNIX秒）以前
+
+        Returns:
+            各操作の実行結果（対応するアクションが無い操作・失敗した操作は skipped）
+        """
+        if executor is None:
+            from .remediation import ActionExecutor
+            executor = ActionExecutor(dry_run=True)
+
+        results = []
+        for record in self.query(resource, since, until):
+            if record.get('dry_run'):
+                continue
+            action = REPLAY_ACTIONS.get(record['action'])
+            base = {'seq': record['seq'], 'ts': record['ts'], 'recorded_action': record['action']}
+            # 元の操作が失敗していたものは再生しない
+            if action is None or action not in executor.handlers or record.get('success') is False:
+                results.append({**base, 'action': record['action'], 'resource': record['resource'],
+                                'skipped': True})
+                continue
+            event = {'resource': record['resource'], 'zone': record.get('zone'), 'project': record.get('project')}
+            results.append({**base, **executor.execute(action, event, record.get('params') or {})})
+
+        logger.info("Replayed journal", records=len(results), dry_run=executor.dry_run)
+        return results
+
+    def close(self):
+        """書き込み待ちのレコードを確定させて閉じる"""
+        if self._writer is None:
+            return
+        self._queue.put(None)
+        self._writer.join()
+        self._writer = None
+        self._file.close()
+        self._file = None
+        self._lock_file.close()
+
+    def __enter__(self) -> 'ActionJournal':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
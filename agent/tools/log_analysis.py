@@ -0,0 +1,272 @@
+"""
+アーカイブログ解析ツール
+Cloud Storage にアーカイブされた Nginx アクセスログをマルチコアで集計
+"""
+
+import gzip
+import mmap
+import os
+import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+
+from google.cloud import storage
+import structlog
+
+from .sketches import LatencySketch, TopK
+
+logger = structlog.get_logger()
+
+# combined 形式（末尾に $request_time があれば応答時間として扱う）
+ACCESS_LOG_PATTERN = re.compile(
+    rb'^(?P<client>\S+) \S+ \S+ \[(?P<time>[^\]]+)\] '
+    rb'"(?P<method>[A-Z]+) (?P<path>[^ "?]*)[^"]*" (?P<status>\d{3}) (?P<bytes>\d+|-)'
+    rb'(?: "[^"]*" "[^"]*")?(?: (?P<request_time>\d+(?:\.\d+)?))?'
+)
+
+# 1回に読み込むブロックサイズ（チャンク内をこの単位で走査する）
+BLOCK_SIZE = 16 * 1024 * 1024
+# 各ワーカーで保持する上位キー数
+TOPK_CAPACITY = 2000
+
+
+class LogAggregate:
+    """
+    アクセスログの部分集計（ワーカー間で結合可能）
+    """
+
+    def __init__(self):
+        self.lines = 0
+        self.unparsed = 0
+        self.bytes_sent = 0
+        self.status = Counter()
+        self.hourly = Counter()
+        self.paths = TopK(TOPK_CAPACITY)
+        self.clients = TopK(TOPK_CAPACITY)
+        self.latency = LatencySketch()
+
+    def add_lines(self, data: bytes):
+        """改行区切りのログを集計"""
+        match = ACCESS_LOG_PATTERN.match
+        status = self.status
+        hourly = self.hourly
+        paths = Counter()
+        clients = Counter()
+        latency = self.latency
+
+        for line in data.splitlines():
+            if not line:
+                continue
+            self.lines += 1
+            m = match(line)
+            if m is None:
+                self.unparsed += 1
+                continue
+
+            status[m['status']] += 1
+            # "10/Oct/2025:13:55:36 +0900" → 時間単位
+            hourly[m['time'][:14]] += 1
+            paths[m['path']] += 1
+            clients[m['client']] += 1
+            if m['bytes'] != b'-':
+                self.bytes_sent += int(m['bytes'])
+            if m['request_time'] is not None:
+                latency.add(float(m['request_time']))
+
+        self.paths.update(paths)
+        self.clients.update(clients)
+
+    def merge(self, other: 'LogAggregate') -> 'LogAggregate':
+        """別の部分集計を結合"""
+        self.lines += other.lines
+        self.unparsed += other.unparsed
+        self.bytes_sent += other.bytes_sent
+        self.status.update(other.status)
+        self.hourly.update(other.hourly)
+        self.paths.merge(other.paths)
+        self.clients.merge(other.clients)
+        self.latency.merge(other.latency)
+        return self
+
+    def report(self, top: int = 10) -> Dict[str, Any]:
+        """集計結果をまとめる"""
+        def decode(value):
+            return value.decode('utf-8', 'replace')
+
+        return {
+            'lines': self.lines,
+            'unparsed': self.unparsed,
+            'bytes_sent': self.bytes_sent,
+            'status': {decode(k): v for k, v in sorted(self.status.items())},
+            'hourly': {decode(k): v for k, v in sorted(self.hourly.items())},
+            'top_paths': [(decode(k), v) for k, v in self.paths.most_common(top)],
+            'top_clients': [(decode(k), v) for k, v in self.clients.most_common(top)],
+            'latency': self.latency.summary(),
+        }
+
+
+def _analyze_range(path: str, start: int, end: int) -> LogAggregate:
+    """mmap したファイルの [start, end) を集計（ワーカープロセスで実行）"""
+    aggregate = LogAggregate()
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        pos = start
+        while pos < end:
+            stop = min(pos + BLOCK_SIZE, end)
+            if stop < end:
+                # ブロック境界は改行に揃える（ブロック内に改行が無ければ次の改行まで伸ばす）
+                newline = mm.rfind(b'\n', pos, stop)
+                if newline < 0:
+                    newline = mm.find(b'\n', stop, end)
+                stop = newline + 1 if newline >= 0 else end
+            aggregate.add_lines(mm[pos:stop])
+            pos = stop
+    return aggregate
+
+
+def _analyze_gzip(path: str) -> LogAggregate:
+    """gzip ファイル全体をストリーミングで展開して集計（ワーカープロセスで実行）"""
+    aggregate = LogAggregate()
+    rest = b''
+    with gzip.open(path, 'rb') as f:
+        while True:
+            block = f.read(BLOCK_SIZE)
+            if not block:
+                break
+            block = rest + block
+            newline = block.rfind(b'\n')
+            if newline < 0:
+                rest = block
+                continue
+            aggregate.add_lines(block[:newline + 1])
+            rest = block[newline + 1:]
+    if rest:
+        aggregate.add_lines(rest)
+    return aggregate
+
+
+def split_file(path: str, chunks: int) -> List[Tuple[int, int]]:
+    """
+    ファイルを行境界で chunks 個の範囲に分割
+
+    Args:
+        path: ファイルパス
+        chunks: 分割数
+
+    Returns:
+        (開始オフセット, 終了オフセット) のリスト
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        bounds = [0]
+        for i in range(1, chunks):
+            target = max(size * i // chunks, bounds[-1])
+            newline = mm.find(b'\n', target)
+            if newline < 0:
+                break
+            if newline + 1 > bounds[-1]:
+                bounds.append(newline + 1)
+        if bounds[-1] < size:
+            bounds.append(size)
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+
+class LogAnalyzer:
+    """アーカイブログのマルチコア解析"""
+
+    def __init__(self, workers: Optional[int] = None, chunks_per_worker: int = 4):
+        """
+        初期化
+
+        Args:
+            workers: ワーカープロセス数（未指定の場合はCPUコア数）
+            chunks_per_worker: 非圧縮ファイルをワーカーあたり何チャンクに分けるか
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.chunks_per_worker = chunks_per_worker
+
+    def analyze(self, paths: List[str]) -> LogAggregate:
+        """
+        ログファイルを並列に集計
+
+        非圧縮ファイルは行境界で分割して mmap で読み、gzip ファイルは
+        ファイル単位で並列に展開する。
+
+        Args:
+            paths: ログファイルのパス（.gz は gzip として扱う）
+
+        Returns:
+            全体の集計結果
+        """
+        tasks = []
+        for path in paths:
+            if path.endswith('.gz'):
+                tasks.append((_analyze_gzip, (path,), os.path.getsize(path) * 8))
+            else:
+                for start, end in split_file(path, self.workers * self.chunks_per_worker):
+                    tasks.append((_analyze_range, (path, start, end), end - start))
+
+        # 大きいタスクから投入して終盤の偏りを減らす
+        tasks.sort(key=lambda task: task[2], reverse=True)
+
+        total = LogAggregate()
+        if self.workers == 1:
+            for func, args, _ in tasks:
+                total.merge(func(*args))
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                futures = [executor.submit(func, *args) for func, args, _ in tasks]
+                for future in futures:
+                    total.merge(future.result())
+
+        logger.info(
+            "Analyzed logs",
+            files=len(paths),
+            tasks=len(tasks),
+            workers=self.workers,
+            lines=total.lines
+        )
+        return total
+
+
+def download_archives(
+    bucket_name: str,
+    prefix: str,
+    dest: str,
+    project_id: Optional[str] = None,
+    workers: int = 8
+) -> List[str]:
+    """
+    Cloud Storage のログアーカイブをローカルにダウンロード
+
+    Args:
+        bucket_name: バケット名
+        prefix: オブジェクト名のプレフィックス
+        dest: 保存先ディレクトリ
+        project_id: GCPプロジェクトID（未指定の場合は環境変数から取得）
+        workers: 並列ダウンロード数
+
+    Returns:
+        ダウンロードしたファイルのパス（既に同サイズのファイルがあればスキップ）
+    """
+    client = storage.Client(project=project_id or os.getenv('GCP_PROJECT_ID'))
+    blobs = [b for b in client.list_blobs(bucket_name, prefix=prefix) if not b.name.endswith('/')]
+    root = Path(dest)
+
+    def fetch(blob):
+        path = root / blob.name
+        if not (path.exists() and path.stat().st_size == blob.size):
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # gzip のまま保存し、展開は解析ワーカーに任せる
+            blob.download_to_filename(str(path), raw_download=True)
+        return str(path)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        paths = list(executor.map(fetch, blobs))
+
+    logger.info("Downloaded log archives", bucket=bucket_name, prefix=prefix, count=len(paths))
+    return paths
@@ -5,13 +5,56 @@ Google Cloud Monitoring を使用してメトリクスを収集・分析
 
 import os
 from typing import List, Dict, Any, Optional
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from google.cloud import monitoring_v3
 from google.auth import default
 import structlog
 
 logger = structlog.get_logger()
 
+# ディスクI/Oはストレージ種別などのラベルでも系列が分かれるので、インスタンスとデバイスでまとめる
+DISK_GROUP_BY = ['resource.label.instance_id', 'metric.label.instance_name', 'metric.label.device_name']
+
+# フリート全体で取得するメトリクス
+# scale: 値の換算係数、aligner: 系列ごとの集計方法、group_by: 系列をまとめるラベル
+# memory / disk は Ops Agent のメトリクス
+FLEET_METRICS = {
+    'cpu': {
+        'type': 'compute.googleapis.com/instance/cpu/utilization',
+        'scale': 100.0,
+        'unit': '%',
+    },
+    'memory': {
+        'type': 'agent.googleapis.com/memory/percent_used',
+        'filter': 'metric.labels.state = "used"',
+        'unit': '%',
+    },
+    'disk': {
+        'type': 'agent.googleapis.com/disk/percent_used',
+        'filter': 'metric.labels.state = "used"',
+        'unit': '%',
+    },
+    'disk_read': {
+        'type': 'compute.googleapis.com/instance/disk/read_bytes_count',
+        'aligner': 'ALIGN_RATE',
+        'group_by': DISK_GROUP_BY,
+        'unit': 'bytes/s',
+    },
+    'disk_write': {
+        'type': 'compute.googleapis.com/instance/disk/write_bytes_count',
+        'aligner': 'ALIGN_RATE',
+        'group_by': DISK_GROUP_BY,
+        'unit': 'bytes/s',
+    },
+    'log_errors': {
+        'type': 'logging.googleapis.com/log_entry_count',
+        'filter': 'metric.labels.severity = one_of("ERROR", "CRITICAL", "ALERT", "EMERGENCY")',
+        'aligner': 'ALIGN_RATE',
+        'group_by': ['resource.label.instance_id', 'metadata.system_labels.name'],
+        'unit': 'entries/s',
+    },
+}
+
 
 class MonitoringTools:
     """Google Cloud Monitoring 監視ツール"""
@@ -51,7 +94,7 @@ class MonitoringTools:
         Returns:
             CPU使用率のデータポイントリスト
         """
-        end_time = datetime.utcnow()
+        end_time = datetime.now(timezone.utc)
         start_time = end_time - timedelta(hours=hours)
         
         interval = monitoring_v3.TimeInterval({
@@ -115,7 +158,7 @@ class MonitoringTools:
         Returns:
             メモリ使用率のデータポイントリスト
         """
-        end_time = datetime.utcnow()
+        end_time = datetime.now(timezone.utc)
         start_time = end_time - timedelta(hours=hours)
         
         interval = monitoring_v3.TimeInterval({
@@ -179,7 +222,7 @@ class MonitoringTools:
         Returns:
             ディスクI/Oのデータ（read/write）
         """
-        end_time = datetime.utcnow()
+        end_time = datetime.now(timezone.utc)
         start_time = end_time - timedelta(hours=hours)
         
         interval = monitoring_v3.TimeInterval({
@@ -252,6 +295,100 @@ class MonitoringTools:
             )
             return results
     
+    def get_fleet_series(
+        self,
+        metric: str,
+        hours: int = 24,
+        alignment_seconds: int = 300,
+        projects: Optional[List[str]] = None
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        全インスタンスのメトリクスを1回のクエリでまとめて取得
+
+        Args:
+            metric: FLEET_METRICS のキー（cpu / memory / disk / disk_read / disk_write / log_errors）
+            hours: 過去何時間分のデータを取得するか
+            alignment_seconds: 集計間隔（秒）
+            projects: 対象プロジェクト（このプロジェクトを指標スコープとして、監視対象の複数プロジェクトを
+                1回のクエリで取得する。指定した場合は系列名の先頭に「プロジェクトID/」を付ける）
+
+        Returns:
+            系列名（インスタンス名、ディスクの場合は「インスタンス名:デバイス」）→ データポイントリスト
+
+        Raises:
+            Exception: クエリに失敗した場合（空の結果は返さない）
+        """
+        spec = FLEET_METRICS[metric]
+        scale = spec.get('scale', 1.0)
+
+        end_time = datetime.now(timezone.utc)
+        start_time = end_time - timedelta(hours=hours)
+
+        interval = monitoring_v3.TimeInterval({
+            "end_time": {"seconds": int(end_time.timestamp())},
+            "start_time": {"seconds": int(start_time.timestamp())},
+        })
+
+        aggregation = {
+            "alignment_period": {"seconds": alignment_seconds},
+            "per_series_aligner": monitoring_v3.Aggregation.Aligner[spec.get('aligner', 'ALIGN_MEAN')],
+        }
+        if spec.get('group_by'):
+            aggregation["cross_series_reducer"] = monitoring_v3.Aggregation.Reducer.REDUCE_SUM
+            aggregation["group_by_fields"] = spec['group_by'] + (['resource.label.project_id'] if projects else [])
+        aggregation = monitoring_v3.Aggregation(aggregation)
+
+        filter_str = 'resource.type = "gce_instance" AND metric.type = "{}"'.format(spec['type'])
+        if spec.get('filter'):
+            filter_str += ' AND ' + spec['filter']
+        if projects:
+            filter_str += ' AND resource.labels.project_id = one_of({})'.format(
+                ', '.join(f'"{project}"' for project in projects)
+            )
+
+        request = monitoring_v3.ListTimeSeriesRequest(
+            name=self.project_name,
+            filter=filter_str,
+            interval=interval,
+            aggregation=aggregation,
+            view=monitoring_v3.ListTimeSeriesRequest.TimeSeriesView.FULL,
+        )
+
+        results = {}
+        try:
+            for time_series in self.client.list_time_series(request=request):
+                name = self._series_name(time_series)
+                if projects:
+                    name = f"{time_series.resource.labels['project_id']}/{name}"
+                points = results.setdefault(name, [])
+                # APIは新しい順に返すため、古い順に並べ替える
+                for point in reversed(time_series.points):
+                    points.append({
+                        'timestamp': point.interval.end_time.isoformat(),
+                        'value': point.value.double_value * scale,
+                        'unit': spec['unit'],
+                    })
+        except Exception as e:
+            # 途中までの結果を返すと欠けたデータで予測・トリアージしてしまうので呼び出し元に任せる
+            logger.error("Failed to get fleet metrics", metric=metric, error=str(e))
+            raise
+
+        logger.info("Retrieved fleet metrics", metric=metric, series=len(results))
+        return results
+
+    @staticmethod
+    def _series_name(time_series) -> str:
+        """時系列からインスタンス名（とデバイス名）を取り出す"""
+        name = time_series.metric.labels.get('instance_name')
+        if not name:
+            system_name = time_series.metadata.system_labels.fields.get('name')
+            name = system_name.string_value if system_name else time_series.resource.labels['instance_id']
+
+        # Ops Agent のメトリクスは device、Compute Engine のディスクI/Oは device_name
+        labels = time_series.metric.labels
+        device = labels.get('device') or labels.get('device_name')
+        return f"{name}:{device}" if device else name
+
     def detect_anomalies(
         self, 
         metrics: List[Dict[str, Any]], 
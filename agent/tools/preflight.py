@@ -0,0 +1,258 @@
+"""
+接続前チェック（プリフライト）
+認証と各 API への到達性を並列に確認し、API ごとの応答時間を返す
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any, Optional, Callable
+
+import structlog
+
+logger = structlog.get_logger()
+
+# チェックごとの API と、失敗したときの案内
+CHECKS = {
+    'project': {
+        'api': 'cloudresourcemanager.googleapis.com',
+        'hint': 'プロジェクトID と IAM（resourcemanager.projects.get）を確認してください',
+    },
+    'compute': {
+        'api': 'compute.googleapis.com',
+        'hint': 'gcloud services enable compute.googleapis.com',
+    },
+    'zone': {
+        'api': 'compute.googleapis.com',
+        'hint': 'GCP_ZONE を確認してください',
+    },
+    'monitoring': {
+        'api': 'monitoring.googleapis.com',
+        'hint': 'gcloud services enable monitoring.googleapis.com',
+    },
+    'storage': {
+        'api': 'storage.googleapis.com',
+        'hint': 'gcloud services enable storage.googleapis.com',
+    },
+    'logging': {
+        'api': 'logging.googleapis.com',
+        'hint': 'gcloud services enable logging.googleapis.com',
+    },
+}
+
+AUTH_HINT = 'gcloud auth application-default login または GOOGLE_APPLICATION_CREDENTIALS を設定してください'
+
+# 一覧系の呼び出しで返すフィールドを絞る
+FIELD_MASK_HEADER = 'x-goog-fieldmask'
+
+
+class Preflight:
+    """
+    接続前チェック
+
+    認証情報は最初に1回だけ取得し、以降のチェックはその認証情報で作ったクライアントを
+    並列に呼び出す。各チェックは1件だけ取得する呼び出し（page_size=1 / フィールド指定）で
+    到達性と権限を確認し、チェックごとの期限を過ぎたものは timeout として結果を返す
+    （応答を待ち続けないよう、チェックはデーモンスレッドで実行する）。
+    """
+
+    def __init__(
+        self,
+        project_id: str,
+        zone: str = 'asia-northeast1-a',
+        timeout: float = 10.0,
+        checks: Optional[List[str]] = None
+    ):
+        """
+        初期化
+
+        Args:
+            project_id: GCPプロジェクトID
+            zone: 確認するゾーン
+            timeout: チェックごとの期限（秒）
+            checks: 実行するチェック名（未指定の場合は CHECKS すべて）
+        """
+        if not project_id:
+            raise ValueError("GCP_PROJECT_ID が設定されていません")
+
+        unknown = set(checks or []) - set(CHECKS)
+        if unknown:
+            raise ValueError(f"不明なチェックです: {', '.join(sorted(unknown))}")
+
+        self.project_id = project_id
+        self.zone = zone
+        self.timeout = timeout
+        self.checks = list(checks or CHECKS)
+        self.credentials = None
+
+    def authenticate(self) -> Dict[str, Any]:
+        """
+        認証情報を取得し、トークンを発行できることを確認
+
+        Returns:
+            チェック結果
+        """
+        def probe():
+            import google.auth
+            from google.auth.transport.requests import Request
+
+            credentials, detected = google.auth.default(
+                scopes=['https://www.googleapis.com/auth/cloud-platform']
+            )
+            credentials.refresh(Request())
+            self.credentials = credentials
+            return {'type': type(credentials).__name__, 'detected_project': detected}
+
+        return self._run({'auth': probe}, {'auth': AUTH_HINT})[0]
+
+    def _probes(self) -> Dict[str, Callable[[], Dict[str, Any]]]:
+        """チェック名 → 1回の API 呼び出しで確認する関数"""
+        credentials = self.credentials
+        project_id = self.project_id
+        timeout = self.timeout
+
+        def project():
+            from google.cloud import resourcemanager_v3
+
+            client = resourcemanager_v3.ProjectsClient(credentials=credentials)
+            found = client.get_project(name=f"projects/{project_id}", timeout=timeout)
+            return {'display_name': found.display_name, 'state': found.state.name}
+
+        def compute():
+            from google.cloud import compute_v1
+
+            client = compute_v1.InstancesClient(credentials=credentials)
+            request = compute_v1.ListInstancesRequest(project=project_id, zone=self.zone, max_results=1)
+            response = client.list(
+                request=request, timeout=timeout,
+                metadata=[(FIELD_MASK_HEADER, 'items.name,nextPageToken')]
+            )
+            page = next(iter(response.pages), None)
+            return {'zone': self.zone, 'has_instances': bool(page and page.items)}
+
+        def zone():
+            from google.cloud import compute_v1
+
+            client = compute_v1.ZonesClient(credentials=credentials)
+            found = client.get(
+                project=project_id, zone=self.zone, timeout=timeout,
+                metadata=[(FIELD_MASK_HEADER, 'name,status')]
+            )
+            if found.status != 'UP':
+                raise RuntimeError(f"ゾーン {self.zone} の状態: {found.status}")
+            return {'zone': found.name, 'status': found.status}
+
+        def monitoring():
+            from google.cloud import monitoring_v3
+
+            client = monitoring_v3.MetricServiceClient(credentials=credentials)
+            response = client.list_metric_descriptors(
+                request={
+                    'name': f"projects/{project_id}",
+                    'filter': 'metric.type = starts_with("compute.googleapis.com/instance/cpu")',
+                    'page_size': 1,
+                },
+                timeout=timeout,
+            )
+            page = next(iter(response.pages), None)
+            return {'has_descriptors': bool(page and page.metric_descriptors)}
+
+        def storage():
+            from google.cloud import storage as gcs
+
+            client = gcs.Client(project=project_id, credentials=credentials)
+            iterator = client.list_buckets(max_results=1, fields='items(name),nextPageToken', timeout=timeout)
+            return {'has_buckets': any(True for _ in iterator)}
+
+        def logging():
+            from google.cloud import logging as cloud_logging
+
+            client = cloud_logging.Client(project=project_id, credentials=credentials)
+            since = (datetime.now(timezone.utc) - timedelta(hours=1)).strftime('%Y-%m-%dT%H:%M:%SZ')
+            entries = client.list_entries(
+                filter_=f'timestamp >= "{since}"',
+                order_by=cloud_logging.DESCENDING,
+                max_results=1,
+                page_size=1,
+            )
+            return {'has_recent_entries': any(True for _ in entries)}
+
+        probes = {
+            'project': project,
+            'compute': compute,
+            'zone': zone,
+            'monitoring': monitoring,
+            'storage': storage,
+            'logging': logging,
+        }
+        return {name: probes[name] for name in self.checks}
+
+    def _run(self, probes: Dict[str, Callable[[], Dict[str, Any]]], hints: Dict[str, str]) -> List[Dict[str, Any]]:
+        """
+        チェックを並列に実行し、期限までに終わらなかったものは timeout にする
+
+        Returns:
+            チェック結果のリスト（probes と同じ順）
+        """
+        results = {}
+
+        def invoke(name, func):
+            start = time.monotonic()
+            try:
+                result = {'status': 'ok', 'detail': func()}
+            except Exception as e:
+                result = {'status': 'error', 'error': f"{type(e).__name__}: {e}"}
+            result['latency_ms'] = round((time.monotonic() - start) * 1000, 1)
+            results[name] = result
+
+        threads = {
+            name: threading.Thread(target=invoke, args=(name, func), name=f"preflight-{name}", daemon=True)
+            for name, func in probes.items()
+        }
+        deadline = time.monotonic() + self.timeout
+        for thread in threads.values():
+            thread.start()
+        for thread in threads.values():
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+        checks = []
+        for name in probes:
+            result = results.get(name) or {
+                'status': 'timeout',
+                'error': f"{self.timeout:g}秒以内に応答がありません",
+                'latency_ms': None,
+            }
+            check = {'name': name, 'api': CHECKS.get(name, {}).get('api'), 'ok': result['status'] == 'ok', **result}
+            if not check['ok']:
+                check['hint'] = hints.get(name)
+            logger.info("Preflight check", check=name, status=check['status'], latency_ms=check['latency_ms'])
+            checks.append(check)
+        return checks
+
+    def run(self) -> Dict[str, Any]:
+        """
+        すべてのチェックを実行
+
+        認証に失敗した場合、残りのチェックは skipped になる。
+
+        Returns:
+            {'project_id', 'ok', 'elapsed_ms', 'checks': [...]}
+        """
+        start = time.monotonic()
+        auth = self.authenticate()
+        if auth['ok']:
+            checks = self._run(self._probes(), {name: spec['hint'] for name, spec in CHECKS.items()})
+        else:
+            checks = [
+                {'name': name, 'api': CHECKS[name]['api'], 'ok': False, 'status': 'skipped', 'latency_ms': None}
+                for name in self.checks
+            ]
+
+        report = {
+            'project_id': self.project_id,
+            'ok': auth['ok'] and all(check['ok'] for check in checks),
+            'elapsed_ms': round((time.monotonic() - start) * 1000, 1),
+            'checks': [auth] + checks,
+        }
+        logger.info("Preflight finished", ok=report['ok'], elapsed_ms=report['elapsed_ms'])
+        return report
@@ -0,0 +1,228 @@
+"""
+複数プロジェクト
+dev / prod や顧客ごとのプロジェクトに対して、読み取り系のクエリを並列に実行して結果をまとめる
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import zip_longest
+from typing import List, Dict, Any, Optional, Callable, Tuple
+
+import structlog
+
+from .gcp_tools import GCPTools
+from .monitoring import MonitoringTools
+
+logger = structlog.get_logger()
+
+
+def resolve_projects(
+    project_ids: Optional[List[str]] = None,
+    folder: Optional[str] = None,
+    labels: Optional[Dict[str, str]] = None
+) -> List[str]:
+    """
+    対象プロジェクトの一覧を決める
+
+    フォルダやラベルを指定した場合は Resource Manager で検索し、明示したプロジェクトと合わせる。
+
+    Args:
+        project_ids: 明示したプロジェクトID
+        folder: フォルダID（「folders/」は省略可）
+        labels: プロジェクトのラベル条件（すべて一致するもの）
+
+    Returns:
+        プロジェクトIDのリスト（重複なし、指定順）
+    """
+    projects = list(dict.fromkeys(project_ids or []))
+    if not folder and not labels:
+        return projects
+
+    from google.cloud import resourcemanager_v3
+
+    query = ['state:ACTIVE']
+    if folder:
+        query.append(f"parent:folders/{folder.split('/')[-1]}")
+    query.extend(f"labels.{key}:{value}" for key, value in (labels or {}).items())
+
+    client = resourcemanager_v3.ProjectsClient()
+    found = sorted(project.project_id for project in client.search_projects(query=' '.join(query)))
+    logger.info("Resolved projects", query=' '.join(query), count=len(found))
+    return list(dict.fromkeys(projects + found))
+
+
+class ProjectFanOut:
+    """
+    プロジェクトごとの読み取りクエリを並列実行する
+
+    全体の並列数は max_workers、1プロジェクトあたりの同時実行数は per_project で制限する
+    （プロジェクト単位の API クォータを1つのプロジェクトで使い切らないため）。タスクは
+    プロジェクトを交互に並べて投入するので、上限待ちで他のプロジェクトが止まることは少ない。
+
+    結果の各要素には 'project' を付け、失敗したプロジェクトは errors に残して他の結果は返す。
+    metrics_scope を指定した場合、メトリクスはそのプロジェクトの指標スコープに対する
+    1回のクエリで全プロジェクト分を取得する。
+    """
+
+    def __init__(
+        self,
+        project_ids: List[str],
+        max_workers: int = 8,
+        per_project: int = 2,
+        metrics_scope: Optional[str] = None
+    ):
+        """
+        初期化
+
+        Args:
+            project_ids: 対象プロジェクトID
+            max_workers: 全体の並列数
+            per_project: 1プロジェクトあたりの同時実行数
+            metrics_scope: 対象プロジェクトを監視対象に含む指標スコープのプロジェクトID
+        """
+        if not project_ids:
+            raise ValueError("対象プロジェクトがありません")
+
+        self.project_ids = list(project_ids)
+        self.max_workers = max_workers
+        self.metrics_scope = metrics_scope
+        self.errors = {}
+        self._limits = {
+            project: threading.Semaphore(per_project)
+            for project in self.project_ids + ([metrics_scope] if metrics_scope else [])
+        }
+        self._tools = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, project_id: str):
+        """プロジェクトごとのツールを共有する（初回だけ作成）"""
+        with self._lock:
+            key = (cls, project_id)
+            if key not in self._tools:
+                self._tools[key] = cls(project_id)
+            return self._tools[key]
+
+    def gcp_tools(self, project_id: str) -> GCPTools:
+        return self._get(GCPTools, project_id)
+
+    def monitoring_tools(self, project_id: str) -> MonitoringTools:
+        return self._get(MonitoringTools, project_id)
+
+    def run(self, calls: List[Tuple[str, Callable[[], Any]]]) -> List[Tuple[str, Any]]:
+        """
+        (プロジェクトID, 関数) の組を並列に実行
+
+        Args:
+            calls: 実行する関数とその対象プロジェクト
+
+        Returns:
+            (プロジェクトID, 戻り値) のリスト（calls と同じ順、失敗した呼び出しは除く）
+        """
+        def invoke(index, project, func):
+            with self._limits[project]:
+                try:
+                    return index, project, func()
+                except Exception as e:
+                    logger.error("Project query failed", project_id=project, error=str(e))
+                    self.errors.setdefault(project, []).append(str(e))
+                    return None
+
+        # プロジェクトを交互に並べて投入する
+        by_project = {}
+        for index, (project, func) in enumerate(calls):
+            by_project.setdefault(project, []).append((index, project, func))
+        ordered = [call for group in zip_longest(*by_project.values()) for call in group if call]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            done = [f.result() for f in [executor.submit(invoke, *call) for call in ordered]]
+        return [(project, value) for _, project, value in sorted(filter(None, done), key=lambda d: d[0])]
+
+    def map(self, func: Callable[[str], Any]) -> Dict[str, Any]:
+        """
+        全プロジェクトで func(project_id) を実行
+
+        Returns:
+            プロジェクトID → 戻り値（失敗したプロジェクトは含まない）
+        """
+        return dict(self.run([(project, lambda p=project: func(p)) for project in self.project_ids]))
+
+    def _merge(self, results: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """プロジェクトごとのリストを 'project' を付けて1つにまとめる"""
+        return [
+            {'project': project, **item}
+            for project, items in results.items()
+            for item in items
+        ]
+
+    def list_instances(self, zones: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        全プロジェクトのVMインスタンス一覧
+
+        Args:
+            zones: ゾーン名（未指定の場合は各プロジェクトのデフォルトゾーン）
+
+        Returns:
+            インスタンス情報のリスト（'project' 付き）
+        """
+        calls = [
+            (project, lambda p=project, z=zone: self.gcp_tools(p).list_instances(z))
+            for project in self.project_ids
+            for zone in (zones or [None])
+        ]
+        merged = {}
+        for project, instances in self.run(calls):
+            merged.setdefault(project, []).extend(instances)
+        instances = self._merge(merged)
+        logger.info("Listed instances across projects", projects=len(self.project_ids), count=len(instances))
+        return instances
+
+    def list_buckets(self) -> List[Dict[str, Any]]:
+        """
+        全プロジェクトの Cloud Storage バケット一覧
+
+        Returns:
+            バケット情報のリスト（'project' 付き）
+        """
+        buckets = self._merge(self.map(lambda p: self.gcp_tools(p).list_buckets()))
+        logger.info("Listed buckets across projects", projects=len(self.project_ids), count=len(buckets))
+        return buckets
+
+    def get_fleet_series(
+        self,
+        metric: str,
+        hours: int = 24,
+        alignment_seconds: int = 300
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        全プロジェクトのフリートメトリクス（MonitoringTools.get_fleet_series と同じ形式）
+
+        指標スコープがあれば1回のクエリ、無ければプロジェクトごとのクエリを並列に実行する。
+        対象が複数プロジェクトの場合と指標スコープを使う場合は、系列名の先頭に「プロジェクトID/」を付ける。
+
+        Args:
+            metric: FLEET_METRICS のキー
+            hours: 過去何時間分のデータを取得するか
+            alignment_seconds: 集計間隔（秒）
+
+        Returns:
+            系列名 → データポイントリスト（失敗したプロジェクトの分は含まず、errors に残す）
+        """
+        if self.metrics_scope:
+            calls = [(self.metrics_scope, lambda: self.monitoring_tools(self.metrics_scope).get_fleet_series(
+                metric, hours, alignment_seconds, projects=self.project_ids
+            ))]
+        elif len(self.project_ids) == 1:
+            project = self.project_ids[0]
+            calls = [(project, lambda: self.monitoring_tools(project).get_fleet_series(metric, hours, alignment_seconds))]
+        else:
+            calls = None
+        if calls:
+            fetched = self.run(calls)
+            return fetched[0][1] if fetched else {}
+
+        results = {}
+        fetched = self.map(lambda p: self.monitoring_tools(p).get_fleet_series(metric, hours, alignment_seconds))
+        for project, series in fetched.items():
+            for name, points in series.items():
+                results[f"{project}/{name}"] = points
+        return results
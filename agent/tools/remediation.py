@@ -0,0 +1,346 @@
+"""
+自動復旧ツール
+YAMLで定義した復旧ルールをイベントに照合し、アクションを実行
+"""
+
+import operator
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Callable, Tuple
+
+import yaml
+import structlog
+
+logger = structlog.get_logger()
+
+CONDITION_OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+# 索引キーのワイルドカード
+ANY = None
+
+
+@dataclass
+class RemediationRule:
+    """復旧ルール"""
+
+    name: str
+    action: str
+    metric: Optional[str] = ANY
+    severities: Tuple[Optional[str], ...] = (ANY,)
+    labels: Dict[str, str] = field(default_factory=dict)
+    condition: Optional[Callable[[float], bool]] = None
+    params: Dict[str, Any] = field(default_factory=dict)
+    cooldown_seconds: float = 600
+    max_actions: Optional[int] = None
+    per_seconds: float = 3600
+    priority: int = 100
+    stop: bool = True
+    order: int = 0
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], order: int = 0) -> 'RemediationRule':
+        """
+        YAMLのルール定義から生成
+
+        Args:
+            data: ルール定義
+            order: 定義順（同じ優先度の場合の評価順）
+
+        Returns:
+            RemediationRule
+        """
+        severity = data.get('severity', ANY)
+        severities = tuple(severity) if isinstance(severity, list) else (severity,)
+
+        condition = None
+        if 'condition' in data:
+            op = CONDITION_OPERATORS[data['condition']['op']]
+            threshold = float(data['condition']['value'])
+            condition = lambda value, op=op, threshold=threshold: value is not None and op(value, threshold)
+
+        rate_limit = data.get('rate_limit', {})
+        return cls(
+            name=data['name'],
+            action=data['action'],
+            metric=data.get('metric', ANY),
+            severities=severities,
+            labels={str(k): str(v) for k, v in (data.get('resource_labels') or {}).items()},
+            condition=condition,
+            params=data.get('params', {}),
+            cooldown_seconds=data.get('cooldown_seconds', 600),
+            max_actions=rate_limit.get('max_actions'),
+            per_seconds=rate_limit.get('per_seconds', 3600),
+            priority=data.get('priority', 100),
+            stop=data.get('stop', True),
+            order=order,
+        )
+
+    def matches(self, event: Dict[str, Any]) -> bool:
+        """索引で絞り込んだ後の残りの条件（ラベル・値）を確認"""
+        labels = event.get('labels', {})
+        for key, value in self.labels.items():
+            # YAML・イベントとも値が数値や真偽値のことがあるので文字列で比べる（索引と同じ）
+            if key not in labels or str(labels[key]) != str(value):
+                return False
+        return self.condition is None or self.condition(event.get('value'))
+
+
+class ActionExecutor:
+    """復旧アクションの実行（dry-run 対応）"""
+
+    def __init__(self, gcp_tools=None, dry_run: bool = True):
+        """
+        初期化
+
+        Args:
+            gcp_tools: GCPTools インスタンス（dry-run の場合は不要）
+            dry_run: True の場合は実行せずログのみ
+        """
+        self.gcp_tools = gcp_tools
+        self.dry_run = dry_run
+        self.handlers = {
+            'start_instance': self._start_instance,
+            'stop_instance': self._stop_instance,
+            'restart_instance': self._restart_instance,
+            'escalate': self._escalate,
+        }
+
+    def register(self, action: str, handler: Callable[[Dict[str, Any], Dict[str, Any]], bool]):
+        """
+        アクションを追加登録
+
+        Args:
+            action: アクション名
+            handler: handler(event, params) -> 成功したかどうか
+        """
+        self.handlers[action] = handler
+
+    def execute(self, action: str, event: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        アクションを実行
+
+        Args:
+            action: アクション名
+            event: 契機となったイベント
+            params: ルールのパラメータ
+
+        Returns:
+            実行結果
+        """
+        if action not in self.handlers:
+            raise ValueError(f"未定義のアクションです: {action}")
+
+        if self.dry_run and action != 'escalate':
+            logger.info("Dry run action", action=action, resource=event.get('resource'))
+            return {'action': action, 'resource': event.get('resource'), 'dry_run': True, 'success': True}
+
+        success = self.handlers[action](event, params)
+        return {'action': action, 'resource': event.get('resource'), 'dry_run': False, 'success': success}
+
+    def _start_instance(self, event, params):
+        return self.gcp_tools.start_instance(event['resource'], event.get('zone'))
+
+    def _stop_instance(self, event, params):
+        return self.gcp_tools.stop_instance(event['resource'], event.get('zone'))
+
+    def _restart_instance(self, event, params):
+        return self.gcp_tools.reset_instance(event['resource'], event.get('zone'))
+
+    def _escalate(self, event, params):
+        logger.warning(
+            "Escalated to operator",
+            resource=event.get('resource'),
+            metric=event.get('metric'),
+            value=event.get('value'),
+            reason=params.get('reason'),
+        )
+        return True
+
+
+class RemediationEngine:
+    """
+    復旧ルールエンジン
+
+    ルールは (メトリクス, 重要度, ラベルキー, ラベル値) をキーとする索引にまとめ、
+    イベントごとに該当しうるキーだけを引いて評価する。
+    """
+
+    def __init__(
+        self,
+        rules: List[RemediationRule],
+        executor: Optional[ActionExecutor] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        初期化
+
+        Args:
+            rules: 復旧ルール
+            executor: アクション実行器（未指定の場合は dry-run）
+            clock: 時刻関数（テスト用）
+
+        Raises:
+            ValueError: 実行器に無いアクションを使うルールがある場合
+        """
+        self.rules = sorted(rules, key=lambda r: (r.priority, r.order))
+        self.executor = executor or ActionExecutor()
+        self.clock = clock
+
+        # 実行時に ValueError で process_many が途中で止まらないよう、読み込み時に確認する
+        unknown = [f"{rule.name}: {rule.action}" for rule in self.rules if rule.action not in self.executor.handlers]
+        if unknown:
+            raise ValueError(f"未定義のアクションを使うルールがあります: {', '.join(unknown)}")
+
+        self._index = defaultdict(list)
+        for rule in self.rules:
+            # ラベル条件は1つ目だけ索引に使い、残りは matches() で確認する
+            label = next(iter(sorted(rule.labels.items())), (ANY, ANY))
+            for severity in rule.severities:
+                self._index[(rule.metric, severity) + label].append(rule)
+
+        # (ルール名, リソース) → クールダウンの終了時刻（発火順に並ぶ）
+        self._last_action = {}
+        self._history = defaultdict(deque)
+        # 実行履歴はレート制限の最大の期間だけ残す（レート制限が無ければ残さない）
+        self._history_seconds = max((r.per_seconds for r in self.rules if r.max_actions is not None), default=0)
+
+        logger.info("RemediationEngine initialized", rules=len(self.rules), index_keys=len(self._index))
+
+    @classmethod
+    def from_yaml(cls, path: str, executor: Optional[ActionExecutor] = None) -> 'RemediationEngine':
+        """
+        YAMLファイルからルールを読み込んで生成
+
+        Args:
+            path: ルール定義ファイル
+            executor: アクション実行器
+
+        Returns:
+            RemediationEngine
+
+        Raises:
+            ValueError: 実行器に無いアクションを使うルールがある場合
+        """
+        with open(path) as f:
+            data = yaml.safe_load(f) or {}
+        rules = [RemediationRule.from_dict(item, order) for order, item in enumerate(data.get('rules', []))]
+        return cls(rules, executor)
+
+    def candidates(self, event: Dict[str, Any]) -> List[RemediationRule]:
+        """
+        イベントに該当しうるルールを索引から取得（優先度順）
+
+        Args:
+            event: イベント（metric, severity, resource, labels, value）
+
+        Returns:
+            候補ルール
+        """
+        labels = [(ANY, ANY)] + [(str(k), str(v)) for k, v in event.get('labels', {}).items()]
+        found = []
+        for metric in (event.get('metric'), ANY):
+            for severity in (event.get('severity'), ANY):
+                for label in labels:
+                    found.extend(self._index.get((metric, severity) + label, ()))
+
+        # 複数のキーから同じルールが引かれることがあるため重複を除く
+        unique = {id(rule): rule for rule in found}
+        return sorted(unique.values(), key=lambda r: (r.priority, r.order))
+
+    def _allowed(self, rule: RemediationRule, resource: str, now: float) -> Optional[str]:
+        """クールダウン・レート制限を確認し、抑止理由を返す（問題なければ None）"""
+        until = self._last_action.get((rule.name, resource))
+        if until is not None and now < until:
+            return 'cooldown'
+
+        if rule.max_actions is not None:
+            history = self._history[(rule.action, resource)]
+            while history and now - history[0] >= rule.per_seconds:
+                history.popleft()
+            if len(history) >= rule.max_actions:
+                return 'rate_limited'
+
+        return None
+
+    def _record(self, rule: RemediationRule, resource: str, now: float):
+        """実行履歴に追加し、クールダウン・レート制限のどちらにも使わない古い履歴を捨てる"""
+        key = (rule.name, resource)
+        # 発火順に並べ直し、クールダウンの明けたものを先頭から捨てる
+        self._last_action.pop(key, None)
+        self._last_action[key] = now + rule.cooldown_seconds
+        while self._last_action:
+            oldest = next(iter(self._last_action))
+            if self._last_action[oldest] > now:
+                break
+            del self._last_action[oldest]
+
+        key = (rule.action, resource)
+        history = self._history[key]
+        history.append(now)
+        while history and now - history[0] >= self._history_seconds:
+            history.popleft()
+        if not history:
+            del self._history[key]
+
+    def process(self, event: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        イベントを評価し、該当ルールのアクションを実行
+
+        Args:
+            event: イベント
+
+        Returns:
+            アクションごとの結果（実行・抑止とも）
+        """
+        resource = event.get('resource')
+        results = []
+
+        for rule in self.candidates(event):
+            if not rule.matches(event):
+                continue
+
+            now = self.clock()
+            reason = self._allowed(rule, resource, now)
+            if reason:
+                results.append({'rule': rule.name, 'action': rule.action, 'resource': resource, 'suppressed': reason})
+            else:
+                self._record(rule, resource, now)
+                result = self.executor.execute(rule.action, event, rule.params)
+                result['rule'] = rule.name
+                results.append(result)
+
+                logger.info(
+                    "Remediation rule fired",
+                    rule=rule.name,
+                    action=rule.action,
+                    resource=resource,
+                    dry_run=result['dry_run']
+                )
+
+            if rule.stop:
+                break
+
+        return results
+
+    def process_many(self, events) -> List[Dict[str, Any]]:
+        """
+        複数のイベントを順に評価
+
+        Args:
+            events: イベントのイテラブル
+
+        Returns:
+            全イベントの結果
+        """
+        results = []
+        for event in events:
+            results.extend(self.process(event))
+        return results
@@ -0,0 +1,550 @@
+"""
+定期メンテナンススケジューラ
+cron / 間隔指定のジョブを、ゆらぎ・取りこぼしの集約・同時実行数の制限付きでプロセス内で実行
+"""
+
+import json
+import os
+import random
+import socket
+import ssl
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Callable, Set
+from zoneinfo import ZoneInfo
+
+import yaml
+import structlog
+
+from .backup import BackupTools
+from .baselines import BaselineStore
+from .gcp_tools import GCPTools
+from .monitoring import MonitoringTools
+
+logger = structlog.get_logger()
+
+# (名前, 最小値, 最大値)  曜日は 0 と 7 がどちらも日曜
+CRON_FIELDS = (
+    ('minute', 0, 59),
+    ('hour', 0, 23),
+    ('day', 1, 31),
+    ('month', 1, 12),
+    ('weekday', 0, 7),
+)
+
+
+def _parse_cron_field(expr: str, low: int, high: int) -> Set[int]:
+    """cron の1フィールド（*, a-b, */n, a,b など）を値の集合に変換"""
+    values = set()
+    for part in expr.split(','):
+        body, slash, step = part.partition('/')
+        step = int(step) if slash else 1
+        if body == '*':
+            start, end = low, high
+        elif '-' in body:
+            start, end = (int(v) for v in body.split('-', 1))
+        else:
+            # "5/15" は 5 から最大値まで 15 刻み
+            start = int(body)
+            end = high if slash else start
+        if start < low or end > high or start > end or step < 1:
+            raise ValueError(f"cron の値が範囲外です: {expr}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSpec:
+    """5フィールドの cron 式（分 時 日 月 曜日）"""
+
+    def __init__(self, expr: str):
+        """
+        初期化
+
+        Args:
+            expr: cron 式（例: "30 3 * * *"、曜日は 0 = 日曜）
+        """
+        parts = expr.split()
+        if len(parts) != len(CRON_FIELDS):
+            raise ValueError(f"cron 式は5フィールドで指定してください: {expr}")
+        self.expr = expr
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            _parse_cron_field(part, low, high) for part, (_, low, high) in zip(parts, CRON_FIELDS)
+        )
+        self.weekdays = {d % 7 for d in weekdays}
+        # 日と曜日の両方が指定された場合は、cron と同じくどちらかに一致すれば実行する
+        self._any_day = parts[2] == '*'
+        self._any_weekday = parts[4] == '*'
+
+    def _day_matches(self, t: datetime) -> bool:
+        day = t.day in self.days
+        weekday = (t.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_after(self, t: datetime) -> datetime:
+        """
+        t より後で最初に一致する時刻
+
+        Args:
+            t: 基準時刻（タイムゾーン付き）
+
+        Returns:
+            次の実行時刻
+        """
+        t = t.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t + timedelta(days=366 * 5)
+        while t < limit:
+            if t.month not in self.months:
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+            elif t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+            elif t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+            else:
+                return t
+        raise ValueError(f"一致する時刻がありません: {self.expr}")
+
+
+@dataclass
+class Job:
+    """定期ジョブ"""
+
+    name: str
+    task: str
+    params: Dict[str, Any] = field(default_factory=dict)
+    cron: Optional[CronSpec] = None
+    interval_seconds: Optional[float] = None
+    jitter_seconds: float = 0
+    misfire: str = 'coalesce'
+    misfire_grace_seconds: float = 300
+    max_instances: int = 1
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Job':
+        """
+        YAMLのジョブ定義から生成
+
+        Args:
+            data: ジョブ定義
+
+        Returns:
+            Job
+        """
+        if ('cron' in data) == ('interval_seconds' in data):
+            raise ValueError(f"cron か interval_seconds のどちらかを指定してください: {data.get('name')}")
+        misfire = data.get('misfire', 'coalesce')
+        if misfire not in ('coalesce', 'skip'):
+            raise ValueError(f"misfire は coalesce か skip です: {misfire}")
+
+        return cls(
+            name=data['name'],
+            task=data['task'],
+            params=data.get('params', {}),
+            cron=CronSpec(data['cron']) if 'cron' in data else None,
+            interval_seconds=data.get('interval_seconds'),
+            jitter_seconds=data.get('jitter_seconds', 0),
+            misfire=misfire,
+            misfire_grace_seconds=data.get('misfire_grace_seconds', 300),
+            max_instances=data.get('max_instances', 1),
+        )
+
+    def next_base(self, previous: Optional[float], now: float, tz: ZoneInfo) -> float:
+        """
+        now より後の次の予定時刻（ゆらぎを加える前）
+
+        Args:
+            previous: 前回の予定時刻（無い場合は None）
+            now: 現在時刻（UNIX秒）
+            tz: cron を解釈するタイムゾーン
+
+        Returns:
+            予定時刻（UNIX秒）
+        """
+        if self.cron is not None:
+            return self.cron.next_after(datetime.fromtimestamp(now, tz)).timestamp()
+        if previous is None:
+            return now
+        # 間隔ジョブは前回の予定時刻からの位相を保つ
+        missed = max(0, int((now - previous) // self.interval_seconds))
+        return previous + (missed + 1) * self.interval_seconds
+
+    def jitter(self, base: float) -> float:
+        """予定時刻ごとに決まるゆらぎ（再起動しても同じ値になる）"""
+        if not self.jitter_seconds:
+            return 0.0
+        return random.Random(f"{self.name}:{base}").uniform(0, self.jitter_seconds)
+
+
+class JobContext:
+    """
+    ジョブ間で共有するクライアント
+
+    最初に使われたときに一度だけ作り、以降のジョブは同じインスタンス（接続済みの
+    クライアント）を使う。
+    """
+
+    def __init__(self, project_id: Optional[str] = None):
+        """
+        初期化
+
+        Args:
+            project_id: GCPプロジェクトID（未指定の場合は環境変数から取得）
+        """
+        self.project_id = project_id or os.getenv('GCP_PROJECT_ID')
+        self._instances = {}
+        self._lock = threading.Lock()
+
+    def _get(self, attr: str, factory: Callable[[], Any]) -> Any:
+        """共有インスタンスを取得（無ければ作る）"""
+        with self._lock:
+            if attr not in self._instances:
+                self._instances[attr] = factory()
+            return self._instances[attr]
+
+    @property
+    def gcp_tools(self):
+        return self._get('gcp_tools', lambda: GCPTools(self.project_id))
+
+    @property
+    def monitoring_tools(self):
+        return self._get('monitoring_tools', lambda: MonitoringTools(self.project_id))
+
+    @property
+    def backup_tools(self):
+        return self._get('backup_tools', lambda: BackupTools(self.project_id))
+
+
+# ==================== ジョブのタスク ====================
+
+def task_command(context: JobContext, params: Dict[str, Any]) -> Dict[str, Any]:
+    """外部コマンドを実行（WordPress 更新の playbook、コストレポートなど）"""
+    completed = subprocess.run(
+        params['command'],
+        shell=isinstance(params['command'], str),
+        cwd=params.get('cwd'),
+        timeout=params.get('timeout_seconds', 3600),
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"exit {completed.returncode}: {completed.stderr.strip()[-500:]}")
+    return {'returncode': completed.returncode, 'stdout_tail': completed.stdout.strip()[-500:]}
+
+
+def task_backup_check(context: JobContext, params: Dict[str, Any]) -> Dict[str, Any]:
+    """サイト別バックアップの鮮度・サイズを検証"""
+    reports = context.backup_tools.check_sites(BackupTools.load_schedule(params['schedule']))
+    failed = [r['site'] for r in reports if r['status'] != 'ok']
+    if failed:
+        raise RuntimeError(f"バックアップに問題があります: {', '.join(failed)}")
+    return {'sites': len(reports)}
+
+
+def task_ssl_check(context: JobContext, params: Dict[str, Any]) -> Dict[str, Any]:
+    """SSL証明書の残り日数を確認"""
+    warn_days = params.get('warn_days', 21)
+    remaining = {}
+    for domain in params['domains']:
+        tls = ssl.create_default_context()
+        with socket.create_connection((domain, params.get('port', 443)), timeout=10) as sock:
+            with tls.wrap_socket(sock, server_hostname=domain) as conn:
+                not_after = ssl.cert_time_to_seconds(conn.getpeercert()['notAfter'])
+        remaining[domain] = round((not_after - time.time()) / 86400, 1)
+
+    expiring = {d: days for d, days in remaining.items() if days < warn_days}
+    if expiring:
+        raise RuntimeError(f"証明書の期限が近づいています: {expiring}")
+    return {'remaining_days': remaining}
+
+
+def task_baseline_refresh(context: JobContext, params: Dict[str, Any]) -> Dict[str, Any]:
+    """季節性ベースラインを更新"""
+    store = BaselineStore.open(params['store'])
+    points = 0
+    for metric in params.get('metrics', ['cpu', 'memory', 'disk']):
+        series = context.monitoring_tools.get_fleet_series(metric, params.get('hours', 24))
+        points += sum(store.update({f"{metric}/{name}": p for name, p in series.items()}).values())
+    store.save()
+    return {'series': len(store), 'points': points}
+
+
+# ファイル・ディレクトリを指すタスクのパラメータ（YAML の相対パスは base_dir から解決する）
+PATH_PARAMS = ('schedule', 'store', 'cwd')
+
+TASKS = {
+    'command': task_command,
+    'backup_check': task_backup_check,
+    'ssl_check': task_ssl_check,
+    'baseline_refresh': task_baseline_refresh,
+}
+
+
+class Scheduler:
+    """
+    プロセス内スケジューラ
+
+    予定時刻を過ぎたジョブを全体の同時実行数 max_concurrency のスレッドプールに投入する。
+    実行中（待ち含む）が max_instances に達しているジョブの回は見送る。停止中などで
+    予定時刻を misfire_grace_seconds 以上過ぎていた場合、coalesce は溜まった回を1回に
+    まとめて実行し、skip は実行せずに次の予定へ進む。
+    ジョブの状態（次回予定・前回結果）は state_file に保存し、再起動後も引き継ぐ。
+    """
+
+    def __init__(
+        self,
+        jobs: List[Job],
+        state_file: Optional[str] = None,
+        max_concurrency: int = 2,
+        timezone: str = 'Asia/Tokyo',
+        context: Optional[JobContext] = None,
+        tasks: Optional[Dict[str, Callable]] = None,
+        clock: Callable[[], float] = time.time
+    ):
+        """
+        初期化
+
+        Args:
+            jobs: ジョブ
+            state_file: 状態の保存先（未指定の場合は保存しない）
+            max_concurrency: 全体の同時実行数
+            timezone: cron を解釈するタイムゾーン
+            context: 共有クライアント
+            tasks: タスク名 → 関数（未指定の場合は TASKS）
+            clock: 時刻関数（テスト用）
+        """
+        self.jobs = {job.name: job for job in jobs}
+        self.tasks = tasks or TASKS
+        for job in jobs:
+            if job.task not in self.tasks:
+                raise ValueError(f"未定義のタスクです: {job.task}")
+
+        self.state_file = Path(state_file) if state_file else None
+        self.max_concurrency = max_concurrency
+        self.tz = ZoneInfo(timezone)
+        self.context = context or JobContext()
+        self.clock = clock
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self._running = {name: 0 for name in self.jobs}
+        self._lock = threading.Lock()
+        self.state = self._load_state()
+
+        logger.info("Scheduler initialized", jobs=len(self.jobs), max_concurrency=max_concurrency)
+
+    @classmethod
+    def from_yaml(
+        cls,
+        path: str,
+        context: Optional[JobContext] = None,
+        base_dir: Optional[str] = None,
+        **kwargs
+    ) -> 'Scheduler':
+        """
+        YAMLファイルから生成
+
+        state_file とジョブのパスパラメータ（PATH_PARAMS）の相対パスは、作業ディレクトリではなく
+        base_dir から解決する。
+
+        Args:
+            path: スケジュール定義ファイル
+            context: 共有クライアント
+            base_dir: 相対パスの基準（未指定の場合は定義ファイルのディレクトリ）
+
+        Returns:
+            Scheduler
+        """
+        with open(path) as f:
+            data = yaml.safe_load(f) or {}
+        base_dir = Path(base_dir) if base_dir else Path(path).resolve().parent
+
+        def resolve(value):
+            return str(base_dir / Path(value).expanduser()) if value else value
+
+        jobs = []
+        for item in data.get('jobs', []):
+            params = dict(item.get('params') or {})
+            for key in PATH_PARAMS:
+                if isinstance(params.get(key), str):
+                    params[key] = resolve(params[key])
+            jobs.append(Job.from_dict(dict(item, params=params)))
+
+        options = {
+            'state_file': resolve(data.get('state_file')),
+            'max_concurrency': data.get('max_concurrency', 2),
+            'timezone': data.get('timezone', 'Asia/Tokyo'),
+        }
+        options.update(kwargs)
+        return cls(jobs, context=context, **options)
+
+    def _load_state(self) -> Dict[str, Dict[str, Any]]:
+        state = {}
+        if self.state_file and self.state_file.exists():
+            with open(self.state_file) as f:
+                state = json.load(f)
+        # 定義から消えたジョブの状態は捨てる
+        return {name: state.get(name, {}) for name in self.jobs}
+
+    def _save_state(self):
+        """
+        状態を保存（一時ファイルに書いてから置き換える）
+
+        ワーカースレッドとメインループの両方から呼ばれるので、書き込みと置き換えまでロック内で行う
+        （一時ファイルを共有したまま並行に置き換えると、古い状態で上書きしたり置き換えに失敗したりする）。
+        """
+        if self.state_file is None:
+            return
+        with self._lock:
+            data = json.dumps(self.state, ensure_ascii=False, indent=2)
+            self.state_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.state_file.with_name(self.state_file.name + '.tmp')
+            tmp.write_text(data)
+            os.replace(tmp, self.state_file)
+
+    def _schedule(self, job: Job, now: float):
+        """次の予定時刻を決める（self._lock の中で呼ぶ）"""
+        state = self.state[job.name]
+        base = job.next_base(state.get('next_base'), now, self.tz)
+        state['next_base'] = base
+        state['next_run'] = base + job.jitter(base)
+
+    def plan(self, now: Optional[float] = None) -> bool:
+        """
+        予定の無いジョブ（初回起動・追加されたジョブ）の次回予定を決める
+
+        Args:
+            now: 現在時刻（未指定の場合は clock()）
+
+        Returns:
+            予定を追加した場合 True
+        """
+        now = self.clock() if now is None else now
+        with self._lock:
+            return self._plan(now)
+
+    def _plan(self, now: float) -> bool:
+        """plan の本体（self._lock の中で呼ぶ）"""
+        changed = False
+        for job in self.jobs.values():
+            if self.state[job.name].get('next_run') is None:
+                self._schedule(job, now)
+                changed = True
+        return changed
+
+    def run_pending(self, now: Optional[float] = None) -> List[str]:
+        """
+        予定時刻を過ぎたジョブを投入
+
+        Args:
+            now: 現在時刻（未指定の場合は clock()）
+
+        Returns:
+            投入したジョブ名
+        """
+        now = self.clock() if now is None else now
+        due = []
+
+        # 状態はワーカーの _save_state が並行して書き出すので、変更はすべてロック内で行う
+        with self._lock:
+            changed = self._plan(now)
+            for job in self.jobs.values():
+                state = self.state[job.name]
+                if now < state['next_run']:
+                    continue
+
+                late = now - state['next_run']
+                # 次の予定は今より後に取り直すので、溜まった回は1回にまとまる
+                self._schedule(job, now)
+                changed = True
+
+                if late > job.misfire_grace_seconds and job.misfire == 'skip':
+                    state['skipped'] = state.get('skipped', 0) + 1
+                    logger.warning("Skipped missed job run", job=job.name, late_seconds=round(late))
+                    continue
+
+                if self._running[job.name] >= job.max_instances:
+                    state['skipped'] = state.get('skipped', 0) + 1
+                    logger.warning("Job still running, skipped", job=job.name)
+                    continue
+                self._running[job.name] += 1
+                due.append(job)
+
+        for job in due:
+            self.executor.submit(self._run_job, job)
+
+        if changed:
+            self._save_state()
+        return [job.name for job in due]
+
+    def _run_job(self, job: Job):
+        """ジョブを実行して結果を記録（スレッドプールで実行）"""
+        started = self.clock()
+        try:
+            result = self.tasks[job.task](self.context, job.params)
+            status, detail = 'success', result
+            logger.info("Job succeeded", job=job.name, duration=round(self.clock() - started, 2))
+        except Exception as e:
+            status, detail = 'failed', str(e)
+            logger.error("Job failed", job=job.name, error=str(e))
+        finally:
+            with self._lock:
+                self._running[job.name] -= 1
+
+        with self._lock:
+            state = self.state[job.name]
+            state.update({
+                'last_run': started,
+                'last_status': status,
+                'last_duration': round(self.clock() - started, 3),
+                'last_detail': detail,
+                'failures': 0 if status == 'success' else state.get('failures', 0) + 1,
+            })
+        self._save_state()
+
+    def run_job(self, name: str) -> Dict[str, Any]:
+        """
+        ジョブを今すぐ1回実行（予定は変えない）
+
+        Args:
+            name: ジョブ名
+
+        Returns:
+            実行後のジョブの状態
+        """
+        job = self.jobs[name]
+        with self._lock:
+            self._running[name] += 1
+        self._run_job(job)
+        with self._lock:
+            return dict(self.state[name])
+
+    def next_wakeup(self) -> Optional[float]:
+        """最も早い次回予定時刻"""
+        with self._lock:
+            times = [s['next_run'] for s in self.state.values() if s.get('next_run') is not None]
+        return min(times) if times else None
+
+    def run(self, stop: Optional[threading.Event] = None, max_sleep: float = 60.0):
+        """
+        停止されるまで実行を続ける
+
+        Args:
+            stop: 停止イベント
+            max_sleep: 1回の待機の上限（秒）
+        """
+        stop = stop or threading.Event()
+        try:
+            while not stop.is_set():
+                self.run_pending()
+                wakeup = self.next_wakeup()
+                delay = max_sleep if wakeup is None else wakeup - self.clock()
+                stop.wait(min(max(delay, 0.5), max_sleep))
+        finally:
+            self.executor.shutdown(wait=True)
+            self._save_state()
@@ -0,0 +1,171 @@
+"""
+マージ可能な要約データ構造
+並列に集計した部分結果を後から結合できる、メモリ上限付きのスケッチ
+"""
+
+import math
+from collections import Counter
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+
+
+class LatencySketch:
+    """
+    対数バケットによるレイテンシ分布スケッチ
+
+    値 v を ceil(log(v) / log(gamma)) のバケットで数えるため、分位点の
+    相対誤差は (gamma - 1) / 2 程度に収まる。バケット数は値の桁数に比例し、
+    件数には依存しない。同じ gamma のスケッチ同士はバケットの足し算で結合できる。
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        """
+        初期化
+
+        Args:
+            relative_accuracy: 分位点の相対誤差
+        """
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets = Counter()
+        self.zero_count = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float, count: int = 1):
+        """値を追加（0以下は0として数える）"""
+        if value > 0:
+            self.buckets[math.ceil(math.log(value) / self._log_gamma)] += count
+        else:
+            value = 0.0
+            self.zero_count += count
+        self.count += count
+        self.total += value * count
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: 'LatencySketch') -> 'LatencySketch':
+        """別のスケッチを結合"""
+        if other.gamma != self.gamma:
+            raise ValueError("relative_accuracy の異なるスケッチは結合できません")
+        self.buckets.update(other.buckets)
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        分位点を推定
+
+        Args:
+            q: 0〜1 の分位
+
+        Returns:
+            推定値（データが無い場合は None）
+        """
+        if self.count == 0:
+            return None
+
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+
+        seen = self.zero_count
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                # バケット [gamma^(i-1), gamma^i] の代表値
+                value = 2 * self.gamma ** index / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> Optional[float]:
+        """平均値"""
+        return self.total / self.count if self.count else None
+
+    def summary(self, quantiles: Iterable[float] = (0.5, 0.95, 0.99)) -> Dict[str, Any]:
+        """件数・平均・分位点をまとめる"""
+        result = {'count': self.count, 'mean': self.mean}
+        for q in quantiles:
+            result[f'p{round(q * 100):g}'] = self.quantile(q)
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON に保存できる形式に変換"""
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'buckets': {str(k): v for k, v in self.buckets.items()},
+            'zero_count': self.zero_count,
+            'count': self.count,
+            'total': self.total,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'LatencySketch':
+        """to_dict の出力から復元"""
+        sketch = cls(data['relative_accuracy'])
+        sketch.buckets = Counter({int(k): v for k, v in data['buckets'].items()})
+        sketch.zero_count = data['zero_count']
+        sketch.count = data['count']
+        sketch.total = data['total']
+        if data['count']:
+            sketch.min = data['min']
+            sketch.max = data['max']
+        return sketch
+
+
+class TopK:
+    """
+    上位k件の頻出キー（Misra-Gries 方式）
+
+    保持するキー数を capacity に制限し、溢れたら全カウンタから最小値を差し引く。
+    capacity 件を超える頻度を持つキーは必ず残り、カウントの誤差は
+    総数 / capacity 以下に収まる。結合後も同じ手順で切り詰める。
+    """
+
+    def __init__(self, capacity: int = 1000):
+        """
+        初期化
+
+        Args:
+            capacity: 保持するキー数の上限
+        """
+        self.capacity = capacity
+        self.counts = Counter()
+
+    def add(self, key: Any, count: int = 1):
+        """キーを数える"""
+        self.counts[key] += count
+        if len(self.counts) > self.capacity * 2:
+            self._shrink()
+
+    def update(self, counts: Dict[Any, int]):
+        """集計済みのカウントを加算"""
+        self.counts.update(counts)
+        if len(self.counts) > self.capacity * 2:
+            self._shrink()
+
+    def merge(self, other: 'TopK') -> 'TopK':
+        """別の TopK を結合"""
+        self.update(other.counts)
+        return self
+
+    def _shrink(self):
+        """capacity 件まで切り詰める"""
+        if len(self.counts) <= self.capacity:
+            return
+        kept = self.counts.most_common(self.capacity + 1)
+        floor = kept[-1][1]
+        self.counts = Counter({key: count - floor for key, count in kept[:-1] if count > floor})
+
+    def most_common(self, n: int) -> List[Tuple[Any, int]]:
+        """上位 n 件"""
+        return self.counts.most_common(n)
@@ -0,0 +1,423 @@
+"""
+SLO / エラーバジェット
+稼働監視とロードバランサのリクエスト数から可用性 SLI を集計し、30日間のエラーバジェットと
+バーンレートアラートを判定する
+"""
+
+import io
+import json
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+import structlog
+
+logger = structlog.get_logger()
+
+# 可用性の目標（requirements.md §10.2: 稼働率 > 99.5%）
+DEFAULT_OBJECTIVE = 0.995
+
+# 集計の単位（秒）と、保持・評価するウィンドウ
+BUCKET_SECONDS = 300
+BUDGET_WINDOW = '30d'
+WINDOWS = {
+    '5m': 300,
+    '30m': 1800,
+    '1h': 3600,
+    '2h': 7200,
+    '6h': 21600,
+    '1d': 86400,
+    '3d': 259200,
+    '30d': 2592000,
+}
+
+# マルチウィンドウ・マルチバーンレートの条件（長いウィンドウと短いウィンドウの両方がしきい値を超えたら発報）
+# 30日のバジェットに対して 1h で 2%、6h で 5%、1d で 10%、3d で 10% を消費するペース
+BURN_RATE_POLICIES = [
+    {'name': 'page-fast', 'severity': 'page', 'long': '1h', 'short': '5m', 'burn_rate': 14.4},
+    {'name': 'page-slow', 'severity': 'page', 'long': '6h', 'short': '30m', 'burn_rate': 6.0},
+    {'name': 'ticket-fast', 'severity': 'ticket', 'long': '1d', 'short': '2h', 'burn_rate': 3.0},
+    {'name': 'ticket-slow', 'severity': 'ticket', 'long': '3d', 'short': '6h', 'burn_rate': 1.0},
+]
+
+# SLI の取得元
+# good / total: (集計方法, 追加フィルタ) — good を省略した場合は total - bad
+SLI_SOURCES = {
+    'uptime': {
+        'type': 'monitoring.googleapis.com/uptime_check/check_passed',
+        'resource': 'uptime_url',
+        'group_by': 'resource.label.host',
+        'total': ('ALIGN_COUNT', None),
+        'good': ('ALIGN_COUNT_TRUE', None),
+    },
+    'lb': {
+        'type': 'loadbalancing.googleapis.com/https/request_count',
+        'resource': 'https_lb_rule',
+        'group_by': 'resource.label.url_map_name',
+        'total': ('ALIGN_DELTA', None),
+        'bad': ('ALIGN_DELTA', 'metric.label.response_code_class = 500'),
+    },
+}
+
+
+class ErrorBudgetStore:
+    """
+    SLI のバケット別カウンタとウィンドウ別の合計
+
+    (good, total) を BUCKET_SECONDS ごとのリングバッファ [系列 × 30日分] に持ち、
+    各ウィンドウの合計は差分で更新する（バケットが入ったら加算、ウィンドウから外れたら減算）。
+    評価時に履歴を読み直さないため、系列数とウィンドウ数だけの計算で全サイトを判定できる。
+    同じバケットを再取得した場合は差し替え（差分を反映）になるので、重なった期間を渡してよい。
+    """
+
+    def __init__(self, bucket_seconds: int = BUCKET_SECONDS, path: Optional[str] = None):
+        """
+        初期化
+
+        Args:
+            bucket_seconds: 集計の単位（秒、全ウィンドウの約数であること）
+            path: 保存先ファイル
+        """
+        if any(seconds % bucket_seconds for seconds in WINDOWS.values()):
+            raise ValueError("bucket_seconds はすべてのウィンドウの約数にしてください")
+
+        self.bucket_seconds = bucket_seconds
+        self.path = path
+        self.slots = WINDOWS[BUDGET_WINDOW] // bucket_seconds
+        self.window_names = list(WINDOWS)
+        self.window_slots = np.array([WINDOWS[name] // bucket_seconds for name in self.window_names])
+        self.index = {}
+        self.head = None
+        self.counts = np.zeros((0, self.slots, 2))
+        self.sums = np.zeros((0, len(self.window_names), 2))
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def _row(self, name: str) -> int:
+        """系列の行番号（無ければ追加）"""
+        row = self.index.get(name)
+        if row is None:
+            row = len(self.index)
+            self.index[name] = row
+            if row >= len(self.counts):
+                size = max(8, 2 * len(self.counts))
+                counts = np.zeros((size, self.slots, 2))
+                counts[:len(self.counts)] = self.counts
+                sums = np.zeros((size, len(self.window_names), 2))
+                sums[:len(self.sums)] = self.sums
+                self.counts, self.sums = counts, sums
+        return row
+
+    def _advance(self, head: int):
+        """最新バケットを head まで進め、ウィンドウから外れたバケットを合計から引く"""
+        if self.head is None:
+            self.head = head
+            return
+        steps = head - self.head
+        if steps <= 0:
+            return
+        if steps >= self.slots:
+            self.counts[:] = 0
+            self.sums[:] = 0
+            self.head = head
+            return
+
+        for w, length in enumerate(self.window_slots):
+            # (head_old - length, head_new - length] のバケットが外れる（head_old より新しい位置は未取り込み）
+            leaving = np.arange(self.head - length + 1, min(head - length, self.head) + 1) % self.slots
+            self.sums[:, w] -= self.counts[:, leaving].sum(axis=1)
+        # 新しいバケットの位置（30日前のバケット）を空ける
+        self.counts[:, np.arange(self.head + 1, head + 1) % self.slots] = 0
+        self.head = head
+
+    def update(self, series: Dict[str, List[Tuple[float, float, float]]]) -> int:
+        """
+        バケットごとの (good, total) を取り込む
+
+        Args:
+            series: 系列名 → [(UNIX秒, good, total)]
+
+        Returns:
+            取り込んだバケット数（30日より古いものは無視）
+        """
+        latest = max(
+            (int(ts // self.bucket_seconds) for points in series.values() for ts, _, _ in points),
+            default=None
+        )
+        if latest is None:
+            return 0
+        self._advance(latest)
+
+        applied = 0
+        for name, points in series.items():
+            row = self._row(name)
+            for ts, good, total in points:
+                bucket = int(ts // self.bucket_seconds)
+                age = self.head - bucket
+                if age < 0 or age >= self.slots:
+                    continue
+                slot = bucket % self.slots
+                delta = np.array([good, total], dtype=float) - self.counts[row, slot]
+                self.counts[row, slot] += delta
+                # このバケットを含むウィンドウの合計だけを更新
+                self.sums[row, age < self.window_slots] += delta
+                applied += 1
+
+        logger.info("SLO counters updated", series=len(series), buckets=applied)
+        return applied
+
+    def evaluate(
+        self,
+        objective: float = DEFAULT_OBJECTIVE,
+        policies: Optional[List[Dict[str, Any]]] = None,
+        now: Optional[float] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        全系列の SLI・エラーバジェット・バーンレートアラートをまとめて判定
+
+        Args:
+            objective: 可用性の目標（0.995 = 99.5%）
+            policies: バーンレートの条件（未指定の場合は BURN_RATE_POLICIES）
+            now: 現在時刻（指定した場合は最新バケットまで進めてから判定する）
+
+        Returns:
+            系列名 → {'sli', 'budget_remaining', 'burn_rates', 'alerts', ...}
+        """
+        if now is not None:
+            self._advance(int(now // self.bucket_seconds))
+        policies = policies or BURN_RATE_POLICIES
+        n = len(self.index)
+        sums = self.sums[:n]
+        good, total = sums[:, :, 0], sums[:, :, 1]
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            error_rate = np.where(total > 0, 1 - good / total, np.nan)
+        burn = error_rate / (1 - objective)
+        w = {name: i for i, name in enumerate(self.window_names)}
+
+        budget = w[BUDGET_WINDOW]
+        allowed = (1 - objective) * total[:, budget]
+        consumed = total[:, budget] - good[:, budget]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            remaining = np.where(allowed > 0, 1 - consumed / allowed, np.nan)
+
+        # 条件ごとに全系列を一度に判定
+        fired = {
+            policy['name']: (burn[:, w[policy['long']]] > policy['burn_rate'])
+            & (burn[:, w[policy['short']]] > policy['burn_rate'])
+            for policy in policies
+        }
+
+        def value(x):
+            return None if np.isnan(x) else round(float(x), 6)
+
+        results = {}
+        for name, row in self.index.items():
+            alerts = [
+                {
+                    'policy': policy['name'],
+                    'severity': policy['severity'],
+                    'burn_rate_threshold': policy['burn_rate'],
+                    'long_burn_rate': value(burn[row, w[policy['long']]]),
+                    'short_burn_rate': value(burn[row, w[policy['short']]]),
+                }
+                for policy in policies if fired[policy['name']][row]
+            ]
+            results[name] = {
+                'objective': objective,
+                'sli': value(1 - error_rate[row, budget]),
+                'total': float(total[row, budget]),
+                'bad': float(consumed[row]),
+                'budget_remaining': value(remaining[row]),
+                'burn_rates': {window: value(burn[row, i]) for window, i in w.items()},
+                'alerts': alerts,
+            }
+
+        firing = [name for name, result in results.items() if result['alerts']]
+        if firing:
+            logger.warning("SLO burn rate alerts", series=firing)
+        return results
+
+    @property
+    def watermark(self) -> Optional[float]:
+        """取り込み済みの最新バケットの開始時刻（UNIX秒）"""
+        return None if self.head is None else float(self.head * self.bucket_seconds)
+
+    def save(self, path: Optional[str] = None):
+        """
+        ファイルに保存（一時ファイルに書いてから置き換える）
+
+        Args:
+            path: 保存先（未指定の場合は読み込み元）
+        """
+        path = Path(path or self.path)
+        n = len(self.index)
+        meta = json.dumps({
+            'version': 1,
+            'bucket_seconds': self.bucket_seconds,
+            'windows': self.window_names,
+            'series': sorted(self.index, key=self.index.get),
+            'head': self.head,
+        })
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, meta=np.array(meta), counts=self.counts[:n], sums=self.sums[:n])
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + '.tmp')
+        tmp.write_bytes(buffer.getvalue())
+        os.replace(tmp, path)
+        self.path = str(path)
+        logger.info("SLO counters saved", path=str(path), series=n)
+
+    @classmethod
+    def load(cls, path: str) -> 'ErrorBudgetStore':
+        """
+        ファイルから読み込む
+
+        Args:
+            path: ファイルパス
+
+        Returns:
+            ErrorBudgetStore
+        """
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            store = cls(meta['bucket_seconds'], path)
+            if meta['windows'] != store.window_names:
+                # ウィンドウ定義が変わった場合は合計をバケットから作り直す
+                raise ValueError(f"ウィンドウ定義が異なるファイルです: {path}")
+            store.index = {name: row for row, name in enumerate(meta['series'])}
+            store.head = meta['head']
+            store.counts = np.array(data['counts'])
+            store.sums = np.array(data['sums'])
+        return store
+
+    @classmethod
+    def open(cls, path: str, **kwargs) -> 'ErrorBudgetStore':
+        """ファイルがあれば読み込み、無ければ空のストアを作る"""
+        if os.path.exists(path):
+            return cls.load(path)
+        return cls(path=path, **kwargs)
+
+
+def fetch_sli_counts(
+    monitoring_tools,
+    source: str,
+    start: float,
+    end: float,
+    bucket_seconds: int = BUCKET_SECONDS
+) -> Dict[str, List[Tuple[float, float, float]]]:
+    """
+    Cloud Monitoring から SLI のバケット別 (good, total) を取得
+
+    1回のクエリで全サイト（ホスト / URL マップ）分を取得する。
+
+    Args:
+        monitoring_tools: MonitoringTools
+        source: SLI_SOURCES のキー（uptime / lb）
+        start: 取得開始（UNIX秒）
+        end: 取得終了（UNIX秒）
+        bucket_seconds: 集計の単位（秒）
+
+    Returns:
+        「source:サイト」→ [(UNIX秒, good, total)]
+    """
+    from google.cloud import monitoring_v3
+
+    spec = SLI_SOURCES[source]
+    interval = monitoring_v3.TimeInterval({
+        "end_time": {"seconds": int(end)},
+        "start_time": {"seconds": int(start)},
+    })
+
+    def query(aligner: str, extra: Optional[str]) -> Dict[str, Dict[float, float]]:
+        filter_str = 'resource.type = "{}" AND metric.type = "{}"'.format(spec['resource'], spec['type'])
+        if extra:
+            filter_str += ' AND ' + extra
+        request = monitoring_v3.ListTimeSeriesRequest(
+            name=monitoring_tools.project_name,
+            filter=filter_str,
+            interval=interval,
+            aggregation=monitoring_v3.Aggregation({
+                "alignment_period": {"seconds": bucket_seconds},
+                "per_series_aligner": monitoring_v3.Aggregation.Aligner[aligner],
+                "cross_series_reducer": monitoring_v3.Aggregation.Reducer.REDUCE_SUM,
+                "group_by_fields": [spec['group_by']],
+            }),
+            view=monitoring_v3.ListTimeSeriesRequest.TimeSeriesView.FULL,
+        )
+        label = spec['group_by'].split('.')[-1]
+        values = {}
+        for time_series in monitoring_tools.client.list_time_series(request=request):
+            site = time_series.resource.labels.get(label) or time_series.metric.labels.get(label, '-')
+            points = values.setdefault(f"{source}:{site}", {})
+            for point in time_series.points:
+                # 整列後の点は区間の終わりの時刻なので、バケットの開始時刻に直す
+                ts = point.interval.end_time.timestamp() - bucket_seconds
+                points[ts] = points.get(ts, 0.0) + (point.value.int64_value or point.value.double_value)
+        return values
+
+    try:
+        totals = query(*spec['total'])
+        if 'good' in spec:
+            goods = query(*spec['good'])
+        else:
+            bads = query(*spec['bad'])
+            goods = {
+                name: {ts: total - bads.get(name, {}).get(ts, 0.0) for ts, total in points.items()}
+                for name, points in totals.items()
+            }
+    except Exception as e:
+        logger.error("Failed to get SLI counts", source=source, error=str(e))
+        raise
+
+    results = {
+        name: sorted((ts, goods.get(name, {}).get(ts, 0.0), total) for ts, total in points.items())
+        for name, points in totals.items()
+    }
+    logger.info("Retrieved SLI counts", source=source, series=len(results))
+    return results
+
+
+def refresh(
+    store: ErrorBudgetStore,
+    monitoring_tools,
+    sources: Tuple[str, ...] = tuple(SLI_SOURCES),
+    now: Optional[float] = None,
+    overlap_buckets: int = 2
+) -> int:
+    """
+    前回の取り込み以降の SLI を取得してストアに反映
+
+    初回は30日分、以降は最新バケットの少し前（確定前に取得したバケットを差し替えるため）から取得する。
+    いずれかの取得元で失敗した場合は例外をそのまま送出し、ストアは変更しない
+    （取り込み位置を進めると、失敗した期間が二度と取得されないため）。
+
+    Args:
+        store: ErrorBudgetStore
+        monitoring_tools: MonitoringTools
+        sources: SLI_SOURCES のキー
+        now: 現在時刻（UNIX秒）
+        overlap_buckets: 取り込み済みの最新バケットから何バケット遡って取り直すか
+
+    Returns:
+        取り込んだバケット数
+    """
+    end = now if now is not None else time.time()
+    start = end - WINDOWS[BUDGET_WINDOW]
+    if store.watermark is not None:
+        start = max(start, store.watermark - overlap_buckets * store.bucket_seconds)
+
+    # すべての取得元を取得し終えてから反映する
+    fetched = [fetch_sli_counts(monitoring_tools, source, start, end, store.bucket_seconds) for source in sources]
+
+    applied = 0
+    for counts in fetched:
+        applied += store.update(counts)
+    store._advance(int(end // store.bucket_seconds))
+    logger.info("SLO refreshed", since=datetime.fromtimestamp(start, timezone.utc).isoformat(), buckets=applied)
+    return applied
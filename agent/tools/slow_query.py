@@ -0,0 +1,436 @@
+"""
+スロークエリ解析ツール
+MySQL のスロークエリログをクエリの型（フィンガープリント）ごとに集計
+"""
+
+import gzip
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Iterable, Iterator
+
+import structlog
+
+from .sketches import LatencySketch
+
+logger = structlog.get_logger()
+
+# フィンガープリント化するときに置き換えるトークン
+_TOKEN_PATTERN = re.compile(
+    r"""
+      (?P<comment>/\*.*?\*/|--[^\n]*|\#[^\n]*)
+    | (?P<string>'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*")
+    | (?P<ident>`(?:[^`]|``)*`)
+    | (?P<number>\b0x[0-9a-f]+\b|\b\d+(?:\.\d+)?(?:e[-+]?\d+)?\b|(?<![\w.])\.\d+\b)
+    """,
+    re.X | re.S | re.I
+)
+# IN (?, ?, ...) → in (?+)
+_IN_LIST_PATTERN = re.compile(r'\bin \( ?\?(?: ?, ?\?)* ?\)')
+# VALUES (...), (...) → values (?+)（値の中の関数呼び出しは1段まで）
+_VALUES_PATTERN = re.compile(r'\bvalues ?(\((?:[^()]|\([^()]*\))*\))(?: ?, ?\((?:[^()]|\([^()]*\))*\))*')
+
+# ヘッダ行の解析
+_USER_PATTERN = re.compile(r'User@Host: ([^\[\s]*)')
+_SCHEMA_PATTERN = re.compile(r'Schema: (\S*)')
+_METRIC_PATTERN = re.compile(r'(\w+): (\S+)')
+_USE_PATTERN = re.compile(r'^use `?([^`;\s]+)`?;', re.I)
+_TIMESTAMP_PATTERN = re.compile(r'^SET timestamp=(\d+);', re.I)
+
+# フィンガープリントのキャッシュ件数（同じクエリ文字列の繰り返しを再解析しない）
+FINGERPRINT_CACHE_SIZE = 10000
+# 上限を超えて切り捨てた型をまとめる名前
+OTHER_FINGERPRINT = '(other)'
+# Cloud SQL のスロークエリログ
+CLOUDSQL_SLOW_LOG = 'cloudsql.googleapis.com%2Fmysql-slow.log'
+
+
+def _replace_token(m) -> str:
+    kind = m.lastgroup
+    if kind == 'ident':
+        return m.group()[1:-1].replace('``', '`')
+    if kind == 'comment':
+        return ' '
+    return '?'
+
+
+@lru_cache(maxsize=FINGERPRINT_CACHE_SIZE)
+def fingerprint(sql: str) -> str:
+    """
+    SQL をクエリの型に正規化
+
+    文字列・数値リテラルを ? に、IN リストと VALUES の複数行を (?+) にまとめ、
+    コメントを除いて空白を詰め、小文字にする。
+
+    Args:
+        sql: SQL 文
+
+    Returns:
+        フィンガープリント
+    """
+    text = ' '.join(_TOKEN_PATTERN.sub(_replace_token, sql).split()).rstrip('; ').lower()
+    text = _IN_LIST_PATTERN.sub('in (?+)', text)
+    # ON DUPLICATE KEY UPDATE の VALUES(col) は残す
+    text = _VALUES_PATTERN.sub('values (?+)', text, count=1)
+    return text
+
+
+def parse_slow_log(lines: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """
+    スロークエリログの行からエントリを取り出す
+
+    「# Time / # User@Host / # Query_time」のヘッダと続く SQL を1件にまとめる。
+    「use db;」はデータベースが変わったときだけ書かれるため、直前の値を引き継ぐ。
+
+    Args:
+        lines: ログの行（解析済みのエントリ dict はそのまま返す）
+
+    Yields:
+        {'timestamp', 'user', 'database', 'query_time', 'lock_time', 'rows_sent', 'rows_examined', 'sql'}
+    """
+    database = None
+    header = {}
+    sql = []
+
+    def flush():
+        if sql and 'query_time' in header:
+            yield {'database': database, **header, 'sql': ' '.join(sql)}
+
+    for line in lines:
+        if isinstance(line, dict):
+            yield line
+            continue
+        line = line.rstrip('\r\n')
+        if not line:
+            continue
+
+        if line.startswith('#'):
+            if line.startswith('# administrator command:'):
+                sql.append(line[2:])
+                continue
+            # 前のエントリの SQL の後に新しいヘッダが来たら区切る
+            if sql:
+                yield from flush()
+                header, sql = {}, []
+            if line.startswith('# Time:'):
+                header['timestamp'] = line[7:].strip()
+            elif line.startswith('# User@Host:'):
+                m = _USER_PATTERN.search(line)
+                header['user'] = m.group(1) if m else None
+            else:
+                m = _SCHEMA_PATTERN.search(line)
+                if m and m.group(1):
+                    database = m.group(1)
+                for key, value in _METRIC_PATTERN.findall(line):
+                    if key in ('Query_time', 'Lock_time'):
+                        header[key.lower()] = float(value)
+                    elif key in ('Rows_sent', 'Rows_examined'):
+                        header[key.lower()] = int(value)
+            continue
+
+        first = line[0]
+        if first in 'uU':
+            m = _USE_PATTERN.match(line)
+            if m:
+                database = m.group(1)
+                continue
+        elif first in 'sS':
+            m = _TIMESTAMP_PATTERN.match(line)
+            if m:
+                if 'timestamp' not in header:
+                    header['timestamp'] = datetime.fromtimestamp(int(m.group(1)), timezone.utc).isoformat()
+                continue
+        if header:
+            sql.append(line.strip())
+        # ヘッダの無い行（mysqld 起動時のバナーなど）は読み飛ばす
+
+    yield from flush()
+
+
+class QueryStats:
+    """クエリの型1つ分の集計"""
+
+    __slots__ = ('count', 'total_time', 'max_time', 'lock_time', 'rows_sent', 'rows_examined',
+                 'latency', 'sample', 'sample_time')
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.lock_time = 0.0
+        self.rows_sent = 0
+        self.rows_examined = 0
+        self.latency = LatencySketch()
+        self.sample = None
+        self.sample_time = -1.0
+
+    def add(self, entry: Dict[str, Any]):
+        """エントリを1件追加（最も遅かったクエリを代表例として残す）"""
+        query_time = entry['query_time']
+        self.count += 1
+        self.total_time += query_time
+        self.lock_time += entry.get('lock_time', 0.0)
+        self.rows_sent += entry.get('rows_sent', 0)
+        self.rows_examined += entry.get('rows_examined', 0)
+        self.latency.add(query_time)
+        if query_time > self.max_time:
+            self.max_time = query_time
+        if query_time > self.sample_time:
+            self.sample, self.sample_time = entry['sql'], query_time
+
+    def merge(self, other: 'QueryStats') -> 'QueryStats':
+        """別の集計を結合"""
+        self.count += other.count
+        self.total_time += other.total_time
+        self.max_time = max(self.max_time, other.max_time)
+        self.lock_time += other.lock_time
+        self.rows_sent += other.rows_sent
+        self.rows_examined += other.rows_examined
+        self.latency.merge(other.latency)
+        if other.sample_time > self.sample_time:
+            self.sample, self.sample_time = other.sample, other.sample_time
+        return self
+
+    def report(self) -> Dict[str, Any]:
+        """集計結果をまとめる"""
+        latency = self.latency.summary()
+        return {
+            'count': self.count,
+            'total_time': round(self.total_time, 6),
+            'avg_time': latency['mean'],
+            'max_time': self.max_time,
+            'p50': latency['p50'],
+            'p95': latency['p95'],
+            'p99': latency['p99'],
+            'lock_time': round(self.lock_time, 6),
+            'rows_sent': self.rows_sent,
+            'rows_examined': self.rows_examined,
+            'rows_examined_avg': self.rows_examined / self.count if self.count else 0,
+            'sample': self.sample,
+        }
+
+
+class SlowQueryAggregate:
+    """
+    (データベース, フィンガープリント) ごとの集計（ワーカー間で結合可能）
+
+    型の数が max_groups の2倍を超えたら合計時間の小さい型を OTHER_FINGERPRINT に
+    まとめるため、件数が増えてもメモリは型の数で頭打ちになる。全体の件数と時間は失わない。
+    """
+
+    def __init__(self, max_groups: int = 5000):
+        """
+        初期化
+
+        Args:
+            max_groups: 保持する型の数
+        """
+        self.max_groups = max_groups
+        self.entries = 0
+        self.folded = 0
+        self.groups = {}
+
+    def add(self, entry: Dict[str, Any]):
+        """エントリを1件追加"""
+        key = (entry.get('database') or '-', fingerprint(entry['sql']))
+        stats = self.groups.get(key)
+        if stats is None:
+            stats = self.groups[key] = QueryStats()
+        stats.add(entry)
+        self.entries += 1
+        if len(self.groups) > self.max_groups * 2:
+            self._shrink()
+
+    def add_entries(self, entries: Iterable[Dict[str, Any]]) -> 'SlowQueryAggregate':
+        """エントリをまとめて追加"""
+        for entry in entries:
+            self.add(entry)
+        return self
+
+    def _shrink(self):
+        """合計時間の小さい型をデータベースごとの OTHER_FINGERPRINT にまとめる"""
+        ranked = sorted(self.groups.items(), key=lambda kv: kv[1].total_time, reverse=True)
+        self.groups = dict(ranked[:self.max_groups])
+        for (database, name), stats in ranked[self.max_groups:]:
+            other = self.groups.setdefault((database, OTHER_FINGERPRINT), QueryStats())
+            if name != OTHER_FINGERPRINT:
+                self.folded += 1
+            other.merge(stats)
+
+    def merge(self, other: 'SlowQueryAggregate') -> 'SlowQueryAggregate':
+        """別の部分集計を結合"""
+        self.entries += other.entries
+        self.folded += other.folded
+        for key, stats in other.groups.items():
+            if key in self.groups:
+                self.groups[key].merge(stats)
+            else:
+                self.groups[key] = stats
+        if len(self.groups) > self.max_groups * 2:
+            self._shrink()
+        return self
+
+    def report(self, top: int = 20, sort: str = 'total_time', database: Optional[str] = None) -> Dict[str, Any]:
+        """
+        集計結果をまとめる
+
+        Args:
+            top: 上位何件を返すか
+            sort: 並べ替えの基準（total_time / count / p95 / p99 / max_time / rows_examined）
+            database: 対象データベース（未指定の場合は全データベース）
+
+        Returns:
+            {'entries', 'folded', 'databases', 'queries'}
+        """
+        rows = []
+        databases = {}
+        for (db, name), stats in self.groups.items():
+            totals = databases.setdefault(db, {'count': 0, 'total_time': 0.0})
+            totals['count'] += stats.count
+            totals['total_time'] += stats.total_time
+            if database and db != database:
+                continue
+            rows.append({'database': db, 'fingerprint': name, **stats.report()})
+
+        rows.sort(key=lambda row: row[sort] or 0, reverse=True)
+        return {
+            'entries': self.entries,
+            'folded': self.folded,
+            'databases': dict(sorted(databases.items(), key=lambda kv: kv[1]['total_time'], reverse=True)),
+            'queries': rows[:top],
+        }
+
+
+def _open_text(path: str):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', errors='replace')
+    return open(path, 'r', encoding='utf-8', errors='replace')
+
+
+def _analyze_file(path: str, max_groups: int) -> SlowQueryAggregate:
+    """ファイル1つを集計（ワーカープロセスで実行）"""
+    with _open_text(path) as f:
+        return SlowQueryAggregate(max_groups).add_entries(parse_slow_log(f))
+
+
+def iter_logging_entries(
+    project_id: Optional[str] = None,
+    hours: int = 24,
+    database_id: Optional[str] = None,
+    log_name: str = CLOUDSQL_SLOW_LOG,
+    page_size: int = 1000
+) -> Iterator[Dict[str, Any]]:
+    """
+    Cloud Logging からスロークエリのエントリを読む
+
+    Cloud SQL のログは1行ごとのテキストなので古い順に parse_slow_log に通し、
+    Ops Agent（mysql_slow）の解析済み JSON はそのままエントリにする。
+
+    Args:
+        project_id: GCPプロジェクトID（未指定の場合は環境変数から取得）
+        hours: 過去何時間分を読むか
+        database_id: Cloud SQL インスタンス（「プロジェクトID:インスタンス名」、未指定の場合は全インスタンス）
+        log_name: ログ名
+        page_size: 1回の取得件数
+
+    Yields:
+        parse_slow_log と同じ形式のエントリ
+    """
+    from google.cloud import logging as cloud_logging
+
+    project_id = project_id or os.getenv('GCP_PROJECT_ID')
+    if not project_id:
+        raise ValueError("GCP_PROJECT_ID が設定されていません")
+
+    since = (datetime.now(timezone.utc) - timedelta(hours=hours)).strftime('%Y-%m-%dT%H:%M:%SZ')
+    filter_str = f'logName = "projects/{project_id}/logs/{log_name}" AND timestamp >= "{since}"'
+    if database_id:
+        filter_str += f' AND resource.labels.database_id = "{database_id}"'
+
+    client = cloud_logging.Client(project=project_id)
+    entries = client.list_entries(
+        resource_names=[f"projects/{project_id}"],
+        filter_=filter_str,
+        order_by=cloud_logging.ASCENDING,
+        page_size=page_size,
+    )
+
+    def lines():
+        for entry in entries:
+            payload = entry.payload
+            if isinstance(payload, dict):
+                if 'queryTime' in payload:
+                    yield {
+                        'timestamp': entry.timestamp.isoformat() if entry.timestamp else None,
+                        'user': payload.get('user'),
+                        'database': payload.get('database'),
+                        'query_time': float(payload['queryTime']),
+                        'lock_time': float(payload.get('lockTime', 0)),
+                        'rows_sent': int(payload.get('rowsSent', 0)),
+                        'rows_examined': int(payload.get('rowsExamined', 0)),
+                        'sql': payload.get('message', ''),
+                    }
+            elif payload:
+                yield from str(payload).splitlines()
+
+    count = 0
+    for entry in parse_slow_log(lines()):
+        count += 1
+        yield entry
+
+    logger.info("Read slow query log", project_id=project_id, hours=hours, entries=count)
+
+
+class SlowQueryAnalyzer:
+    """スロークエリログの解析"""
+
+    def __init__(self, workers: Optional[int] = None, max_groups: int = 5000):
+        """
+        初期化
+
+        Args:
+            workers: ワーカープロセス数（未指定の場合はCPUコア数）
+            max_groups: 保持する型の数
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.max_groups = max_groups
+
+    def analyze(self, paths: List[str]) -> SlowQueryAggregate:
+        """
+        ログファイルを並列に集計（ファイル単位で分担、.gz は gzip として扱う）
+
+        Args:
+            paths: ログファイルのパス
+
+        Returns:
+            全体の集計結果
+        """
+        total = SlowQueryAggregate(self.max_groups)
+        # 大きいファイルから投入して終盤の偏りを減らす
+        paths = sorted(paths, key=os.path.getsize, reverse=True)
+        if self.workers == 1 or len(paths) == 1:
+            for path in paths:
+                total.merge(_analyze_file(path, self.max_groups))
+        else:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(paths))) as executor:
+                for aggregate in executor.map(_analyze_file, paths, [self.max_groups] * len(paths)):
+                    total.merge(aggregate)
+
+        logger.info("Analyzed slow query logs", files=len(paths), entries=total.entries, groups=len(total.groups))
+        return total
+
+    def analyze_entries(self, entries: Iterable[Dict[str, Any]]) -> SlowQueryAggregate:
+        """
+        エントリのストリームを集計（Cloud Logging など）
+
+        Args:
+            entries: parse_slow_log / iter_logging_entries のエントリ
+
+        Returns:
+            集計結果
+        """
+        total = SlowQueryAggregate(self.max_groups).add_entries(entries)
+        logger.info("Analyzed slow query entries", entries=total.entries, groups=len(total.groups))
+        return total
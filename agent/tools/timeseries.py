@@ -0,0 +1,66 @@
+"""
+時系列ユーティリティ
+メトリクスのデータポイントリストを共通の時間グリッド上の行列に変換
+"""
+
+from datetime import datetime
+from typing import List, Dict, Any, Tuple
+
+import numpy as np
+
+
+def to_epoch(timestamp: Any) -> float:
+    """ISO形式の文字列または datetime を UNIX 秒に変換"""
+    if isinstance(timestamp, datetime):
+        return timestamp.timestamp()
+    if isinstance(timestamp, (int, float)):
+        return float(timestamp)
+    return datetime.fromisoformat(str(timestamp).replace('Z', '+00:00')).timestamp()
+
+
+def align_series(
+    series: Dict[str, List[Dict[str, Any]]],
+    step_seconds: int = 300
+) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """
+    複数系列を共通の時間グリッドに揃える
+
+    同じグリッドに複数の点が入る場合は平均を取り、点が無いグリッドは NaN とする。
+
+    Args:
+        series: 系列名 → データポイントリスト（timestamp, value）
+        step_seconds: グリッド間隔（秒）
+
+    Returns:
+        (系列名リスト, グリッド時刻（UNIX秒）, 値の行列 [系列数 × グリッド数])
+    """
+    names = sorted(series)
+    if not names:
+        return [], np.empty(0), np.empty((0, 0))
+
+    # 全点を (系列番号, 時刻, 値) の配列にまとめて一括でビン詰めする
+    rows, times, values = [], [], []
+    for row, name in enumerate(names):
+        for point in series[name]:
+            rows.append(row)
+            times.append(to_epoch(point['timestamp']))
+            values.append(point['value'])
+
+    if not times:
+        return names, np.empty(0), np.full((len(names), 0), np.nan)
+
+    rows = np.asarray(rows, dtype=np.int64)
+    bins = np.floor(np.asarray(times) / step_seconds).astype(np.int64)
+    values = np.asarray(values, dtype=float)
+
+    first = bins.min()
+    width = int(bins.max() - first + 1)
+    flat = rows * width + (bins - first)
+
+    sums = np.bincount(flat, weights=values, minlength=len(names) * width)
+    counts = np.bincount(flat, minlength=len(names) * width)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        matrix = (sums / counts).reshape(len(names), width)
+
+    grid = (first + np.arange(width)) * float(step_seconds)
+    return names, grid, matrix
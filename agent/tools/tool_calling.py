@@ -0,0 +1,534 @@
+"""
+LLM ツール呼び出し層
+GCPTools / MonitoringTools のメソッドを JSON スキーマ付きのツールとして公開し、
+モデルの1ターン分のツール呼び出しを並列実行・メモ化する
+"""
+
+import inspect
+import json
+import re
+import time
+import typing
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Callable, Tuple, Union
+
+import numpy as np
+import structlog
+
+logger = structlog.get_logger()
+
+# モデルに公開するメソッド: (名前, 状態を変更するか, 変更後に無効化するツール（None の場合は全て）)
+GCP_TOOL_METHODS = [
+    ('list_instances', False, None),
+    ('get_instance', False, None),
+    ('list_buckets', False, None),
+    ('list_zones', False, None),
+    ('start_instance', True, ('list_instances', 'get_instance')),
+    ('stop_instance', True, ('list_instances', 'get_instance')),
+    ('reset_instance', True, ('list_instances', 'get_instance')),
+]
+MONITORING_TOOL_METHODS = [
+    ('get_cpu_utilization', False, None),
+    ('get_memory_utilization', False, None),
+    ('get_disk_io', False, None),
+    ('get_fleet_series', False, None),
+    ('get_summary', False, None),
+]
+
+JSON_TYPES = {
+    str: 'string',
+    int: 'integer',
+    float: 'number',
+    bool: 'boolean',
+    list: 'array',
+    dict: 'object',
+}
+
+
+def _json_type(annotation: Any) -> Tuple[Dict[str, Any], bool]:
+    """型注釈を JSON スキーマの型に変換（戻り値の2つ目は Optional かどうか）"""
+    optional = False
+    if typing.get_origin(annotation) is Union:
+        args = [a for a in typing.get_args(annotation) if a is not type(None)]
+        optional = len(args) < len(typing.get_args(annotation))
+        annotation = args[0] if len(args) == 1 else Any
+    origin = typing.get_origin(annotation) or annotation
+    schema = {'type': JSON_TYPES[origin]} if origin in JSON_TYPES else {}
+    return schema, optional
+
+
+def _docstring_args(doc: str) -> Dict[str, str]:
+    """docstring の Args: 節から引数の説明を取り出す"""
+    descriptions = {}
+    section = re.search(r'Args:\n(.*?)(?:\n\s*\n|\Z)', doc or '', re.S)
+    if section:
+        for line in section.group(1).splitlines():
+            m = re.match(r'\s*(\w+):\s*(.+)', line)
+            if m:
+                descriptions[m.group(1)] = m.group(2).strip()
+    return descriptions
+
+
+def function_schema(func: Callable) -> Tuple[str, Dict[str, Any]]:
+    """
+    関数のシグネチャと docstring から説明文と引数の JSON スキーマを作る
+
+    Args:
+        func: 対象の関数（バインド済みメソッド可）
+
+    Returns:
+        (説明文, 引数の JSON スキーマ)
+    """
+    doc = inspect.getdoc(func) or ''
+    descriptions = _docstring_args(doc)
+    hints = typing.get_type_hints(func)
+
+    properties = {}
+    required = []
+    for name, param in inspect.signature(func).parameters.items():
+        if param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+            continue
+        schema, optional = _json_type(hints.get(name, Any))
+        if name in descriptions:
+            schema['description'] = descriptions[name]
+        properties[name] = schema
+        if param.default is param.empty and not optional:
+            required.append(name)
+
+    return doc.split('\n', 1)[0], {'type': 'object', 'properties': properties, 'required': required}
+
+
+def _is_series(value: Any) -> bool:
+    """データポイントリスト（timestamp, value の dict のリスト）かどうか"""
+    return (
+        isinstance(value, list) and len(value) > 0
+        and isinstance(value[0], dict) and 'timestamp' in value[0] and 'value' in value[0]
+    )
+
+
+def compact_series(points: List[Dict[str, Any]], max_points: int = 60) -> Dict[str, Any]:
+    """
+    データポイントリストを要約（統計量 + 区間平均で間引いた点）
+
+    Args:
+        points: データポイントリスト（古い順）
+        max_points: 残す点数の上限
+
+    Returns:
+        {'count', 'min', 'max', 'mean', 'last', 'points'}
+    """
+    values = np.array([np.nan if p['value'] is None else p['value'] for p in points], dtype=float)
+    summary = {
+        'count': len(points),
+        'min': round(float(np.nanmin(values)), 3),
+        'max': round(float(np.nanmax(values)), 3),
+        'mean': round(float(np.nanmean(values)), 3),
+        'last': round(float(values[-1]), 3),
+    }
+    if len(points) <= max_points:
+        summary['points'] = [[p['timestamp'], round(float(v), 3)] for p, v in zip(points, values)]
+    else:
+        buckets = np.array_split(np.arange(len(points)), max_points)
+        summary['points'] = [
+            [points[b[0]]['timestamp'], round(float(np.nanmean(values[b])), 3)] for b in buckets
+        ]
+    return summary
+
+
+def compact_result(value: Any, max_points: int = 60, max_items: int = 20) -> Any:
+    """
+    ツールの戻り値をプロンプトに載せられる大きさに縮める
+
+    データポイントリストは間引き、系列の dict は最大値の大きい順に上位 max_items 件、
+    その他のリストは先頭 max_items 件に切り詰める。
+
+    Args:
+        value: ツールの戻り値
+        max_points: 系列あたりの点数の上限
+        max_items: リスト・系列数の上限
+
+    Returns:
+        縮めた値
+    """
+    if _is_series(value):
+        return compact_series(value, max_points)
+
+    if isinstance(value, dict):
+        if value and all(_is_series(v) for v in value.values()):
+            # 系列名 → データポイントリスト（get_fleet_series など）
+            series = {name: compact_series(points, max_points) for name, points in value.items()}
+            top = sorted(series, key=lambda name: series[name]['max'], reverse=True)[:max_items]
+            result = {name: series[name] for name in top}
+            if len(series) > max_items:
+                result['_omitted_series'] = len(series) - max_items
+            return result
+        return {k: compact_result(v, max_points, max_items) for k, v in value.items()}
+
+    if isinstance(value, list):
+        items = [compact_result(v, max_points, max_items) for v in value[:max_items]]
+        if len(value) > max_items:
+            items.append({'_omitted_items': len(value) - max_items})
+        return items
+
+    return value
+
+
+@dataclass
+class ToolSpec:
+    """モデルに公開するツール"""
+
+    name: str
+    func: Callable[..., Any]
+    description: str
+    parameters: Dict[str, Any]
+    mutating: bool = False
+    invalidates: Optional[Tuple[str, ...]] = None
+
+
+class ToolRegistry:
+    """ツールの登録とスキーマ出力"""
+
+    def __init__(self):
+        """初期化"""
+        self.tools = {}
+
+    def register(
+        self,
+        func: Callable[..., Any],
+        name: Optional[str] = None,
+        mutating: bool = False,
+        invalidates: Optional[Tuple[str, ...]] = None
+    ) -> ToolSpec:
+        """
+        関数をツールとして登録
+
+        Args:
+            func: ツールの実体
+            name: ツール名（未指定の場合は関数名）
+            mutating: リソースの状態を変更するか（変更系は並列実行・メモ化しない）
+            invalidates: 実行後に無効化するツール名（未指定の場合はメモ化した結果を全て捨てる）
+
+        Returns:
+            登録したツール
+        """
+        description, parameters = function_schema(func)
+        spec = ToolSpec(
+            name=name or func.__name__,
+            func=func,
+            description=description,
+            parameters=parameters,
+            mutating=mutating,
+            invalidates=invalidates,
+        )
+        self.tools[spec.name] = spec
+        return spec
+
+    @classmethod
+    def for_agent(cls, gcp_tools=None, monitoring_tools=None, allow_mutations: bool = False) -> 'ToolRegistry':
+        """
+        GCPTools / MonitoringTools のメソッドを登録したレジストリを作る
+
+        Args:
+            gcp_tools: GCPTools インスタンス
+            monitoring_tools: MonitoringTools インスタンス
+            allow_mutations: 起動・停止などの変更系ツールも公開するか
+
+        Returns:
+            ToolRegistry
+        """
+        registry = cls()
+        for tools, methods in ((gcp_tools, GCP_TOOL_METHODS), (monitoring_tools, MONITORING_TOOL_METHODS)):
+            if tools is None:
+                continue
+            for name, mutating, invalidates in methods:
+                if mutating and not allow_mutations:
+                    continue
+                registry.register(getattr(tools, name), name, mutating, invalidates)
+        return registry
+
+    def schemas(self, style: str = 'anthropic') -> List[Dict[str, Any]]:
+        """
+        ツール定義を API の形式で出力
+
+        Args:
+            style: 'anthropic'（Messages API）または 'openai'（Chat Completions API）
+
+        Returns:
+            ツール定義のリスト
+        """
+        if style == 'openai':
+            return [
+                {'type': 'function', 'function': {
+                    'name': t.name, 'description': t.description, 'parameters': t.parameters,
+                }}
+                for t in self.tools.values()
+            ]
+        return [
+            {'name': t.name, 'description': t.description, 'input_schema': t.parameters}
+            for t in self.tools.values()
+        ]
+
+
+class ToolSession:
+    """
+    1件の障害対応の間のツール実行
+
+    読み取り系の結果は (ツール名, 引数) をキーに ttl_seconds の間メモ化する。
+    1ターン分の呼び出しは、連続する読み取り系をまとめて並列に実行し（同じ呼び出しは1回だけ）、
+    変更系はその前後の区切りとして順番に1件ずつ実行してからメモを無効化する。
+    """
+
+    def __init__(
+        self,
+        registry: ToolRegistry,
+        max_workers: int = 8,
+        ttl_seconds: float = 300,
+        max_result_chars: int = 8000,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        初期化
+
+        Args:
+            registry: ツールレジストリ
+            max_workers: 並列実行数
+            ttl_seconds: 読み取り結果をメモ化する秒数
+            max_result_chars: モデルに返す結果の最大文字数
+            clock: 時刻関数（テスト用）
+        """
+        self.registry = registry
+        self.ttl_seconds = ttl_seconds
+        self.max_result_chars = max_result_chars
+        self.clock = clock
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._cache = {}
+        self.stats = {'calls': 0, 'executed': 0, 'cache_hits': 0, 'errors': 0}
+
+    def close(self):
+        """スレッドプールを終了"""
+        self.executor.shutdown(wait=False)
+
+    def __enter__(self) -> 'ToolSession':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def _key(name: str, arguments: Dict[str, Any]) -> Tuple[str, str]:
+        return name, json.dumps(arguments, sort_keys=True, default=str)
+
+    def _validate(self, name: str, arguments: Dict[str, Any]) -> Optional[str]:
+        """呼び出しを確認し、問題があればエラーメッセージを返す"""
+        spec = self.registry.tools.get(name)
+        if spec is None:
+            return f"未定義のツールです: {name}"
+        unknown = set(arguments) - set(spec.parameters['properties'])
+        if unknown:
+            return f"未定義の引数です: {', '.join(sorted(unknown))}"
+        missing = [p for p in spec.parameters['required'] if p not in arguments]
+        if missing:
+            return f"必須の引数がありません: {', '.join(missing)}"
+        return None
+
+    def _invoke(self, name: str, arguments: Dict[str, Any]) -> Tuple[bool, str]:
+        """ツールを実行し、(エラーかどうか, モデルに返す文字列) を返す"""
+        try:
+            result = self.registry.tools[name].func(**arguments)
+        except Exception as e:
+            logger.error("Tool call failed", tool=name, error=str(e))
+            return True, f"{type(e).__name__}: {e}"
+
+        # 上限に収まるまで点数・件数を半分ずつ減らし、それでも溢れる分は切り捨てる
+        max_points, max_items = 60, 20
+        while True:
+            text = json.dumps(compact_result(result, max_points, max_items), ensure_ascii=False, default=str)
+            if len(text) <= self.max_result_chars or max_points <= 6:
+                break
+            max_points, max_items = max_points // 2, max(5, max_items // 2)
+        if len(text) > self.max_result_chars:
+            text = text[:self.max_result_chars] + f"...（{len(text) - self.max_result_chars}文字省略）"
+        return False, text
+
+    def _invalidate(self, spec: ToolSpec):
+        """変更系ツールの実行後にメモを捨てる"""
+        if spec.invalidates is None:
+            self._cache.clear()
+        else:
+            for key in [k for k in self._cache if k[0] in spec.invalidates]:
+                del self._cache[key]
+
+    def execute(self, tool_uses: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        1ターン分のツール呼び出しを実行
+
+        Args:
+            tool_uses: [{'id', 'name', 'input'}]（Messages API の tool_use ブロック）
+
+        Returns:
+            呼び出し順の tool_result ブロック
+        """
+        outcomes = {}
+        pending = []
+
+        def flush():
+            """溜まった読み取り系をまとめて並列実行"""
+            futures = {}
+            now = self.clock()
+            for use in pending:
+                key = self._key(use['name'], use.get('input') or {})
+                cached = self._cache.get(key)
+                if cached is not None and now - cached[0] < self.ttl_seconds:
+                    self.stats['cache_hits'] += 1
+                    outcomes[use['id']] = cached[1]
+                elif key not in futures:
+                    futures[key] = self.executor.submit(self._invoke, use['name'], use.get('input') or {})
+                    self.stats['executed'] += 1
+                else:
+                    self.stats['cache_hits'] += 1
+
+            for key, future in futures.items():
+                outcome = future.result()
+                if not outcome[0]:
+                    self._cache[key] = (now, outcome)
+            for use in pending:
+                key = self._key(use['name'], use.get('input') or {})
+                if use['id'] not in outcomes:
+                    outcomes[use['id']] = futures[key].result()
+            pending.clear()
+
+        for use in tool_uses:
+            self.stats['calls'] += 1
+            arguments = use.get('input') or {}
+            error = self._validate(use['name'], arguments)
+            if error:
+                outcomes[use['id']] = (True, error)
+                continue
+
+            spec = self.registry.tools[use['name']]
+            if not spec.mutating:
+                pending.append(use)
+                continue
+
+            # 変更系はそれまでの読み取りを終えてから単独で実行する
+            flush()
+            outcomes[use['id']] = self._invoke(spec.name, arguments)
+            self.stats['executed'] += 1
+            self._invalidate(spec)
+        flush()
+
+        results = []
+        for use in tool_uses:
+            is_error, content = outcomes[use['id']]
+            self.stats['errors'] += is_error
+            results.append({'type': 'tool_result', 'tool_use_id': use['id'], 'content': content, 'is_error': is_error})
+
+        logger.info("Executed tool calls", batch=len(tool_uses), **self.stats)
+        return results
+
+
+class ScriptedModel:
+    """
+    台本どおりに応答するモデル（テスト用）
+
+    各ターンの応答は、最終回答の文字列か、(ツール名, 引数) のリスト。
+    受け取ったリクエストは requests に記録する。
+    """
+
+    def __init__(self, turns: List[Union[str, List[Tuple[str, Dict[str, Any]]]]]):
+        """
+        初期化
+
+        Args:
+            turns: ターンごとの応答
+        """
+        self.turns = list(turns)
+        self.requests = []
+
+    def __call__(self, messages, tools, system=None) -> Dict[str, Any]:
+        self.requests.append({'messages': list(messages), 'tools': tools, 'system': system})
+        turn = self.turns.pop(0)
+        if isinstance(turn, str):
+            return {'content': [{'type': 'text', 'text': turn}], 'stop_reason': 'end_turn'}
+
+        offset = len(self.requests) * 100
+        return {
+            'content': [
+                {'type': 'tool_use', 'id': f"toolu_{offset + i}", 'name': name, 'input': arguments}
+                for i, (name, arguments) in enumerate(turn)
+            ],
+            'stop_reason': 'tool_use',
+        }
+
+
+class AnthropicModel:
+    """Anthropic Messages API のモデル"""
+
+    def __init__(self, model: str, max_tokens: int = 4096, api_key: Optional[str] = None):
+        """
+        初期化
+
+        Args:
+            model: モデル名
+            max_tokens: 1回の応答の最大トークン数
+            api_key: APIキー（未指定の場合は環境変数 ANTHROPIC_API_KEY）
+        """
+        # LLM 統合はオプションなので使うときだけインポートする
+        import anthropic
+
+        self.client = anthropic.Anthropic(api_key=api_key)
+        self.model = model
+        self.max_tokens = max_tokens
+
+    def __call__(self, messages, tools, system=None) -> Dict[str, Any]:
+        kwargs = {'system': system} if system else {}
+        response = self.client.messages.create(
+            model=self.model,
+            max_tokens=self.max_tokens,
+            tools=tools,
+            messages=messages,
+            **kwargs
+        )
+        return {
+            'content': [block.model_dump(exclude_none=True) for block in response.content],
+            'stop_reason': response.stop_reason,
+        }
+
+
+def run_agent(
+    model: Callable[..., Dict[str, Any]],
+    session: ToolSession,
+    prompt: str,
+    system: Optional[str] = None,
+    max_turns: int = 10
+) -> Dict[str, Any]:
+    """
+    モデルがツールを呼ばなくなるまで対話を進める
+
+    Args:
+        model: model(messages, tools, system) -> {'content': [...], 'stop_reason'}
+        session: ツール実行セッション
+        prompt: 最初のユーザーメッセージ
+        system: システムプロンプト
+        max_turns: 最大ターン数
+
+    Returns:
+        {'text': 最終回答, 'turns': ターン数, 'messages': 対話履歴}
+    """
+    tools = session.registry.schemas()
+    messages = [{'role': 'user', 'content': prompt}]
+
+    for turn in range(1, max_turns + 1):
+        response = model(messages, tools, system)
+        messages.append({'role': 'assistant', 'content': response['content']})
+
+        tool_uses = [block for block in response['content'] if block['type'] == 'tool_use']
+        if not tool_uses:
+            text = ''.join(block['text'] for block in response['content'] if block['type'] == 'text')
+            return {'text': text, 'turns': turn, 'messages': messages}
+
+        messages.append({'role': 'user', 'content': session.execute(tool_uses)})
+
+    logger.warning("Agent reached max turns", max_turns=max_turns)
+    return {'text': None, 'turns': max_turns, 'messages': messages}
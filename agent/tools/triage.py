@@ -0,0 +1,229 @@
+"""
+障害トリアージツール
+複数インスタンス・複数メトリクスの相関と変化点の同時発生から原因候補を絞り込む
+"""
+
+import warnings
+from typing import List, Dict, Any, Tuple
+
+import numpy as np
+import structlog
+
+from .timeseries import align_series
+
+logger = structlog.get_logger()
+
+# 相関を「関連あり」とみなす最小値（絶対値）
+DEFAULT_MIN_CORRELATION = 0.6
+# 変化点とみなすスコア（前後ウィンドウの平均差 / 標準偏差）
+DEFAULT_CHANGE_THRESHOLD = 3.0
+
+
+def _fill_gaps(values: np.ndarray) -> np.ndarray:
+    """欠損を直前の値で埋め、先頭の欠損は系列平均で埋める"""
+    mask = np.isnan(values)
+    idx = np.where(~mask, np.arange(values.shape[1]), 0)
+    np.maximum.accumulate(idx, axis=1, out=idx)
+    filled = values[np.arange(values.shape[0])[:, None], idx]
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        means = np.nan_to_num(np.nanmean(values, axis=1))
+    return np.where(np.isnan(filled), means[:, None], filled)
+
+
+def _zscore(values: np.ndarray) -> np.ndarray:
+    """系列ごとに標準化（分散ゼロの系列はゼロ系列）"""
+    centered = values - values.mean(axis=1, keepdims=True)
+    std = centered.std(axis=1, keepdims=True)
+    return np.divide(centered, std, out=np.zeros_like(centered), where=std > 0)
+
+
+class TriageEngine:
+    """
+    相関・変化点による原因候補ランキング
+
+    全系列を共通グリッドの行列に揃え、ラグ付き相関は行列積、
+    変化点は累積和による移動平均差でまとめて計算する。
+    """
+
+    def __init__(
+        self,
+        step_seconds: int = 60,
+        max_lag: int = 10,
+        window: int = 5,
+        min_correlation: float = DEFAULT_MIN_CORRELATION,
+        change_threshold: float = DEFAULT_CHANGE_THRESHOLD
+    ):
+        """
+        初期化
+
+        Args:
+            step_seconds: 共通グリッドの間隔（秒）
+            max_lag: 相関を調べる最大ラグ（グリッド数）
+            window: 変化点検出の前後ウィンドウ幅（グリッド数）
+            min_correlation: 関連ありとみなす相関の絶対値
+            change_threshold: 変化点とみなすスコア
+        """
+        self.step_seconds = step_seconds
+        self.max_lag = max_lag
+        self.window = window
+        self.min_correlation = min_correlation
+        self.change_threshold = change_threshold
+
+    # ==================== 行列演算 ====================
+
+    def lagged_correlation(self, z: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        全ペアのラグ付き相関を計算
+
+        Args:
+            z: 標準化済みの [系列数 × 時間] 行列
+
+        Returns:
+            (相関の絶対値が最大となる相関値 [系列数 × 系列数],
+             そのときのラグ [系列数 × 系列数]、正なら行側の系列が先行)
+        """
+        n, length = z.shape
+        max_lag = min(self.max_lag, max(length - 2, 0))
+
+        best = z @ z.T / max(length, 1)
+        best_lag = np.zeros((n, n), dtype=int)
+
+        for lag in range(1, max_lag + 1):
+            # corr[i, j] = corr(x_i(t), x_j(t + lag)): i が j に lag だけ先行
+            corr = z[:, :-lag] @ z[:, lag:].T / (length - lag)
+            for candidate, sign in ((corr, 1), (corr.T, -1)):
+                better = np.abs(candidate) > np.abs(best)
+                best = np.where(better, candidate, best)
+                best_lag = np.where(better, sign * lag, best_lag)
+
+        return best, best_lag
+
+    def change_scores(self, values: np.ndarray) -> np.ndarray:
+        """
+        各時点の変化点スコア（前後ウィンドウの平均差 / 系列の標準偏差）
+
+        Args:
+            values: 欠損補完済みの [系列数 × 時間] 行列
+
+        Returns:
+            [系列数 × 時間] のスコア（計算できない端は 0）
+        """
+        n, length = values.shape
+        w = self.window
+        scores = np.zeros((n, length))
+        if length < 2 * w:
+            return scores
+
+        cumsum = np.concatenate([np.zeros((n, 1)), np.cumsum(values, axis=1)], axis=1)
+        # t は後ろ側ウィンドウの開始位置
+        t = np.arange(w, length - w + 1)
+        before = (cumsum[:, t] - cumsum[:, t - w]) / w
+        after = (cumsum[:, t + w] - cumsum[:, t]) / w
+
+        # ばらつきの基準は一次差分の中央値（変化そのものに引っ張られにくい）
+        noise = np.median(np.abs(np.diff(values, axis=1)), axis=1, keepdims=True) * 1.4826
+        noise = np.maximum(noise, values.std(axis=1, keepdims=True) * 0.1)
+        noise = np.where(noise > 0, noise, 1.0)
+
+        scores[:, t] = np.abs(after - before) / noise
+        return scores
+
+    # ==================== 解析 ====================
+
+    def analyze(self, series: Dict[str, Dict[str, List[Dict[str, Any]]]], top: int = 5) -> Dict[str, Any]:
+        """
+        原因候補をランキング
+
+        Args:
+            series: インスタンス名 → {メトリクス名 → データポイントリスト}
+                （インスタンス名・メトリクス名は任意の文字列で、「プロジェクトID/インスタンス名」なども可）
+            top: 各候補に付ける関連系列の数
+
+        Returns:
+            ranking（候補インスタンスの降順リスト）と series_count / grid_points
+        """
+        # 系列名は表示用。インスタンスとメトリクスは名前を分解せずに対応表から引く
+        keys = {
+            f"{instance}/{metric}": (instance, metric)
+            for instance, metrics in series.items()
+            for metric, points in metrics.items()
+            if points
+        }
+        names, grid, values = align_series(
+            {name: series[instance][metric] for name, (instance, metric) in keys.items()},
+            self.step_seconds
+        )
+        if not names or values.shape[1] < 2:
+            return {'ranking': [], 'series_count': len(names), 'grid_points': len(grid)}
+
+        instances = np.array([keys[name][0] for name in names], dtype=object)
+        values = _fill_gaps(values)
+        z = _zscore(values)
+        n, length = z.shape
+
+        # ラグ付き相関（同一インスタンス内のペアは除外）
+        corr, lag = self.lagged_correlation(z)
+        other = instances[:, None] != instances[None, :]
+        related = (np.abs(corr) >= self.min_correlation) & other
+
+        # 変化点と、その同時発生（±max_lag 以内）
+        scores = self.change_scores(values)
+        changes = scores >= self.change_threshold
+        has_change = changes.any(axis=1)
+        first_change = np.where(has_change, np.argmax(changes, axis=1), length)
+        magnitude = scores.max(axis=1)
+
+        cumulative = np.concatenate([np.zeros((n, 1)), np.cumsum(changes, axis=1)], axis=1)
+        t = np.arange(length)
+        upper = np.minimum(t + self.max_lag + 1, length)
+        lower = np.maximum(t - self.max_lag, 0)
+        near = (cumulative[:, upper] - cumulative[:, lower]) > 0
+        cooccur = (changes.astype(float) @ near.T.astype(float)) > 0
+        cooccur &= other
+
+        # 先行度: 関連系列のうち自分が先行している割合
+        leads = (related & (lag > 0)).sum(axis=1)
+        led = (related & (lag < 0)).sum(axis=1)
+        earlier = (cooccur & (first_change[:, None] < first_change[None, :])).sum(axis=1)
+        later = (cooccur & (first_change[:, None] > first_change[None, :])).sum(axis=1)
+
+        breadth = (related | cooccur).sum(axis=1) / max(n - 1, 1)
+        precedence = (leads + earlier + 1) / (leads + led + earlier + later + 2)
+        series_score = np.log1p(magnitude) * (1 + breadth) * precedence * 2 * has_change
+
+        ranking = []
+        for instance in np.unique(instances):
+            rows = np.flatnonzero(instances == instance)
+            row = rows[np.argmax(series_score[rows])]
+            if series_score[row] <= 0:
+                continue
+
+            partners = np.flatnonzero(related[row] | cooccur[row])
+            partners = partners[np.argsort(-np.abs(corr[row, partners]))][:top]
+
+            ranking.append({
+                'instance': instance,
+                'score': round(float(series_score[row]), 3),
+                'metric': keys[names[row]][1],
+                'change_magnitude': round(float(magnitude[row]), 2),
+                'first_change': (
+                    float(grid[first_change[row]]) if has_change[row] else None
+                ),
+                'changed_metrics': int(has_change[rows].sum()),
+                'related_instances': len({instances[p] for p in partners}),
+                'related': [
+                    {
+                        'series': names[p],
+                        'correlation': round(float(corr[row, p]), 3),
+                        'lag_seconds': int(lag[row, p]) * self.step_seconds,
+                        'cooccurring_change': bool(cooccur[row, p]),
+                    }
+                    for p in partners
+                ],
+            })
+
+        ranking.sort(key=lambda item: item['score'], reverse=True)
+        logger.info("Triage analysis completed", series=n, points=length, candidates=len(ranking))
+        return {'ranking': ranking, 'series_count': n, 'grid_points': length}
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Ansible 動的インベントリ（エージェントのインベントリ・スナップショットを使用）
+inventory/gcp.yml と同じグループ・ホスト変数を、キャッシュから返す
+
+使い方:
+    ansible-playbook -i agent_inventory.py playbooks/deploy-wordpress.yml
+    ./agent_inventory.py --list --refresh    # 期限にかかわらず取得し直す
+
+環境変数:
+    AGENT_INVENTORY_TTL      キャッシュの有効期間（秒、既定 300）
+    AGENT_INVENTORY_REFRESH  1 の場合は取得し直す（ansible から呼ばれるとき用）
+    AGENT_INVENTORY_SNAPSHOT スナップショットの保存先（既定 .inventory/snapshot.json）
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# プロジェクトルートをPythonパスに追加
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+
+def cached_output(output_path: Path, snapshot_path: Path, ttl: float):
+    """
+    期限内で、スナップショットより新しい出力があれば返す
+
+    agent パッケージ（Google Cloud のクライアント）を読み込まずに返せるので、
+    キャッシュが有効な間は ansible-playbook がすぐに始まる。
+    """
+    try:
+        mtime = output_path.stat().st_mtime
+    except FileNotFoundError:
+        return None
+    if time.time() - mtime >= ttl:
+        return None
+    if snapshot_path.exists() and snapshot_path.stat().st_mtime > mtime:
+        return None
+    return output_path.read_text()
+
+
+def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--list', action='store_true', help='全ホストを出力')
+    parser.add_argument('--host', help='ホスト変数を出力')
+    parser.add_argument('--refresh', action='store_true', help='キャッシュを使わずに取得し直す')
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    load_dotenv(project_root / '.env')
+
+    ttl = float(os.getenv('AGENT_INVENTORY_TTL', '300'))
+    refresh = args.refresh or os.getenv('AGENT_INVENTORY_REFRESH') == '1'
+    snapshot_path = Path(os.getenv('AGENT_INVENTORY_SNAPSHOT', project_root / '.inventory' / 'snapshot.json'))
+    output_path = snapshot_path.with_name('ansible.json')
+
+    text = None if refresh else cached_output(output_path, snapshot_path, ttl)
+    if text is None:
+        import structlog
+        from agent.tools.ansible_inventory import AnsibleInventoryCache
+
+        # ログは標準エラーへ（標準出力は Ansible が読む）
+        structlog.configure(logger_factory=structlog.PrintLoggerFactory(sys.stderr))
+
+        result = AnsibleInventoryCache(snapshot_path=str(snapshot_path), ttl=ttl).get(refresh)
+        text = json.dumps(result, ensure_ascii=False)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        # ansible-playbook が並行して呼ぶこともあるので一時ファイル名は毎回変える
+        fd, tmp = tempfile.mkstemp(dir=output_path.parent, prefix=output_path.name + '.', suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+        os.replace(tmp, output_path)
+
+    if args.host:
+        # _meta.hostvars を返しているので通常は呼ばれない
+        print(json.dumps(json.loads(text)['_meta']['hostvars'].get(args.host, {}), ensure_ascii=False))
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+ログ解析ベンチマーク
+合成した Nginx アクセスログで LogAnalyzer のコア数に対するスケーリングを計測
+"""
+
+import argparse
+import gzip
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# プロジェクトルートをPythonパスに追加
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from agent.tools.log_analysis import LogAnalyzer
+
+PATHS = ['/', '/wp-login.php', '/wp-admin/admin-ajax.php', '/feed/', '/xmlrpc.php'] + [
+    f'/{year}/{month:02d}/post-{n}/' for year in (2024, 2025) for month in range(1, 13) for n in range(20)
+]
+STATUSES = ['200'] * 90 + ['301', '302', '304', '404', '404', '499', '500', '502', '503', '403']
+
+
+def generate_lines(count: int, seed: int = 0):
+    """合成ログ行を生成"""
+    rng = random.Random(seed)
+    for i in range(count):
+        client = f"10.0.{rng.randrange(4)}.{rng.randrange(256)}"
+        hour = (i * 24) // count
+        yield (
+            f'{client} - - [10/Oct/2025:{hour:02d}:{rng.randrange(60):02d}:{rng.randrange(60):02d} +0900] '
+            f'"GET {rng.choice(PATHS)}?p={rng.randrange(100)} HTTP/1.1" {rng.choice(STATUSES)} {rng.randrange(200, 60000)} '
+            f'"-" "Mozilla/5.0 (X11; Linux x86_64)" {rng.expovariate(8):.3f}\n'
+        )
+
+
+def write_files(directory: Path, lines: int, files: int, compress: bool):
+    """合成ログファイルを書き出す"""
+    paths = []
+    for n in range(files):
+        path = directory / (f'access-{n}.log.gz' if compress else f'access-{n}.log')
+        opener = gzip.open if compress else open
+        with opener(path, 'wt') as f:
+            f.writelines(generate_lines(lines // files, seed=n))
+        paths.append(str(path))
+    return paths
+
+
+def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--lines', type=int, default=2_000_000, help='合計行数')
+    parser.add_argument('--files', type=int, default=8, help='ファイル数')
+    parser.add_argument('--gzip', action='store_true', help='gzip 圧縮したファイルで計測')
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1, help='最大ワーカー数')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"合成ログを生成中... ({args.lines:,}行, {args.files}ファイル)")
+        paths = write_files(Path(tmp), args.lines, args.files, args.gzip)
+        size = sum(os.path.getsize(p) for p in paths)
+        print(f"合計サイズ: {size / 1024 / 1024:.1f} MiB\n")
+
+        workers = 1
+        baseline = None
+        print(f"{'workers':>8} {'秒':>8} {'行/秒':>12} {'スケール':>8}")
+        while workers <= args.max_workers:
+            start = time.perf_counter()
+            result = LogAnalyzer(workers=workers).analyze(paths)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(f"{workers:>8} {elapsed:>8.2f} {result.lines / elapsed:>12,.0f} {baseline / elapsed:>7.2f}x")
+            workers *= 2
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 """
 GCP接続テストスクリプト
-Google Cloud Platform への接続と基本的なAPI操作を確認
+Google Cloud Platform への認証と各 API（Resource Manager / Compute / Monitoring / Storage / Logging）
+への接続を並列に確認
 """
 
+import argparse
+import json
 import os
 import sys
 from pathlib import Path
@@ -12,20 +15,15 @@ from pathlib import Path
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
+import structlog
 from dotenv import load_dotenv
-from google.cloud import compute_v1
-from google.cloud import resourcemanager_v3
-from google.auth import default
-from google.auth.exceptions import DefaultCredentialsError
 
-# 環境変数の読み込み
+from agent.tools.preflight import Preflight, CHECKS
+
 env_path = project_root / '.env'
-if env_path.exists():
-    load_dotenv(env_path)
-else:
-    print("⚠️  .env ファイルが見つかりません")
-    print("env.example を .env にコピーして設定してください")
-    sys.exit(1)
+
+# ログは標準エラーへ（--json の出力に混ぜない）
+structlog.configure(logger_factory=structlog.PrintLoggerFactory(sys.stderr))
 
 
 class Colors:
@@ -57,160 +55,88 @@ def print_warning(message):
     print(f"{Colors.YELLOW}⚠{Colors.NC} {message}")
 
 
-def test_authentication():
-    """認証テスト"""
-    print("\n" + "="*50)
-    print("📋 認証テスト")
-    print("="*50)
-    
-    try:
-        credentials, project = default()
-        print_success(f"認証成功")
-        print_info(f"プロジェクト: {project}")
-        print_info(f"認証タイプ: {type(credentials).__name__}")
-        return credentials, project
-    except DefaultCredentialsError as e:
-        print_error("認証失敗")
-        print_error(str(e))
-        print_warning("以下のいずれかを実行してください:")
-        print("  1. gcloud auth application-default login")
-        print("  2. GOOGLE_APPLICATION_CREDENTIALS 環境変数を設定")
-        return None, None
-
-
-def test_project_access(project_id):
-    """プロジェクトアクセステスト"""
-    print("\n" + "="*50)
-    print("🔐 プロジェクトアクセステスト")
-    print("="*50)
-    
-    try:
-        client = resourcemanager_v3.ProjectsClient()
-        project_name = f"projects/{project_id}"
-        project = client.get_project(name=project_name)
-        
-        print_success(f"プロジェクトアクセス成功")
-        print_info(f"プロジェクトID: {project.project_id}")
-        print_info(f"プロジェクト名: {project.display_name}")
-        print_info(f"状態: {project.state.name}")
-        return True
-    except Exception as e:
-        print_error(f"プロジェクトアクセス失敗: {e}")
-        return False
-
-
-def test_compute_api(project_id):
-    """Compute Engine API テスト"""
-    print("\n" + "="*50)
-    print("💻 Compute Engine API テスト")
-    print("="*50)
-    
-    try:
-        client = compute_v1.InstancesClient()
-        zone = os.getenv('GCP_ZONE', 'asia-northeast1-a')
-        
-        print_info(f"ゾーン {zone} のインスタンス一覧を取得中...")
-        
-        request = compute_v1.ListInstancesRequest(
-            project=project_id,
-            zone=zone,
-        )
-        
-        instances = list(client.list(request=request))
-        
-        print_success(f"Compute Engine API 呼び出し成功")
-        print_info(f"インスタンス数: {len(instances)}")
-        
-        if instances:
-            print("\n📍 インスタンス一覧:")
-            for instance in instances:
-                status_color = Colors.GREEN if instance.status == "RUNNING" else Colors.YELLOW
-                print(f"  • {instance.name}: {status_color}{instance.status}{Colors.NC}")
-        else:
-            print_info("インスタンスは存在しません")
-        
-        return True
-    except Exception as e:
-        print_error(f"Compute Engine API 呼び出し失敗: {e}")
-        print_warning("Compute Engine API が有効化されていない可能性があります")
-        print_info("有効化コマンド: gcloud services enable compute.googleapis.com")
-        return False
-
-
-def test_zones_list(project_id):
-    """ゾーン一覧取得テスト"""
-    print("\n" + "="*50)
-    print("🌏 利用可能なゾーン")
-    print("="*50)
-    
-    try:
-        client = compute_v1.ZonesClient()
-        region = os.getenv('GCP_REGION', 'asia-northeast1')
-        
-        request = compute_v1.ListZonesRequest(
-            project=project_id,
-        )
-        
-        zones = list(client.list(request=request))
-        asia_zones = [z for z in zones if z.region.endswith(region)]
-        
-        if asia_zones:
-            print_success(f"{region} リージョンのゾーン:")
-            for zone in asia_zones:
-                status_icon = "🟢" if zone.status == "UP" else "🔴"
-                print(f"  {status_icon} {zone.name}")
-        else:
-            print_info(f"{region} リージョンのゾーンが見つかりません")
-        
-        return True
-    except Exception as e:
-        print_error(f"ゾーン一覧取得失敗: {e}")
-        return False
+ICONS = {'ok': '✓', 'error': '✗', 'timeout': '⏱', 'skipped': '-'}
+
+LABELS = {
+    'auth': '認証',
+    'project': 'プロジェクトアクセス',
+    'compute': 'Compute Engine API',
+    'zone': 'ゾーン',
+    'monitoring': 'Cloud Monitoring API',
+    'storage': 'Cloud Storage API',
+    'logging': 'Cloud Logging API',
+}
+
+
+def print_check(check):
+    """チェック結果を1行で表示"""
+    color = Colors.GREEN if check['ok'] else (Colors.YELLOW if check['status'] == 'skipped' else Colors.RED)
+    latency = f"{check['latency_ms']:.0f}ms" if check['latency_ms'] is not None else '-'
+    print(f"{color}{ICONS[check['status']]}{Colors.NC} {LABELS.get(check['name'], check['name']):<22} {latency:>8}")
+    if check.get('detail'):
+        print(f"    {', '.join(f'{k}={v}' for k, v in check['detail'].items())}")
+    if check.get('error'):
+        print(f"    {check['error']}")
+    if check.get('hint'):
+        print_warning(f"  {check['hint']}")
 
 
 def main():
     """メイン処理"""
-    print("\n" + "="*50)
-    print("🚀 Infra AI Agent - GCP接続テスト")
-    print("="*50)
-    
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--timeout', type=float, default=10.0, help='チェックごとの期限（秒）')
+    parser.add_argument('--check', action='append', choices=sorted(CHECKS), help='実行するチェック（複数指定可）')
+    parser.add_argument('--json', action='store_true', help='結果をJSONで出力')
+    args = parser.parse_args()
+
+    # 環境変数の読み込み（.env が無ければ環境変数だけを使う）
+    if env_path.exists():
+        load_dotenv(env_path)
+    elif not args.json:
+        print_warning(".env ファイルが見つかりません（環境変数の設定を使います）")
+        print_info(".env.example を .env にコピーして設定できます")
+
     # 環境変数の確認
     project_id = os.getenv('GCP_PROJECT_ID')
     if not project_id:
-        print_error("GCP_PROJECT_ID が設定されていません")
-        print_info(".env ファイルを確認してください")
-        sys.exit(1)
-    
-    print_info(f"テスト対象プロジェクト: {project_id}")
-    
-    # テスト実行
-    results = []
-    
-    # 1. 認証テスト
-    credentials, detected_project = test_authentication()
-    if credentials is None:
-        print_error("\n❌ 認証に失敗しました。セットアップを確認してください。")
-        sys.exit(1)
-    results.append(True)
-    
-    # 2. プロジェクトアクセステスト
-    results.append(test_project_access(project_id))
-    
-    # 3. Compute Engine APIテスト
-    results.append(test_compute_api(project_id))
-    
-    # 4. ゾーン一覧テスト
-    results.append(test_zones_list(project_id))
-    
+        message = "GCP_PROJECT_ID が設定されていません"
+        if args.json:
+            print(json.dumps({'project_id': None, 'ok': False, 'error': message, 'checks': []}, ensure_ascii=False, indent=2))
+        else:
+            print_error(message)
+            print_info(".env ファイルまたは環境変数を確認してください")
+        return 1
+
+    preflight = Preflight(
+        project_id,
+        zone=os.getenv('GCP_ZONE', 'asia-northeast1-a'),
+        timeout=args.timeout,
+        checks=args.check,
+    )
+    report = preflight.run()
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 0 if report['ok'] else 1
+
+    print("\n" + "="*50)
+    print("🚀 Infra AI Agent - GCP接続テスト")
+    print("="*50)
+    print_info(f"テスト対象プロジェクト: {project_id}\n")
+
+    for check in report['checks']:
+        print_check(check)
+
     # 結果サマリー
     print("\n" + "="*50)
     print("📊 テスト結果サマリー")
     print("="*50)
-    
-    success_count = sum(results)
-    total_count = len(results)
-    
-    if success_count == total_count:
+
+    success_count = sum(check['ok'] for check in report['checks'])
+    total_count = len(report['checks'])
+    print_info(f"所要時間: {report['elapsed_ms']:.0f}ms")
+
+    if report['ok']:
         print_success(f"すべてのテストが成功しました ({success_count}/{total_count})")
         print("\n✨ GCP接続が正常に確認できました！")
         print("\n次のステップ:")
@@ -82,7 +82,9 @@ module "loadbalancer" {
 module "monitoring" {
   source = "../../modules/monitoring"
 
-  env = var.env
+  project_id = var.project_id
+  env        = var.env
+  domains    = var.domains
 
   depends_on = [module.loadbalancer]
 }
@@ -57,6 +57,30 @@ resource "google_monitoring_alert_policy" "health_check_failure" {
   enabled = true
 }
 
+# サイトごとの稼働監視（SLO の可用性 SLI、agent slo で集計）
+resource "google_monitoring_uptime_check_config" "site" {
+  for_each = toset(var.domains)
+
+  display_name = "${var.env}-uptime-${each.value}"
+  timeout      = "10s"
+  period       = "60s"
+
+  http_check {
+    path         = "/"
+    port         = 443
+    use_ssl      = true
+    validate_ssl = true
+  }
+
+  monitored_resource {
+    type = "uptime_url"
+    labels = {
+      project_id = var.project_id
+      host       = each.value
+    }
+  }
+}
+
 # ログシンク（Cloud Logging → Cloud Storage - オプション）
 # Phase 2で実装: ログ用のGCS bucketを作成してから有効化
 # resource "google_logging_project_sink" "wordpress_logs" {
@@ -8,6 +8,11 @@ output "health_check_failure_alert_id" {
   value       = google_monitoring_alert_policy.health_check_failure.id
 }
 
+output "uptime_check_ids" {
+  description = "Uptime check IDs by domain"
+  value       = { for domain, check in google_monitoring_uptime_check_config.site : domain => check.uptime_check_id }
+}
+
 # Phase 2で実装
 # output "log_sink_writer_identity" {
 #   description = "Log sink writer identity (for IAM binding)"
@@ -3,6 +3,17 @@ variable "env" {
   type        = string
 }
 
+variable "project_id" {
+  description = "GCP project ID (uptime check target)"
+  type        = string
+}
+
+variable "domains" {
+  description = "Domains to monitor with uptime checks (per-site availability SLI)"
+  type        = list(string)
+  default     = []
+}
+
 variable "log_bucket_name" {
   description = "Cloud Storage bucket name for logs"
   type        = string
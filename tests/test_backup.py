@@ -0,0 +1,156 @@
+"""BackupTools のマニフェスト照合・範囲読み込みによる内容検証・サイトごとの鮮度確認（偽の GCS で検証）"""
+
+import base64
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+
+import google_crc32c
+import pytest
+
+from agent.tools.backup import BackupTools
+
+NOW = datetime(2026, 1, 10, 5, 0, tzinfo=timezone.utc)
+
+
+def _b64(digest):
+    return base64.b64encode(digest).decode('ascii')
+
+
+class FakeBlob:
+    def __init__(self, name, data, updated=NOW, crc32c=None, md5_hash=None):
+        self.name = name
+        self.data = data
+        self.size = len(data)
+        self.updated = updated
+        self.generation = 1
+        self.crc32c = crc32c or _b64(google_crc32c.Checksum(data).digest())
+        self.md5_hash = md5_hash or _b64(hashlib.md5(data).digest())
+        self.ranges = []
+
+    def download_as_bytes(self, client=None, start=None, end=None, raw_download=False, checksum='md5'):
+        assert raw_download and checksum is None
+        self.ranges.append((start, end))
+        return self.data[start:end + 1]
+
+
+class FakeBucket:
+    def __init__(self, blobs):
+        self.blobs = blobs
+
+    def get_blob(self, name):
+        return self.blobs.get(name)
+
+
+class FakeClient:
+    def __init__(self, blobs):
+        self.blobs = {blob.name: blob for blob in blobs}
+
+    def list_blobs(self, bucket_name, prefix=None, fields=None):
+        return [blob for name, blob in sorted(self.blobs.items()) if name.startswith(prefix or '')]
+
+    def bucket(self, bucket_name):
+        return FakeBucket(self.blobs)
+
+
+def make_tools(*blobs):
+    tools = BackupTools.__new__(BackupTools)
+    tools.project_id = 'proj'
+    tools.client = FakeClient(blobs)
+    return tools
+
+
+@pytest.fixture
+def backup_dir(tmp_path):
+    root = tmp_path / 'backup'
+    (root / 'db').mkdir(parents=True)
+    (root / 'db' / 'dump.sql').write_bytes(b'INSERT INTO wp_posts VALUES (1);\n' * 1000)
+    (root / 'uploads.tar').write_bytes(bytes(range(256)) * 40)
+    return root
+
+
+def test_manifest_roundtrip_and_differences(tmp_path, backup_dir):
+    manifest = BackupTools.build_local_manifest(str(backup_dir), prefix='files/', chunk_size=1000)
+    assert sorted(manifest) == ['files/db/dump.sql', 'files/uploads.tar']
+
+    dump = (backup_dir / 'db' / 'dump.sql').read_bytes()
+    tools = make_tools(
+        FakeBlob('files/db/dump.sql', dump[:-1] + b'X'),
+        FakeBlob('files/extra.log', b'x'),
+    )
+    path = tmp_path / 'manifest.json'
+    assert tools.record_manifest('bucket', str(path), prefix='files/') == 2
+    assert json.loads(path.read_text())['bucket'] == 'bucket'
+    assert BackupTools.load_manifest(str(path))['files/extra.log']['size'] == 1
+
+    result = tools.verify_manifest('bucket', manifest, prefix='files/')
+    assert result['ok'] == []
+    assert result['missing'] == ['files/uploads.tar']
+    assert result['unexpected'] == ['files/extra.log']
+    # サイズは同じでもチェックサムで検出する
+    [mismatch] = result['mismatched']
+    assert mismatch['name'] == 'files/db/dump.sql' and set(mismatch['diffs']) == {'crc32c', 'md5_hash'}
+
+
+def test_composite_object_is_compared_without_md5(backup_dir):
+    manifest = BackupTools.build_local_manifest(str(backup_dir))
+    blobs = [FakeBlob(name, (backup_dir / name).read_bytes()) for name in manifest]
+    blobs[0].md5_hash = None
+    result = make_tools(*blobs).verify_manifest('bucket', manifest)
+    assert sorted(result['ok']) == sorted(manifest) and not result['mismatched']
+
+
+@pytest.mark.parametrize('size', [0, 1, 999, 1000, 10_001])
+def test_ranged_read_recomputes_checksums(size):
+    blob = FakeBlob('db.sql.gz', bytes(i % 251 for i in range(size)))
+    result = make_tools(blob).verify_content('bucket', 'db.sql.gz', chunk_size=1000, workers=3)
+    assert result['status'] == 'ok' and result['actual'] == result['expected']
+    # 重なり・抜けなく先頭から順に範囲を読む
+    assert sorted(blob.ranges) == [(s, min(s + 1000, size) - 1) for s in range(0, size, 1000)]
+
+
+def test_corrupted_and_missing_objects():
+    data = b'backup' * 1000
+    corrupted = FakeBlob('db.sql.gz', data, crc32c=_b64(google_crc32c.Checksum(data[:-1]).digest()))
+    tools = make_tools(corrupted)
+    result = tools.verify_content('bucket', 'db.sql.gz', chunk_size=512)
+    assert result['status'] == 'corrupted'
+    assert result['actual']['md5_hash'] == result['expected']['md5_hash']
+    assert result['actual']['crc32c'] != result['expected']['crc32c']
+
+    assert tools.verify_content('bucket', 'gone.sql.gz') == {'name': 'gone.sql.gz', 'status': 'missing'}
+
+
+def _daily(site, sizes, last_age_hours):
+    latest = NOW - timedelta(hours=last_age_hours)
+    return [
+        FakeBlob(f'files/{site}/{i:02d}.tar.gz', b'x' * size, updated=latest - timedelta(days=len(sizes) - 1 - i))
+        for i, size in enumerate(sizes)
+    ]
+
+
+def test_check_sites():
+    tools = make_tools(
+        *_daily('fresh', [1000] * 8, 2),
+        *_daily('stale', [1000] * 3, 30),
+        *_daily('shrunk', [1000, 1100, 900, 1000, 400], 2),
+        *_daily('small', [100, 100], 2),
+    )
+    schedule = {
+        'bucket': 'bucket',
+        'sites': [
+            {'name': name, 'prefix': f'files/{name}/'}
+            for name in ('fresh', 'stale', 'shrunk', 'missing')
+        ] + [{'name': 'small', 'prefix': 'files/small/', 'min_size_bytes': 500}],
+    }
+    reports = {r['site']: r for r in tools.check_sites(schedule, now=NOW)}
+
+    assert reports['fresh']['status'] == 'ok' and reports['fresh']['latest'] == 'files/fresh/07.tar.gz'
+    assert reports['stale']['status'] == 'stale' and reports['stale']['age_hours'] == 30.0
+    assert reports['shrunk']['status'] == 'size_anomaly'
+    assert reports['small']['status'] == 'size_anomaly'
+    assert reports['missing']['status'] == 'missing'
+
+    # サイトごとの上限で上書きできる
+    schedule['sites'][1]['max_age_hours'] = 48
+    assert tools.check_sites({**schedule, 'sites': [schedule['sites'][1]]}, now=NOW)[0]['status'] == 'ok'
@@ -0,0 +1,137 @@
+"""BaselineStore のスロット割り当て（タイムゾーン）・統計量の結合・重みの減衰・保存"""
+
+import json
+import struct
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pytest
+
+from agent.tools import baselines
+from agent.tools.baselines import BaselineStore, hour_of_week
+
+WEEK = 7 * 86400
+# 2026-01-05（月）00:00 JST
+MONDAY = datetime(2026, 1, 5, tzinfo=ZoneInfo('Asia/Tokyo')).timestamp()
+
+
+def _points(times, values):
+    return [{'timestamp': float(t), 'value': v} for t, v in zip(times, values)]
+
+
+def test_hour_of_week_in_timezone():
+    assert int(hour_of_week(MONDAY)) == 0
+    assert int(hour_of_week(MONDAY + 3600 * 30)) == 30
+    assert int(hour_of_week(MONDAY - 1)) == 167
+    # UTC では日曜 15 時
+    assert int(hour_of_week(MONDAY, 'UTC')) == 6 * 24 + 15
+
+
+def test_hour_of_week_follows_daylight_saving():
+    tz = ZoneInfo('America/New_York')
+    # 夏時間の前後とも、現地の月曜 9 時は同じスロット
+    winter = datetime(2026, 3, 2, 9, tzinfo=tz).timestamp()
+    summer = datetime(2026, 3, 9, 9, tzinfo=tz).timestamp()
+    assert summer - winter == WEEK - 3600
+    assert list(hour_of_week(np.array([winter, summer]), 'America/New_York')) == [9, 9]
+
+
+def test_updates_merge_like_a_single_pass():
+    rng = np.random.default_rng(0)
+    times = MONDAY + np.arange(0, 2 * WEEK, 600)
+    values = 50 + 10 * np.sin(times / 3600) + rng.normal(0, 2, times.size)
+
+    whole = BaselineStore(half_life_weeks=0)
+    whole.update({'cpu': _points(times, values)})
+    parts = BaselineStore(half_life_weeks=0)
+    half = times.size // 3
+    assert parts.update({'cpu': _points(times[:half], values[:half])}) == {'cpu': half}
+    # 重なった期間は二重に数えない
+    assert parts.update({'cpu': _points(times, values)}) == {'cpu': times.size - half}
+
+    np.testing.assert_allclose(parts.profile('cpu'), whole.profile('cpu'))
+    slots = hour_of_week(times)
+    for slot in (0, 50, 167):
+        selected = values[slots == slot]
+        count, mean, m2 = whole.profile('cpu')[slot]
+        assert (count, mean) == (selected.size, pytest.approx(selected.mean()))
+        assert m2 / count == pytest.approx(selected.var())
+
+
+def test_old_weights_decay_by_half_life():
+    store = BaselineStore(half_life_weeks=2)
+    store.update({'cpu': _points([MONDAY], [10.0])})
+    # 4週間後（半減期2回分）の同じスロット
+    store.update({'cpu': _points([MONDAY + 4 * WEEK], [30.0])})
+    count, mean, _ = store.profile('cpu')[0]
+    assert count == pytest.approx(1.25)
+    assert mean == pytest.approx((10 * 0.25 + 30) / 1.25)
+
+    expected = store.expected('cpu', MONDAY + 5 * WEEK + 60, sigma=2, min_std=0)
+    assert expected['mean'] == pytest.approx(mean)
+    assert expected['high'] - expected['low'] == pytest.approx(4 * expected['std'])
+    assert store.expected('cpu', MONDAY + 3600) is None and store.expected('disk', MONDAY) is None
+
+
+def test_detect_uses_slot_profile():
+    store = BaselineStore()
+    times = MONDAY + np.arange(0, 3 * WEEK, WEEK)
+    store.update({'cpu': _points(times, [20.0, 22.0, 21.0])})
+    recent = _points([MONDAY + 3 * WEEK, MONDAY + 3 * WEEK + 60, MONDAY + 3 * WEEK + 3600], [21.0, 90.0, 90.0])
+    anomalies = store.detect('cpu', recent)
+    # 学習していない 1時のスロットは判定しない
+    assert [a['value'] for a in anomalies] == [90.0]
+    assert anomalies[0]['severity'] == 'high' and anomalies[0]['expected'] == pytest.approx(21.0)
+
+
+def test_save_and_load_roundtrip(tmp_path, monkeypatch):
+    path = tmp_path / 'store' / 'metrics.bsl'
+    store = BaselineStore('America/New_York', path=str(path))
+    store.update({'cpu': _points([MONDAY], [10.0]), 'disk': _points([MONDAY + 60], [70.0])})
+    store.save()
+    # 一時ファイルは残さない
+    assert [p.name for p in path.parent.iterdir()] == ['metrics.bsl']
+
+    loaded = BaselineStore.open(str(path))
+    assert loaded.timezone == 'America/New_York' and len(loaded) == 2
+    assert isinstance(loaded.stats, np.memmap)
+    np.testing.assert_array_equal(loaded.profile('disk'), store.profile('disk'))
+    # 読み込んだストアも更新・保存できる
+    loaded.update({'cpu': _points([MONDAY + 3600], [12.0])})
+    loaded.save()
+    assert BaselineStore.load(str(path)).watermarks['cpu'] == MONDAY + 3600
+
+    with pytest.raises(ValueError):
+        BaselineStore.open(str(path), timezone='Asia/Tokyo')
+
+    # 書き込みに失敗しても既存のファイルと一時ファイルはそのまま
+    monkeypatch.setattr(baselines.os, 'replace', lambda *args: (_ for _ in ()).throw(OSError('disk full')))
+    with pytest.raises(OSError):
+        loaded.save()
+    assert [p.name for p in path.parent.iterdir()] == ['metrics.bsl']
+
+
+def test_legacy_file_with_utc_offset(tmp_path):
+    path = tmp_path / 'old.bsl'
+    store = BaselineStore(path=str(path))
+    store.update({'cpu': _points([MONDAY], [10.0])})
+    store.save()
+
+    # 時差だけを保存していた形式に書き換える
+    data = path.read_bytes()
+    (length,) = struct.unpack('<I', data[4:8])
+    header = json.loads(data[8:8 + length])
+    del header['timezone']
+    header['utc_offset_hours'] = 9.0
+    encoded = json.dumps(header).encode().ljust(length)
+    path.write_bytes(data[:4] + struct.pack('<I', length) + encoded + data[8 + length:])
+
+    loaded = BaselineStore.open(str(path))
+    assert loaded.timezone == 'Etc/GMT-9'
+    assert loaded.expected('cpu', MONDAY)['mean'] == 10.0
+
+
+def test_invalid_timezone():
+    with pytest.raises(ValueError):
+        BaselineStore('Mars/Olympus_Mons')
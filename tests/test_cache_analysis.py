@@ -0,0 +1,165 @@
+"""キャッシュログの解析・URL種別・差分読み込みとローテーション・ヒット率低下の検出"""
+
+import gzip
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from agent.tools.cache_analysis import CacheAggregate, CacheLogAnalyzer, classify_url
+
+JST = timezone(timedelta(hours=9))
+START = datetime(2026, 1, 1, 12, 0, tzinfo=JST)
+
+
+def _line(i, uri='/', cache='HIT', host='example1.com', upstream='0.010'):
+    when = (START + timedelta(seconds=i)).strftime('%d/%b/%Y:%H:%M:%S %z')
+    return (
+        f'203.0.113.1 - - [{when}] "GET {uri} HTTP/1.1" 200 512 "-" "Mozilla/5.0" '
+        f'0.{i % 1000:03d} {host} {cache} {upstream}\n'
+    )
+
+
+def _lines(start, stop, **kwargs):
+    return ''.join(_line(i, **kwargs) for i in range(start, stop))
+
+
+def _requests(aggregate):
+    return sum(sum(s.status.values()) for s in aggregate.groups.values())
+
+
+@pytest.mark.parametrize('uri, expected', [
+    (b'/wp-admin/post.php', 'admin'),
+    (b'/wp-login.php?redirect_to=x', 'login'),
+    (b'/wp-cron.php?doing_wp_cron', 'cron'),
+    (b'/wp-json/wp/v2/posts', 'api'),
+    (b'/?rest_route=/wp/v2/posts', 'api'),
+    (b'/xmlrpc.php', 'xmlrpc'),
+    (b'/?s=nginx', 'search'),
+    (b'/category/news/feed/', 'feed'),
+    (b'/wp-content/uploads/a.JPG?ver=1', 'static'),
+    (b'/?p=1&preview=true', 'preview'),
+    (b'/2026/01/hello-world/', 'page'),
+])
+def test_classify_url(uri, expected):
+    assert classify_url(uri) == expected
+
+
+def test_parse_lines_and_hit_ratio():
+    aggregate = CacheAggregate()
+    data = (
+        _line(0, cache='HIT') + _line(1, cache='MISS') + _line(2, cache='STALE')
+        + _line(3, cache='-', uri='/wp-admin/', upstream='0.100, 0.200')
+        + 'not an access log line\n'
+    )
+    last = aggregate.add_lines(data.encode())
+    assert last == int((START + timedelta(seconds=3)).timestamp())
+    assert (aggregate.lines, aggregate.unparsed) == (5, 1)
+
+    report = aggregate.report()['sites']['example1.com']
+    assert report['requests'] == 4
+    # キャッシュを通らなかったリクエスト（NONE）は分母に入れない
+    assert report['hit_ratio'] == pytest.approx(2 / 3)
+    admin = report['classes']['admin']
+    assert admin['status'] == {'NONE': 1} and admin['hit_ratio'] is None
+    assert admin['upstream_latency']['mean'] == pytest.approx(0.3)
+
+
+def test_merge_equals_single_pass():
+    data = _lines(0, 300) + _lines(300, 600, cache='MISS', uri='/?s=x')
+    whole = CacheAggregate()
+    whole.add_lines(data.encode())
+    parts = CacheAggregate()
+    for chunk in (_lines(0, 300), _lines(300, 600, cache='MISS', uri='/?s=x')):
+        part = CacheAggregate()
+        part.add_lines(chunk.encode())
+        parts.merge(part)
+    assert parts.report() == whole.report()
+    assert parts.hourly == whole.hourly
+
+
+def test_find_drops():
+    aggregate = CacheAggregate()
+    hour = int(START.timestamp())
+    aggregate.hourly = {
+        'example1.com': {hour: [900, 1000], hour + 3600: [950, 1000], hour + 7200: [500, 1000]},
+        'example2.com': {hour: [900, 1000], hour + 3600: [890, 1000]},
+        'quiet.com': {hour: [90, 100], hour + 3600: [1, 10]},
+    }
+    drops = aggregate.find_drops(threshold=0.1, min_requests=100)
+    assert [d['site'] for d in drops] == ['example1.com']
+    assert drops[0]['hit_ratio'] == 0.5 and drops[0]['baseline_ratio'] == 0.925
+
+
+def _analyze(state, *paths):
+    aggregate, history = CacheLogAnalyzer(str(state)).analyze([str(p) for p in paths if p.exists()])
+    return aggregate, history
+
+
+def test_incremental_reads_continue_across_rotation(tmp_path):
+    state = tmp_path / 'state.json'
+    log, log1 = tmp_path / 'access.log', tmp_path / 'access.log.1'
+
+    log.write_text(_lines(0, 10) + _line(10)[:30])
+    assert _requests(_analyze(state, log)[0]) == 10
+
+    # 書きかけだった行の続きと新しい行
+    with open(log, 'a') as f:
+        f.write(_line(10)[30:] + _lines(11, 15))
+    assert _requests(_analyze(state, log)[0]) == 5
+
+    # logrotate: access.log → access.log.1、新しい access.log
+    with open(log, 'a') as f:
+        f.write(_lines(15, 18))
+    os.rename(log, log1)
+    log.write_text(_lines(18, 20))
+    aggregate, history = _analyze(state, log, log1)
+    assert _requests(aggregate) == 5
+    assert sum(t for hours in history.hourly.values() for _, t in hours.values()) == 20
+
+
+def test_compressed_rotation_is_not_counted_twice(tmp_path):
+    state = tmp_path / 'state.json'
+    log, log1, log2 = tmp_path / 'access.log', tmp_path / 'access.log.1', tmp_path / 'access.log.2.gz'
+
+    log.write_text(_lines(0, 10))
+    _analyze(state, log)
+    os.rename(log, log1)
+    log.write_text(_lines(10, 20))
+    _analyze(state, log, log1)
+
+    # compress + delaycompress: access.log.1 → access.log.2.gz（inode が変わる）
+    with open(log1, 'rb') as src, gzip.open(log2, 'wb') as dst:
+        dst.write(src.read())
+    os.remove(log1)
+    os.rename(log, log1)
+    log.write_text(_lines(20, 25))
+    aggregate, history = _analyze(state, log, log1, log2)
+    assert _requests(aggregate) == 5
+    assert sum(t for hours in history.hourly.values() for _, t in hours.values()) == 25
+
+
+def test_compressed_rotation_keeps_unread_tail(tmp_path):
+    state = tmp_path / 'state.json'
+    log, log1 = tmp_path / 'access.log', tmp_path / 'access.log.1.gz'
+
+    log.write_text(_lines(0, 10))
+    _analyze(state, log)
+
+    # delaycompress なし: 前回より後に書かれた行ごと圧縮される
+    with open(log, 'a') as f:
+        f.write(_lines(10, 13))
+    with open(log, 'rb') as src, gzip.open(log1, 'wb') as dst:
+        dst.write(src.read())
+    os.remove(log)
+    log.write_text(_lines(13, 15))
+    assert _requests(_analyze(state, log, log1)[0]) == 5
+    # 次回は .gz を読み直さない
+    assert _requests(_analyze(state, log, log1)[0]) == 0
+
+
+def test_first_incremental_run_reads_compressed_history(tmp_path):
+    log1 = tmp_path / 'access.log.1.gz'
+    with gzip.open(log1, 'wb') as f:
+        f.write(_lines(0, 10).encode())
+    assert _requests(_analyze(tmp_path / 'state.json', log1)[0]) == 10
@@ -0,0 +1,93 @@
+"""時間グリッドへの整列と、CapacityForecaster の季節モデル・しきい値到達時間"""
+
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from agent.tools.forecasting import CapacityForecaster
+from agent.tools.timeseries import align_series, to_epoch
+
+T0 = 1_767_225_600  # 2026-01-01T00:00:00Z
+
+
+def test_to_epoch_accepts_iso_datetime_and_number():
+    expected = float(T0)
+    assert to_epoch('2026-01-01T00:00:00Z') == expected
+    assert to_epoch('2026-01-01T09:00:00+09:00') == expected
+    assert to_epoch(datetime(2026, 1, 1, tzinfo=timezone.utc)) == expected
+    assert to_epoch(T0) == expected
+
+
+def test_align_series_averages_bins_and_marks_gaps():
+    names, grid, matrix = align_series({
+        'b': [{'timestamp': T0 + 900, 'value': 4.0}],
+        'a': [
+            {'timestamp': T0 + 10, 'value': 1.0},
+            {'timestamp': T0 + 290, 'value': 3.0},
+            {'timestamp': '2026-01-01T00:10:00Z', 'value': 5.0},
+        ],
+    }, step_seconds=300)
+    assert names == ['a', 'b']
+    assert list(grid) == [T0, T0 + 300, T0 + 600, T0 + 900]
+    np.testing.assert_array_equal(matrix, [[2.0, np.nan, 5.0, np.nan], [np.nan, np.nan, np.nan, 4.0]])
+
+
+def test_align_series_without_points():
+    assert align_series({})[0] == []
+    names, grid, matrix = align_series({'a': []})
+    assert names == ['a'] and grid.size == 0 and matrix.shape == (1, 0)
+
+
+def _seasonal(t):
+    return 50 + 0.05 * t + 10 * np.sin(2 * np.pi * t / 24)
+
+
+def test_seasonal_fit_recovers_known_series():
+    t = np.arange(24 * 12)
+    rng = np.random.default_rng(0)
+    values = np.vstack([_seasonal(t) + rng.normal(0, 0.5, t.size), 20 + 0 * t])
+    # 欠損があっても当てはめられる
+    values[0, 100:104] = np.nan
+
+    forecaster = CapacityForecaster(step_seconds=3600, season_length=24).fit(values)
+    future = np.arange(t.size, t.size + 24)
+    forecast = forecaster.forecast(24)
+
+    np.testing.assert_allclose(forecast['mean'][0], _seasonal(future), atol=1.5)
+    np.testing.assert_allclose(forecast['mean'][1], 20, atol=1e-6)
+    assert forecaster.trend[0] == pytest.approx(0.05, abs=0.02)
+    assert np.all(forecast['lower'] <= forecast['mean']) and np.all(forecast['mean'] <= forecast['upper'])
+    # 予測区間は先ほど広がる
+    width = forecast['upper'][0] - forecast['lower'][0]
+    assert width[-1] > width[0]
+
+
+def test_update_continues_without_refit():
+    t = np.arange(24 * 12)
+    forecaster = CapacityForecaster(step_seconds=3600, season_length=24).fit(_seasonal(t)[None, :])
+    forecaster.update(_seasonal(np.arange(t.size, t.size + 6))[None, :])
+    assert forecaster.steps == t.size + 6
+    future = np.arange(t.size + 6, t.size + 30)
+    np.testing.assert_allclose(forecaster.forecast(24)['mean'][0], _seasonal(future), atol=1.5)
+
+    with pytest.raises(RuntimeError):
+        CapacityForecaster().update(np.zeros(1))
+
+
+def test_time_to_threshold():
+    # 5分ごとに 0.5 ずつ増える系列（1時間で 6）と、横ばいの系列
+    t = np.arange(120)
+    values = np.vstack([20 + 0.5 * t, 30 + 0 * t])
+    forecaster = CapacityForecaster(step_seconds=300).fit(values)
+    ttt = forecaster.time_to_threshold(np.array([79.5 + 6 * 4, 90.0]), horizon=12 * 24)
+
+    # 最後の値 79.5 から 4時間で +24 → 103.5（初期レベルのずれが残る分、数ステップの誤差は許す）
+    assert ttt['expected'][0] == pytest.approx(4.0, abs=0.25)
+    assert ttt['earliest'][0] <= ttt['expected'][0] <= ttt['latest'][0]
+    assert np.isnan(ttt['expected'][1])
+
+    report = forecaster.report(['disk', 'flat'], [103.5, 90.0], horizon=12 * 24)
+    assert report['disk']['trend_per_hour'] == pytest.approx(6.0, abs=0.2)
+    assert report['disk']['expected_hours'] == pytest.approx(4.0, abs=0.25)
+    assert report['flat']['expected_hours'] is None
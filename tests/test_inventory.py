@@ -0,0 +1,152 @@
+"""Inventory の差分更新と一括取得の順序、Ansible インベントリのグループ"""
+
+import threading
+
+import pytest
+
+from agent.tools import ansible_inventory
+from agent.tools.ansible_inventory import AnsibleInventoryCache, build_ansible_inventory
+from agent.tools.inventory import Inventory
+from agent.tools.timeseries import to_epoch
+
+INSTANCE = 'compute.googleapis.com/Instance'
+
+
+def _asset(name, status, update_time, zone='asia-northeast1-a', labels=None):
+    return {
+        'name': f"//compute.googleapis.com/projects/p/zones/{zone}/instances/{name}",
+        'assetType': INSTANCE,
+        'updateTime': update_time,
+        'resource': {'data': {
+            'name': name,
+            'zone': f"projects/p/zones/{zone}",
+            'status': status,
+            'labels': labels or {},
+        }},
+    }
+
+
+def _change(asset, deleted=False):
+    return {'asset': asset, 'deleted': deleted, 'window': {'startTime': asset['updateTime']}}
+
+
+def test_stale_feed_update_is_ignored():
+    inventory = Inventory()
+    assert inventory.apply_change(_change(_asset('web-1', 'RUNNING', '2026-01-01T00:10:00Z')))
+    assert not inventory.apply_change(_change(_asset('web-1', 'TERMINATED', '2026-01-01T00:05:00Z')))
+    assert inventory.instances(name='web-1')[0]['status'] == 'RUNNING'
+
+
+def test_index_follows_updates():
+    inventory = Inventory()
+    inventory.apply_change(_change(_asset('web-1', 'RUNNING', '2026-01-01T00:00:00Z', labels={'service': 'wordpress'})))
+    inventory.apply_change(_change(_asset('web-1', 'TERMINATED', '2026-01-01T00:01:00Z')))
+    assert inventory.instances(status='RUNNING') == []
+    assert inventory.instances(labels={'service': 'wordpress'}) == []
+    assert [r['name'] for r in inventory.instances(status='TERMINATED')] == ['web-1']
+
+
+def test_resync_keeps_asset_update_time():
+    inventory = Inventory()
+    inventory.resync([_asset('web-1', 'RUNNING', '2026-01-01T00:00:00Z')], as_of=to_epoch('2026-01-01T01:00:00Z'))
+    assert inventory.records[next(iter(inventory.records))]['updated'] == to_epoch('2026-01-01T00:00:00Z')
+
+    # 一括取得より後に届いたフィードの更新（一覧取得時刻より前の変更）も反映される
+    assert inventory.apply_change(_change(_asset('web-1', 'TERMINATED', '2026-01-01T00:30:00Z')))
+    assert inventory.instances(name='web-1')[0]['status'] == 'TERMINATED'
+
+
+def test_lagging_resync_does_not_revert_feed_update():
+    inventory = Inventory()
+    inventory.apply_change(_change(_asset('web-1', 'TERMINATED', '2026-01-01T00:30:00Z')))
+    # 一覧が古い状態を返しても上書きしない
+    counts = inventory.resync([_asset('web-1', 'RUNNING', '2026-01-01T00:00:00Z')], as_of=to_epoch('2026-01-01T01:00:00Z'))
+    assert counts == {'upserted': 0, 'removed': 0}
+    assert inventory.instances(name='web-1')[0]['status'] == 'TERMINATED'
+
+
+def test_resync_removes_missing_and_keeps_newer():
+    inventory = Inventory()
+    inventory.apply_change(_change(_asset('old', 'RUNNING', '2026-01-01T00:00:00Z')))
+    inventory.apply_change(_change(_asset('new', 'RUNNING', '2026-01-01T02:00:00Z')))
+    counts = inventory.resync([], as_of=to_epoch('2026-01-01T01:00:00Z'))
+    assert counts['removed'] == 1
+    assert [r['name'] for r in inventory.instances()] == ['new']
+    # 削除より古い更新では復活しない
+    assert not inventory.apply_change(_change(_asset('old', 'RUNNING', '2026-01-01T00:30:00Z')))
+
+
+def test_deleted_asset_not_revived_by_lagging_listing():
+    inventory = Inventory()
+    asset = _asset('web-1', 'RUNNING', '2026-01-01T00:00:00Z')
+    inventory.apply_change(_change(asset))
+    inventory.apply_change(_change(_asset('web-1', 'RUNNING', '2026-01-01T00:20:00Z'), deleted=True))
+    inventory.resync([asset], as_of=to_epoch('2026-01-01T01:00:00Z'))
+    assert inventory.instances() == []
+    inventory.resync([asset], as_of=to_epoch('2026-01-01T02:00:00Z'))
+    assert inventory.instances() == []
+
+
+def test_snapshot_roundtrip(tmp_path):
+    inventory = Inventory()
+    inventory.apply_change(_change(_asset('web-1', 'RUNNING', '2026-01-01T00:00:00Z', labels={'env': 'dev'})))
+    path = tmp_path / 'snapshot.json'
+    inventory.save(str(path), as_of=123.0)
+    loaded = Inventory.load(str(path))
+    assert loaded.as_of == 123.0
+    assert loaded.records == inventory.records
+    assert [r['name'] for r in loaded.instances(labels={'env': 'dev'})] == ['web-1']
+
+
+def test_concurrent_saves_do_not_collide(tmp_path):
+    inventory = Inventory()
+    inventory.apply_change(_change(_asset('web-1', 'RUNNING', '2026-01-01T00:00:00Z')))
+    path = tmp_path / 'snapshot.json'
+    errors = []
+
+    def save():
+        try:
+            for _ in range(50):
+                inventory.save(str(path))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=save) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert [p.name for p in tmp_path.iterdir()] == ['snapshot.json']
+    assert Inventory.load(str(path)).records == inventory.records
+
+
+def test_expired_snapshot_is_used_when_listing_fails(tmp_path, monkeypatch):
+    path = tmp_path / 'snapshot.json'
+    inventory = Inventory()
+    inventory.apply_change(_change(_asset('web-1', 'RUNNING', '2026-01-01T00:00:00Z')))
+    inventory.save(str(path), as_of=0.0)
+
+    def fail(project_id, asset_types):
+        raise RuntimeError('unavailable')
+
+    monkeypatch.setattr(ansible_inventory, 'list_assets', fail)
+    cache = AnsibleInventoryCache('p', snapshot_path=str(path), ttl=300)
+    assert cache.snapshot().as_of == 0.0
+    assert list(cache.get(refresh=True)['_meta']['hostvars']) == ['web-1']
+
+    # スナップショットが無い場合はエラー
+    with pytest.raises(RuntimeError):
+        AnsibleInventoryCache('p', snapshot_path=str(tmp_path / 'none.json')).snapshot()
+
+
+def test_missing_status_does_not_create_group():
+    inventory = Inventory()
+    inventory.apply_change(_change(_asset('web-1', 'RUNNING', '2026-01-01T00:00:00Z', labels={'role': 'web'})))
+    inventory.apply_change(_change(_asset('web-2', None, '2026-01-01T00:00:00Z', labels={'role': 'web'})))
+
+    result = build_ansible_inventory(inventory, 'p')
+    assert result['all']['children'] == ['label_role_web', 'status_RUNNING', 'zone_asia_northeast1_a']
+    assert result['status_RUNNING'] == {'hosts': ['web-1']}
+    assert result['zone_asia_northeast1_a'] == {'hosts': ['web-1', 'web-2']}
+    assert result['_meta']['hostvars']['web-2']['status'] is None
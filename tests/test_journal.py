@@ -0,0 +1,149 @@
+"""ActionJournal の末尾修復・セグメント切り替え・再生と、GCPTools からの記録"""
+
+import pytest
+
+from agent.tools import gcp_tools
+from agent.tools.gcp_tools import GCPTools
+from agent.tools.journal import ActionJournal, SEGMENT_SUFFIX, INDEX_SUFFIX
+from agent.tools.remediation import ActionExecutor
+
+
+class Clock:
+    def __init__(self, start=1_700_000_000.0):
+        self.now = start
+
+    def __call__(self):
+        self.now += 1
+        return self.now
+
+
+def test_torn_tail_is_truncated_on_reopen(tmp_path):
+    with ActionJournal(str(tmp_path), clock=Clock()) as journal:
+        for i in range(3):
+            journal.append('start_instance', f'web-{i}', success=True)
+
+    segment = sorted(tmp_path.glob('*' + SEGMENT_SUFFIX))[-1]
+    size = segment.stat().st_size
+    with open(segment, 'ab') as f:
+        # 書き込み途中で止まったレコード（ヘッダだけ）
+        f.write(b'\x40\x00\x00\x00\x01\x02')
+
+    with ActionJournal(str(tmp_path), clock=Clock(1_800_000_000.0)) as journal:
+        assert segment.stat().st_size == size
+        assert [r['resource'] for r in journal.query()] == ['web-0', 'web-1', 'web-2']
+        assert journal.append('stop_instance', 'web-0', success=True) == 4
+        assert [r['seq'] for r in journal.query('web-0')] == [1, 4]
+
+
+def test_segments_rotate_and_are_indexed(tmp_path):
+    with ActionJournal(str(tmp_path), segment_bytes=200, clock=Clock()) as journal:
+        for i in range(20):
+            journal.append('reset_instance', f'web-{i % 3}', success=True)
+        assert len(journal.query('web-1')) == 7
+
+    segments = sorted(tmp_path.glob('*' + SEGMENT_SUFFIX))
+    assert len(segments) > 1
+    # 封印したセグメントだけ索引がある
+    assert sorted(tmp_path.glob('*' + INDEX_SUFFIX)) == [p.with_suffix(INDEX_SUFFIX) for p in segments[:-1]]
+
+    with ActionJournal(str(tmp_path), segment_bytes=200) as journal:
+        records = journal.query()
+        assert [r['seq'] for r in records] == list(range(1, 21))
+        assert [r['seq'] for r in journal.query('web-2')] == list(range(3, 21, 3))
+
+
+@pytest.mark.parametrize('segment_bytes', [64 * 1024 * 1024, 200])
+def test_two_writers_share_sequence_and_offsets(tmp_path, segment_bytes):
+    clock = Clock()
+    first = ActionJournal(str(tmp_path), segment_bytes=segment_bytes, clock=clock)
+    second = ActionJournal(str(tmp_path), segment_bytes=segment_bytes, clock=clock)
+    seqs = []
+    for i in range(12):
+        writer = first if i % 3 else second
+        seqs.append(writer.append('start_instance', f'web-{i}', success=True))
+    first.close()
+    second.close()
+    assert seqs == list(range(1, 13))
+
+    with ActionJournal(str(tmp_path), segment_bytes=segment_bytes) as journal:
+        records = journal.query()
+        assert [(r['seq'], r['resource']) for r in records] == [(i + 1, f'web-{i}') for i in range(12)]
+        assert [r['seq'] for r in journal.query('web-4')] == [5]
+
+
+def test_writer_sees_records_of_other_writer_after_next_write(tmp_path):
+    with ActionJournal(str(tmp_path), clock=Clock()) as first, ActionJournal(str(tmp_path), clock=Clock()) as second:
+        first.append('start_instance', 'web-1', success=True)
+        second.append('stop_instance', 'web-2', success=True)
+        first.append('start_instance', 'web-3', success=True)
+        # 書き込み時に取り込むので、索引のオフセットは他のプロセスの分とずれない
+        assert [r['resource'] for r in first.query('web-3')] == ['web-3']
+        assert [r['resource'] for r in first.query('web-2')] == ['web-2']
+
+
+def test_read_only_open_never_truncates(tmp_path):
+    with ActionJournal(str(tmp_path), clock=Clock()) as journal:
+        journal.append('start_instance', 'web-1', success=True)
+    segment = sorted(tmp_path.glob('*' + SEGMENT_SUFFIX))[-1]
+    with open(segment, 'ab') as f:
+        # 他のプロセスが書き込み中のレコード
+        f.write(b'\x40\x00\x00\x00\x01\x02')
+    size = segment.stat().st_size
+
+    with ActionJournal(str(tmp_path), read_only=True) as journal:
+        assert [r['resource'] for r in journal.query()] == ['web-1']
+        with pytest.raises(RuntimeError):
+            journal.append('stop_instance', 'web-1')
+    assert segment.stat().st_size == size
+    assert not (tmp_path / 'missing').exists()
+    assert ActionJournal(str(tmp_path / 'missing'), read_only=True).query() == []
+    assert not (tmp_path / 'missing').exists()
+
+
+def test_replay_skips_failed_and_dry_run_records(tmp_path):
+    with ActionJournal(str(tmp_path), clock=Clock()) as journal:
+        journal.append('start_instance', 'web-1', success=True)
+        journal.append('stop_instance', 'web-1', success=False, error='quota')
+        journal.append('reset_instance', 'web-1', success=True, dry_run=True)
+        journal.append('delete_instance', 'web-1', success=True)
+        results = journal.replay(ActionExecutor(dry_run=True))
+
+    assert [(r['recorded_action'], bool(r.get('skipped'))) for r in results] == [
+        ('start_instance', False),
+        ('stop_instance', True),
+        ('delete_instance', True),
+    ]
+
+
+class FailingJournal:
+    def __init__(self):
+        self.calls = []
+
+    def append(self, action, resource, **fields):
+        self.calls.append((action, fields['success']))
+        raise RuntimeError('disk full')
+
+
+class FakeInstancesClient:
+    fail = False
+
+    def start(self, request):
+        if self.fail:
+            raise RuntimeError('permission denied')
+
+
+def make_tools(journal):
+    tools = GCPTools.__new__(GCPTools)
+    tools.project_id, tools.zone, tools.journal = 'proj', 'asia-northeast1-a', journal
+    return tools
+
+
+@pytest.mark.parametrize('fail', [False, True])
+def test_journal_failure_does_not_change_result(monkeypatch, fail):
+    monkeypatch.setattr(gcp_tools.compute_v1, 'InstancesClient', FakeInstancesClient)
+    monkeypatch.setattr(FakeInstancesClient, 'fail', fail)
+    journal = FailingJournal()
+
+    assert make_tools(journal).start_instance('web-1') is not fail
+    # 成功・失敗のどちらか一方だけが記録される
+    assert journal.calls == [('start_instance', not fail)]
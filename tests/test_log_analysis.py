@@ -0,0 +1,158 @@
+"""アクセスログのチャンク分割・部分集計の結合と、LatencySketch・TopK の精度"""
+
+import gzip
+import json
+import random
+
+import numpy as np
+import pytest
+
+from agent.tools import log_analysis
+from agent.tools.log_analysis import LogAggregate, LogAnalyzer, split_file
+from agent.tools.sketches import LatencySketch, TopK
+
+
+def _log(count, seed=0):
+    rng = random.Random(seed)
+    lines = []
+    for i in range(count):
+        path = f'/post/{min(int(rng.paretovariate(1.2)), 50)}' + ('?p=1' if i % 7 == 0 else '')
+        status = rng.choice(['200', '200', '200', '304', '404', '500'])
+        size = '-' if status == '304' else str(rng.randint(100, 90000))
+        line = (
+            f'198.51.100.{i % 13} - - [10/Oct/2025:{i % 24:02d}:55:36 +0900] "GET {path} HTTP/1.1" '
+            f'{status} {size} "-" "Mozilla/5.0 (X11; Linux)" {rng.expovariate(20):.3f}'
+        )
+        lines.append(line if i % 50 else 'garbage')
+    return ('\n'.join(lines) + '\n').encode()
+
+
+def _single_pass(data):
+    aggregate = LogAggregate()
+    aggregate.add_lines(data)
+    return _normalized(aggregate.report(top=100))
+
+
+def _normalized(report):
+    """同数の順位と、足し合わせる順による平均の誤差を比較から除く"""
+    for key in ('top_paths', 'top_clients'):
+        report[key] = sorted(report[key], key=lambda item: (-item[1], item[0]))
+    report['latency']['mean'] = round(report['latency']['mean'], 9)
+    return report
+
+
+def test_parse_combined_line():
+    aggregate = LogAggregate()
+    aggregate.add_lines(
+        b'203.0.113.5 - - [10/Oct/2025:13:55:36 +0900] "POST /wp-login.php?x=1 HTTP/1.1" 302 5 "-" "curl" 0.250\n'
+        b'203.0.113.5 - - [10/Oct/2025:14:01:00 +0900] "GET / HTTP/1.1" 304 -\n'
+        b'\n'
+        b'not a log line\n'
+    )
+    report = aggregate.report()
+    assert (report['lines'], report['unparsed'], report['bytes_sent']) == (3, 1, 5)
+    assert report['status'] == {'302': 1, '304': 1}
+    assert report['hourly'] == {'10/Oct/2025:13': 1, '10/Oct/2025:14': 1}
+    assert report['top_paths'][0] == ('/wp-login.php', 1)
+    assert report['top_clients'] == [('203.0.113.5', 2)]
+    # 応答時間の無い行は分布に入れない
+    assert report['latency']['count'] == 1
+
+
+@pytest.mark.parametrize('chunks', [1, 2, 7, 50])
+def test_split_file_covers_whole_lines(tmp_path, chunks):
+    data = _log(300)
+    path = tmp_path / 'access.log'
+    path.write_bytes(data)
+    ranges = split_file(str(path), chunks)
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(data)
+    assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+    assert all(data[end - 1:end] == b'\n' for _, end in ranges)
+
+
+def test_lines_crossing_block_and_chunk_boundaries(tmp_path, monkeypatch):
+    data = _log(500)
+    plain, compressed = tmp_path / 'access.log', tmp_path / 'access.log.1.gz'
+    # 最終行に改行が無い場合も数える
+    plain.write_bytes(data[:-1])
+    with gzip.open(compressed, 'wb') as f:
+        f.write(data)
+    # ほぼ全ての行がブロック境界をまたぐ大きさにする
+    monkeypatch.setattr(log_analysis, 'BLOCK_SIZE', 97)
+
+    expected = _single_pass(data)
+    assert _normalized(log_analysis._analyze_gzip(str(compressed)).report(top=100)) == expected
+    assert _normalized(LogAnalyzer(workers=1, chunks_per_worker=9).analyze([str(plain)]).report(top=100)) == expected
+
+    both = LogAnalyzer(workers=1, chunks_per_worker=3).analyze([str(plain), str(compressed)]).report()
+    assert both['lines'] == 2 * expected['lines']
+    assert both['status'] == {k: 2 * v for k, v in expected['status'].items()}
+
+
+def test_merging_partial_aggregates_matches_single_pass():
+    lines = _log(2000, seed=1).splitlines(keepends=True)
+    merged = LogAggregate()
+    for start in range(0, len(lines), 300):
+        part = LogAggregate()
+        part.add_lines(b''.join(lines[start:start + 300]))
+        merged.merge(part)
+    assert _normalized(merged.report(top=100)) == _single_pass(b''.join(lines))
+
+
+def test_topk_keeps_heavy_hitters_within_error_bound():
+    rng = random.Random(2)
+    keys = [f'/heavy/{i}' for i in range(5) for _ in range(500 - i * 50)]
+    keys += [f'/tail/{rng.randrange(5000)}' for _ in range(20000)]
+    rng.shuffle(keys)
+
+    exact = {}
+    sketch = TopK(capacity=100)
+    parts = [TopK(capacity=100) for _ in range(4)]
+    for i, key in enumerate(keys):
+        exact[key] = exact.get(key, 0) + 1
+        sketch.add(key)
+        parts[i % 4].add(key)
+    merged = parts[0]
+    for part in parts[1:]:
+        merged.merge(part)
+
+    bound = len(keys) / 100
+    for topk in (sketch, merged):
+        assert len(topk.counts) <= 200
+        top = dict(topk.most_common(5))
+        assert set(top) == {f'/heavy/{i}' for i in range(5)}
+        # 過大に数えることはなく、不足分は総数 / capacity 以下
+        assert all(exact[key] - bound <= count <= exact[key] for key, count in top.items())
+
+
+@pytest.mark.parametrize('accuracy', [0.01, 0.05])
+def test_latency_sketch_relative_accuracy(accuracy):
+    rng = np.random.default_rng(3)
+    values = np.concatenate([rng.lognormal(-3, 1, 20000), np.zeros(100)])
+    sketch = LatencySketch(accuracy)
+    for value in values:
+        sketch.add(float(value))
+
+    for q in (0.1, 0.5, 0.9, 0.99, 0.999):
+        exact = np.quantile(values, q, method='lower')
+        assert sketch.quantile(q) == pytest.approx(exact, rel=accuracy * 1.01)
+    assert sketch.quantile(0.001) == 0.0
+    assert sketch.quantile(1.0) == pytest.approx(values.max(), rel=accuracy)
+    assert sketch.mean == pytest.approx(values.mean())
+
+
+def test_latency_sketch_merge_and_serialization():
+    values = [0.0, 0.001, 0.02, 0.3, 0.3, 4.0, 12.5]
+    whole, first, second = LatencySketch(), LatencySketch(), LatencySketch()
+    for i, value in enumerate(values):
+        whole.add(value)
+        (first if i % 2 else second).add(value)
+    first.merge(second)
+    assert first.summary() == whole.summary() and (first.min, first.max) == (0.0, 12.5)
+
+    restored = LatencySketch.from_dict(json.loads(json.dumps(whole.to_dict())))
+    assert restored.summary() == whole.summary()
+    assert LatencySketch.from_dict(LatencySketch().to_dict()).quantile(0.5) is None
+
+    with pytest.raises(ValueError):
+        whole.merge(LatencySketch(0.05))
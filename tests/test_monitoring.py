@@ -0,0 +1,62 @@
+"""MonitoringTools.get_fleet_series のクエリ期間とエラーの扱い"""
+
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from agent.tools.monitoring import MonitoringTools
+from agent.tools.projects import ProjectFanOut
+
+
+class FakeClient:
+    def __init__(self, series=(), error=None):
+        self.series = list(series)
+        self.error = error
+        self.requests = []
+
+    def list_time_series(self, request):
+        self.requests.append(request)
+        if self.error:
+            raise self.error
+        return iter(self.series)
+
+
+def make_tools(client, project_id='proj'):
+    tools = MonitoringTools.__new__(MonitoringTools)
+    tools.project_id = project_id
+    tools.project_name = f"projects/{project_id}"
+    tools.client = client
+    return tools
+
+
+@pytest.fixture
+def jst(monkeypatch):
+    monkeypatch.setenv('TZ', 'Asia/Tokyo')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_query_window_ends_now_regardless_of_local_timezone(jst):
+    client = FakeClient()
+    before = time.time()
+    assert make_tools(client).get_fleet_series('cpu', hours=2) == {}
+    interval = client.requests[0].interval
+    assert before - 1 <= interval.end_time.timestamp() <= time.time() + 1
+    assert interval.end_time.timestamp() - interval.start_time.timestamp() == pytest.approx(7200, abs=1)
+
+
+def test_query_errors_propagate():
+    with pytest.raises(RuntimeError):
+        make_tools(FakeClient(error=RuntimeError('quota exceeded'))).get_fleet_series('cpu')
+
+
+@pytest.mark.parametrize('projects, scope', [(['proj'], None), (['a', 'b'], 'scope')])
+def test_fanout_records_failed_metric_query(projects, scope):
+    fanout = ProjectFanOut(projects, metrics_scope=scope)
+    failing = make_tools(FakeClient(error=RuntimeError('quota exceeded')))
+    fanout._tools = {(MonitoringTools, p): failing for p in projects + [scope]}
+    assert fanout.get_fleet_series('cpu') == {}
+    assert fanout.errors == {scope or 'proj': ['quota exceeded']}
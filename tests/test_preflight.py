@@ -0,0 +1,101 @@
+"""Preflight の並列チェック（期限切れ・エラー・認証失敗時のスキップ）と接続テストスクリプトの --json"""
+
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import google.auth
+import pytest
+
+from agent.tools.preflight import AUTH_HINT, CHECKS, Preflight
+
+ROOT = Path(__file__).parent.parent
+
+
+class FakeCredentials:
+    def refresh(self, request):
+        pass
+
+
+@pytest.fixture
+def authenticated(monkeypatch):
+    monkeypatch.setattr(google.auth, 'default', lambda scopes=None: (FakeCredentials(), 'proj'))
+
+
+def _stub_probes(monkeypatch, probes):
+    monkeypatch.setattr(Preflight, '_probes', lambda self: {name: probes[name] for name in self.checks})
+
+
+def test_checks_run_in_parallel_and_time_out(monkeypatch, authenticated):
+    release = threading.Event()
+    _stub_probes(monkeypatch, {
+        'project': lambda: {'state': 'ACTIVE'},
+        'compute': lambda: release.wait(5) and {},
+        'storage': lambda: (_ for _ in ()).throw(PermissionError('storage.buckets.list denied')),
+    })
+
+    start = time.monotonic()
+    report = Preflight('proj', timeout=0.3, checks=['project', 'compute', 'storage']).run()
+    release.set()
+
+    # 応答しないチェックを待ち続けない
+    assert time.monotonic() - start < 2
+    assert report['ok'] is False
+    checks = {check['name']: check for check in report['checks']}
+    assert list(checks) == ['auth', 'project', 'compute', 'storage']
+    assert checks['auth']['detail'] == {'type': 'FakeCredentials', 'detected_project': 'proj'}
+
+    assert checks['project']['ok'] and checks['project']['detail'] == {'state': 'ACTIVE'}
+    assert 'hint' not in checks['project']
+
+    assert checks['compute']['status'] == 'timeout' and checks['compute']['latency_ms'] is None
+    assert checks['compute']['hint'] == CHECKS['compute']['hint']
+
+    assert checks['storage']['status'] == 'error'
+    assert checks['storage']['error'] == 'PermissionError: storage.buckets.list denied'
+    assert checks['storage']['api'] == 'storage.googleapis.com'
+    assert checks['storage']['latency_ms'] >= 0
+
+
+def test_all_checks_ok(monkeypatch, authenticated):
+    _stub_probes(monkeypatch, {name: (lambda: {}) for name in CHECKS})
+    report = Preflight('proj').run()
+    assert report['ok'] and [c['name'] for c in report['checks']] == ['auth'] + list(CHECKS)
+
+
+def test_failed_auth_skips_other_checks(monkeypatch):
+    def no_credentials(scopes=None):
+        raise google.auth.exceptions.DefaultCredentialsError('no credentials')
+
+    monkeypatch.setattr(google.auth, 'default', no_credentials)
+    called = []
+    _stub_probes(monkeypatch, {name: (lambda: called.append(1)) for name in CHECKS})
+
+    report = Preflight('proj', checks=['compute', 'logging']).run()
+    auth, *rest = report['checks']
+    assert auth['status'] == 'error' and auth['hint'] == AUTH_HINT
+    assert [(c['name'], c['status'], c['ok']) for c in rest] == [('compute', 'skipped', False), ('logging', 'skipped', False)]
+    assert report['ok'] is False and called == []
+
+
+@pytest.mark.parametrize('kwargs', [{'project_id': ''}, {'project_id': 'proj', 'checks': ['compute', 'dns']}])
+def test_invalid_arguments(kwargs):
+    with pytest.raises(ValueError):
+        Preflight(**kwargs)
+
+
+@pytest.mark.skipif((ROOT / '.env').exists(), reason='.env の GCP_PROJECT_ID が読み込まれるため')
+def test_script_reports_missing_project_as_json():
+    env = {k: v for k, v in os.environ.items() if k != 'GCP_PROJECT_ID'}
+    result = subprocess.run(
+        [sys.executable, str(ROOT / 'scripts' / 'test_connection.py'), '--json'],
+        capture_output=True, text=True, env=env, timeout=60,
+    )
+    assert result.returncode == 1
+    assert json.loads(result.stdout) == {
+        'project_id': None, 'ok': False, 'error': 'GCP_PROJECT_ID が設定されていません', 'checks': [],
+    }
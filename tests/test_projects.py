@@ -0,0 +1,123 @@
+"""対象プロジェクトの解決・ラベル条件の指定と、ProjectFanOut の結果のまとめ方・同時実行数"""
+
+import threading
+import time
+
+import pytest
+from click.testing import CliRunner
+from google.cloud import resourcemanager_v3
+
+from agent import main
+from agent.tools.projects import ProjectFanOut, resolve_projects
+
+
+class FakeProjectsClient:
+    queries = []
+    found = ['wp-b', 'wp-a', 'wp-dev']
+
+    def search_projects(self, query):
+        self.queries.append(query)
+        return [type('Project', (), {'project_id': p}) for p in self.found]
+
+
+@pytest.fixture
+def projects_client(monkeypatch):
+    monkeypatch.setattr(resourcemanager_v3, 'ProjectsClient', FakeProjectsClient)
+    FakeProjectsClient.queries = []
+    return FakeProjectsClient
+
+
+def test_resolve_without_search_keeps_order(projects_client):
+    assert resolve_projects(['wp-prod', 'wp-dev', 'wp-prod']) == ['wp-prod', 'wp-dev']
+    assert resolve_projects() == []
+    assert projects_client.queries == []
+
+
+def test_resolve_by_folder_and_labels(projects_client):
+    result = resolve_projects(['wp-dev', 'extra'], folder='folders/1234', labels={'env': 'prod', 'team': 'web'})
+    assert projects_client.queries == ['state:ACTIVE parent:folders/1234 labels.env:prod labels.team:web']
+    # 明示したものが先、検索結果はID順で重複なし
+    assert result == ['wp-dev', 'extra', 'wp-a', 'wp-b']
+
+
+def test_project_label_option(projects_client):
+    runner = CliRunner()
+    result = runner.invoke(main.cli, ['--project-label', 'env', 'status', '--help'])
+    assert result.exit_code == 2
+    assert 'key=value' in result.output
+
+    result = runner.invoke(main.cli, ['--project-label', '=prod', 'status', '--help'])
+    assert result.exit_code == 2
+
+    ctx_obj = {}
+    runner.invoke(main.cli, ['--project-label', 'env = prod', '--project-label', 'url=a=b', 'status', '--help'], obj=ctx_obj)
+    assert projects_client.queries == ['state:ACTIVE labels.env:prod labels.url:a=b']
+    assert ctx_obj['projects'] == ['wp-a', 'wp-b', 'wp-dev']
+
+
+class FakeGCPTools:
+    def __init__(self, project_id):
+        self.project_id = project_id
+
+    def list_instances(self, zone=None):
+        if self.project_id == 'broken':
+            raise RuntimeError('compute.instances.list denied')
+        return [{'name': f'{self.project_id}-web', 'zone': zone}]
+
+    def list_buckets(self):
+        return [{'name': f'{self.project_id}-backups'}]
+
+
+def _fanout(projects, **kwargs):
+    fanout = ProjectFanOut(projects, **kwargs)
+    fanout._tools = {}
+    fanout._get = lambda cls, project: FakeGCPTools(project)
+    return fanout
+
+
+def test_results_are_merged_with_project_and_errors_kept():
+    fanout = _fanout(['wp-dev', 'broken', 'wp-prod'])
+    instances = fanout.list_instances(zones=['zone-a', 'zone-b'])
+    assert [(i['project'], i['zone']) for i in instances] == [
+        ('wp-dev', 'zone-a'), ('wp-dev', 'zone-b'), ('wp-prod', 'zone-a'), ('wp-prod', 'zone-b'),
+    ]
+    assert fanout.errors == {'broken': ['compute.instances.list denied'] * 2}
+
+    buckets = fanout.list_buckets()
+    assert buckets == [{'project': p, 'name': f'{p}-backups'} for p in ('wp-dev', 'broken', 'wp-prod')]
+
+
+def test_run_returns_results_in_call_order():
+    fanout = ProjectFanOut(['a', 'b'], max_workers=4)
+    calls = [(p, lambda p=p, i=i: (time.sleep(0.01 * (5 - i)), f'{p}{i}')[1]) for i, p in enumerate('aabab')]
+    assert fanout.run(calls) == [('a', 'a0'), ('a', 'a1'), ('b', 'b2'), ('a', 'a3'), ('b', 'b4')]
+
+    with pytest.raises(ValueError):
+        ProjectFanOut([])
+
+
+@pytest.mark.parametrize('max_workers, per_project', [(8, 2), (3, 2), (8, 1)])
+def test_concurrency_limits(max_workers, per_project):
+    lock = threading.Lock()
+    active, peak = {}, {}
+    total = [0, 0]
+
+    def query(project):
+        with lock:
+            active[project] = active.get(project, 0) + 1
+            peak[project] = max(peak.get(project, 0), active[project])
+            total[0] += 1
+            total[1] = max(total[1], total[0])
+        time.sleep(0.02)
+        with lock:
+            active[project] -= 1
+            total[0] -= 1
+        return project
+
+    projects = ['a', 'b', 'c']
+    fanout = ProjectFanOut(projects, max_workers=max_workers, per_project=per_project)
+    results = fanout.run([(p, lambda p=p: query(p)) for p in projects for _ in range(6)])
+
+    assert len(results) == 18
+    assert max(peak.values()) == per_project
+    assert total[1] <= min(max_workers, per_project * len(projects))
@@ -0,0 +1,86 @@
+"""RemediationEngine のラベル照合・アクションの確認と、クールダウン・レート制限の履歴"""
+
+import pytest
+
+from agent.tools.remediation import ActionExecutor, RemediationEngine, RemediationRule
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _rule(**data):
+    return RemediationRule.from_dict({'name': 'restart', 'action': 'restart_instance', 'metric': 'cpu', **data})
+
+
+def test_label_values_are_compared_as_strings():
+    engine = RemediationEngine([_rule(resource_labels={'tier': 1, 'critical': True})])
+    event = {'metric': 'cpu', 'resource': 'web-1', 'labels': {'tier': 1, 'critical': True}}
+    assert [r['action'] for r in engine.process(event)] == ['restart_instance']
+
+    event = {'metric': 'cpu', 'resource': 'web-2', 'labels': {'tier': '1'}}
+    assert engine.process(event) == []
+
+
+def test_history_is_not_kept_without_rate_limit():
+    clock = Clock()
+    engine = RemediationEngine([_rule(cooldown_seconds=0)], clock=clock)
+    for i in range(100):
+        clock.now = i
+        engine.process({'metric': 'cpu', 'resource': f'web-{i}'})
+    assert len(engine._history) == 0
+
+
+def test_history_is_pruned_to_rate_window():
+    clock = Clock()
+    engine = RemediationEngine(
+        [_rule(cooldown_seconds=0, rate_limit={'max_actions': 3, 'per_seconds': 100})], clock=clock
+    )
+    results = []
+    for i in range(10):
+        clock.now = i * 40
+        results.extend(engine.process({'metric': 'cpu', 'resource': 'web-1'}))
+    assert not any(r.get('suppressed') for r in results)
+    assert list(engine._history[('restart_instance', 'web-1')]) == [280, 320, 360]
+
+    # 期間内に max_actions を超えると抑止
+    clock.now = 361
+    assert engine.process({'metric': 'cpu', 'resource': 'web-1'})[0]['suppressed'] == 'rate_limited'
+
+
+def test_unknown_action_fails_when_loading(tmp_path):
+    rules = tmp_path / 'rules.yml'
+    rules.write_text(
+        "rules:\n"
+        "  - {name: restart, action: restart_instance, metric: cpu}\n"
+        "  - {name: typo, action: restart_instnace, metric: cpu}\n"
+    )
+    with pytest.raises(ValueError, match='typo: restart_instnace'):
+        RemediationEngine.from_yaml(str(rules))
+
+    # 登録済みのアクションなら使える
+    executor = ActionExecutor()
+    executor.register('restart_instnace', lambda event, params: True)
+    assert len(RemediationEngine.from_yaml(str(rules), executor).rules) == 2
+
+
+def test_cooldowns_are_pruned_once_expired():
+    clock = Clock()
+    engine = RemediationEngine(
+        [_rule(cooldown_seconds=100), _rule(name='db', metric='db', cooldown_seconds=1000)], clock=clock
+    )
+    for i in range(50):
+        clock.now = i * 10
+        engine.process({'metric': 'cpu', 'resource': f'web-{i}'})
+    # クールダウン中のものだけが残る
+    assert sorted(engine._last_action) == [('restart', f'web-{i}') for i in range(40, 50)]
+    assert engine.process({'metric': 'cpu', 'resource': 'web-45'})[0]['suppressed'] == 'cooldown'
+
+    engine.process({'metric': 'db', 'resource': 'db-1'})
+    clock.now = 2000
+    engine.process({'metric': 'cpu', 'resource': 'web-0'})
+    assert list(engine._last_action) == [('restart', 'web-0')]
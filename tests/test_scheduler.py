@@ -0,0 +1,200 @@
+"""Scheduler の cron 解釈・ゆらぎ・取りこぼし・同時実行数と、状態保存・設定ファイルの読み込み"""
+
+import json
+import threading
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from agent.tools.scheduler import CronSpec, Scheduler, Job
+
+TZ = ZoneInfo('Asia/Tokyo')
+T0 = datetime(2026, 1, 5, 9, 0, tzinfo=TZ).timestamp()  # 月曜 9:00
+
+
+class Clock:
+    def __init__(self, now=T0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _scheduler(jobs, tasks, **kwargs):
+    return Scheduler([Job.from_dict(j) for j in jobs], tasks=tasks, clock=Clock(), **kwargs)
+
+
+def _job(name='job'):
+    return Job.from_dict({'name': name, 'task': 'command', 'interval_seconds': 60, 'params': {'command': 'true'}})
+
+
+def test_concurrent_state_saves(tmp_path):
+    state_file = tmp_path / 'state.json'
+    scheduler = Scheduler([_job()], state_file=str(state_file))
+    errors = []
+
+    def save():
+        try:
+            for _ in range(200):
+                scheduler._save_state()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=save) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert json.loads(state_file.read_text()) == scheduler.state
+
+
+def test_yaml_paths_resolve_against_base_dir(tmp_path, monkeypatch):
+    config = tmp_path / 'config' / 'schedule.yml'
+    config.parent.mkdir()
+    config.write_text(
+        "state_file: .scheduler/state.json\n"
+        "jobs:\n"
+        "  - name: backup-verify\n"
+        "    task: backup_check\n"
+        "    interval_seconds: 60\n"
+        "    params:\n"
+        "      schedule: config/backup-schedule.yml\n"
+        "  - name: update\n"
+        "    task: command\n"
+        "    interval_seconds: 60\n"
+        "    params:\n"
+        "      cwd: /opt/ansible\n"
+        "      command: 'true'\n"
+    )
+    elsewhere = tmp_path / 'elsewhere'
+    elsewhere.mkdir()
+    monkeypatch.chdir(elsewhere)
+
+    scheduler = Scheduler.from_yaml(str(config), base_dir=str(tmp_path))
+    assert scheduler.state_file == tmp_path / '.scheduler' / 'state.json'
+    assert scheduler.jobs['backup-verify'].params['schedule'] == str(tmp_path / 'config' / 'backup-schedule.yml')
+    assert scheduler.jobs['update'].params['cwd'] == '/opt/ansible'
+
+    # 基準を指定しない場合は定義ファイルのディレクトリ
+    scheduler = Scheduler.from_yaml(str(config))
+    assert scheduler.state_file == config.parent / '.scheduler' / 'state.json'
+
+
+@pytest.mark.parametrize('expr, after, expected', [
+    ('30 3 * * *', datetime(2026, 1, 5, 3, 30), datetime(2026, 1, 6, 3, 30)),
+    ('*/15 9-17 * * 1-5', datetime(2026, 1, 9, 17, 50), datetime(2026, 1, 12, 9, 0)),
+    ('0 0 1 * *', datetime(2026, 1, 31, 12, 0), datetime(2026, 2, 1, 0, 0)),
+    ('5/20 * * * *', datetime(2026, 1, 5, 9, 46), datetime(2026, 1, 5, 10, 5)),
+    # 日と曜日の両方を指定した場合はどちらかに一致すればよい（1/13 は火曜）
+    ('0 12 13 * 5', datetime(2026, 1, 10, 0, 0), datetime(2026, 1, 13, 12, 0)),
+    ('0 12 13 * 5', datetime(2026, 1, 13, 13, 0), datetime(2026, 1, 16, 12, 0)),
+    # 曜日の 7 も日曜
+    ('0 6 * * 7', datetime(2026, 1, 5, 0, 0), datetime(2026, 1, 11, 6, 0)),
+    ('0 0 29 2 *', datetime(2026, 1, 1, 0, 0), datetime(2028, 2, 29, 0, 0)),
+])
+def test_cron_next_after(expr, after, expected):
+    assert CronSpec(expr).next_after(after.replace(tzinfo=TZ)) == expected.replace(tzinfo=TZ)
+
+
+@pytest.mark.parametrize('expr', ['* * * *', '60 * * * *', '5-1 * * * *', '*/0 * * * *', '0 0 31 2 *'])
+def test_invalid_cron(expr):
+    with pytest.raises(ValueError):
+        CronSpec(expr).next_after(datetime(2026, 1, 1, tzinfo=TZ))
+
+
+def test_jitter_is_deterministic_per_run():
+    job = Job.from_dict({'name': 'a', 'task': 'command', 'interval_seconds': 60, 'jitter_seconds': 30})
+    same = Job.from_dict({'name': 'a', 'task': 'command', 'interval_seconds': 60, 'jitter_seconds': 30})
+    other = Job.from_dict({'name': 'b', 'task': 'command', 'interval_seconds': 60, 'jitter_seconds': 30})
+    values = [job.jitter(T0 + i * 60) for i in range(20)]
+    assert values == [same.jitter(T0 + i * 60) for i in range(20)]
+    assert all(0 <= v <= 30 for v in values) and len(set(values)) > 1
+    assert values != [other.jitter(T0 + i * 60) for i in range(20)]
+    assert _job().jitter(T0) == 0.0
+
+
+@pytest.mark.parametrize('misfire, runs, skipped', [('coalesce', 1, 0), ('skip', 0, 1)])
+def test_misfire_after_downtime(misfire, runs, skipped):
+    calls = []
+    scheduler = _scheduler(
+        [{'name': 'hourly', 'task': 'record', 'interval_seconds': 3600, 'misfire': misfire}],
+        {'record': lambda context, params: calls.append(1)},
+    )
+    assert scheduler.run_pending() == ['hourly']
+    scheduler.executor.shutdown(wait=True)
+    scheduler.executor = type(scheduler.executor)(max_workers=1)
+
+    # 5回分止まっていた
+    scheduler.clock.now += 5 * 3600 + 1200
+    assert len(scheduler.run_pending()) == runs
+    scheduler.executor.shutdown(wait=True)
+    assert len(calls) == 1 + runs
+    assert scheduler.state['hourly'].get('skipped', 0) == skipped
+    # 予定は位相を保ったまま今より後へ
+    assert scheduler.state['hourly']['next_run'] == T0 + 6 * 3600
+
+
+def test_max_instances_and_global_cap():
+    release = threading.Event()
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def slow(context, params):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        release.wait(5)
+        with lock:
+            active[0] -= 1
+
+    scheduler = _scheduler(
+        [{'name': f'job{i}', 'task': 'slow', 'interval_seconds': 60} for i in range(3)],
+        {'slow': slow},
+        max_concurrency=2,
+    )
+    assert scheduler.run_pending() == ['job0', 'job1', 'job2']
+
+    # 前回がまだ実行中（待ち含む）なので max_instances=1 で見送る
+    scheduler.clock.now += 60
+    assert scheduler.run_pending() == []
+    assert all(state['skipped'] == 1 for state in scheduler.state.values())
+
+    release.set()
+    scheduler.executor.shutdown(wait=True)
+    assert peak[0] == 2
+    assert all(state['last_status'] == 'success' for state in scheduler.state.values())
+
+
+class CheckedState(dict):
+    """変更がロック内で行われているかを確認する"""
+
+    def __init__(self, data, lock):
+        super().__init__(data)
+        self.lock = lock
+
+    def __setitem__(self, key, value):
+        assert self.lock.locked(), f"state[{key!r}] changed without the lock"
+        super().__setitem__(key, value)
+
+    def update(self, *args, **kwargs):
+        assert self.lock.locked(), "state changed without the lock"
+        super().update(*args, **kwargs)
+
+
+def test_state_changes_hold_the_lock(tmp_path):
+    scheduler = _scheduler(
+        [{'name': 'a', 'task': 'noop', 'interval_seconds': 60, 'misfire': 'skip', 'misfire_grace_seconds': 1},
+         {'name': 'b', 'task': 'noop', 'interval_seconds': 60}],
+        {'noop': lambda context, params: None},
+        state_file=str(tmp_path / 'state.json'),
+    )
+    scheduler.state = {name: CheckedState(state, scheduler._lock) for name, state in scheduler.state.items()}
+    scheduler.run_pending()
+    scheduler.clock.now += 600
+    scheduler.run_pending()
+    scheduler.executor.shutdown(wait=True)
+    assert scheduler.state['a']['skipped'] == 1
+    assert scheduler.state['b']['last_status'] == 'success'
@@ -0,0 +1,107 @@
+"""ErrorBudgetStore のウィンドウ合計・バーンレート判定と refresh の取り込み位置"""
+
+import random
+import time
+
+import numpy as np
+import pytest
+
+from agent.tools import slo
+from agent.tools.slo import ErrorBudgetStore, WINDOWS, BUCKET_SECONDS
+
+T0 = 1_700_000_000 // BUCKET_SECONDS * BUCKET_SECONDS
+
+
+def test_incremental_window_sums_match_recompute():
+    rng = random.Random(1)
+    store = ErrorBudgetStore()
+    history = {}
+    now = T0
+    for step in range(1500):
+        now += BUCKET_SECONDS * rng.choice([1, 1, 1, 2, 5, 40])
+        series = {}
+        for name in ('uptime:a', 'uptime:b', 'lb:m'):
+            points = []
+            # 直近のバケットは取り直すこともある
+            for back in range(rng.randint(0, 3)):
+                ts = now - back * BUCKET_SECONDS
+                total = rng.randint(0, 100)
+                good = rng.randint(0, total)
+                points.append((ts, good, total))
+                history[(name, ts // BUCKET_SECONDS)] = (good, total)
+            series[name] = points
+        store.update(series)
+
+        if step % 250 == 0:
+            for name, row in store.index.items():
+                for w, seconds in enumerate(WINDOWS.values()):
+                    length = seconds // BUCKET_SECONDS
+                    expected = np.zeros(2)
+                    for (n, bucket), counts in history.items():
+                        if n == name and store.head - length < bucket <= store.head:
+                            expected += counts
+                    assert np.allclose(store.sums[row, w], expected), (step, name, w)
+
+
+def test_fast_burn_pages():
+    store = ErrorBudgetStore()
+    store.update({'uptime:x': [(T0 + i * BUCKET_SECONDS, 100, 100) for i in range(8000)]})
+    store.update({'uptime:x': [(T0 + (8000 + i) * BUCKET_SECONDS, 80, 100) for i in range(12)]})
+    result = store.evaluate(0.995)['uptime:x']
+    assert {alert['policy'] for alert in result['alerts']} == {'page-fast', 'page-slow'}
+    assert result['burn_rates']['1h'] == pytest.approx(40.0)
+    assert 0 < result['budget_remaining'] < 1
+
+
+def test_healthy_series_has_no_alerts():
+    store = ErrorBudgetStore()
+    store.update({'lb:m': [(T0 + i * BUCKET_SECONDS, 1000, 1000) for i in range(100)]})
+    result = store.evaluate(0.995)['lb:m']
+    assert result['alerts'] == []
+    assert result['budget_remaining'] == 1.0
+
+
+def test_save_and_load(tmp_path):
+    store = ErrorBudgetStore()
+    store.update({'uptime:a': [(T0 + i * BUCKET_SECONDS, 99, 100) for i in range(50)]})
+    path = tmp_path / 'state.npz'
+    store.save(str(path))
+    loaded = ErrorBudgetStore.open(str(path))
+    assert loaded.head == store.head
+    assert loaded.evaluate() == store.evaluate()
+
+
+def test_refresh_failure_keeps_watermark(monkeypatch):
+    store = ErrorBudgetStore()
+    store.update({'uptime:a': [(T0, 100, 100)]})
+    watermark = store.watermark
+
+    def fetch(monitoring_tools, source, start, end, bucket_seconds):
+        if source == 'lb':
+            raise RuntimeError('unavailable')
+        return {'uptime:a': [(end - BUCKET_SECONDS, 100, 100)]}
+
+    monkeypatch.setattr(slo, 'fetch_sli_counts', fetch)
+    with pytest.raises(RuntimeError):
+        slo.refresh(store, None, ('uptime', 'lb'), now=T0 + 3600)
+    assert store.watermark == watermark
+
+
+def test_refresh_uses_epoch_time_regardless_of_timezone(monkeypatch):
+    monkeypatch.setenv('TZ', 'Asia/Tokyo')
+    time.tzset()
+    calls = []
+
+    def fetch(monitoring_tools, source, start, end, bucket_seconds):
+        calls.append(end)
+        return {}
+
+    monkeypatch.setattr(slo, 'fetch_sli_counts', fetch)
+    try:
+        store = ErrorBudgetStore()
+        slo.refresh(store, None, ('uptime',))
+    finally:
+        monkeypatch.delenv('TZ')
+        time.tzset()
+    assert abs(calls[0] - time.time()) < 60
+    assert abs(store.watermark - time.time()) < 2 * BUCKET_SECONDS
@@ -0,0 +1,136 @@
+"""スロークエリのフィンガープリント・ログの解析と、型ごとの集計・(other) への折りたたみ"""
+
+from pathlib import Path
+
+import pytest
+
+from agent.tools.slow_query import (
+    OTHER_FINGERPRINT, SlowQueryAggregate, SlowQueryAnalyzer, fingerprint, parse_slow_log,
+)
+
+SLOW_LOG = Path(__file__).parent / 'fixtures' / 'mysql-slow.log'
+
+
+@pytest.mark.parametrize('sql, expected', [
+    ("SELECT * FROM wp_posts WHERE ID = 42;", "select * from wp_posts where id = ?"),
+    ("select  *\n  from `wp_posts`\twhere ID=42", "select * from wp_posts where id=?"),
+    # 文字列中のエスケープ・コメント・数値の表記
+    ("SELECT 'it''s', \"a\\\"b\", 0x1F, 1.5e3, .5 /* hint */ -- tail", "select ?, ?, ?, ?, ?"),
+    ("SELECT a FROM t # comment\nWHERE b = 'x'", "select a from t where b = ?"),
+    # 識別子の中の数字はそのまま
+    ("SELECT c1 FROM wp_2_posts WHERE t2.c3 = 4", "select c1 from wp_2_posts where t2.c3 = ?"),
+    ("DELETE FROM t WHERE id IN (1, 2, 3)", "delete from t where id in (?+)"),
+    ("DELETE FROM t WHERE id IN (7)", "delete from t where id in (?+)"),
+    ("INSERT INTO t (a, b) VALUES (1, NOW()), (2, NOW())", "insert into t (a, b) values (?+)"),
+    (
+        "INSERT INTO t (a) VALUES (1) ON DUPLICATE KEY UPDATE a = VALUES(a)",
+        "insert into t (a) values (?+) on duplicate key update a = values(a)",
+    ),
+])
+def test_fingerprint(sql, expected):
+    assert fingerprint(sql) == expected
+
+
+def test_parse_fixture():
+    with open(SLOW_LOG) as f:
+        entries = list(parse_slow_log(f))
+
+    # 起動時のバナーは読み飛ばす
+    assert len(entries) == 5
+    first = entries[0]
+    assert first['timestamp'] == '2026-01-10T03:00:01.123456Z'
+    assert (first['user'], first['database']) == ('wp_site1', 'wp_site1')
+    assert (first['query_time'], first['lock_time'], first['rows_sent'], first['rows_examined']) == (2.5, 0.0001, 10, 120000)
+    # 複数行の SQL は1件にまとめる
+    assert first['sql'].startswith('SELECT ID, post_title FROM wp_posts WHERE')
+    assert first['sql'].endswith('LIMIT 10;')
+
+    # use が無い間は直前のデータベースを引き継ぐ
+    assert entries[1]['database'] == 'wp_site1'
+    # # Time の無いエントリは SET timestamp から補う
+    assert entries[2]['timestamp'] == '2026-01-10T03:00:10+00:00'
+    assert entries[2]['database'] == 'wp_site2' and entries[3]['database'] == 'wp_site2'
+    assert entries[4]['sql'] == 'administrator command: Quit;'
+
+
+def test_schema_header_and_parsed_entries():
+    entry = {'database': 'db', 'query_time': 1.0, 'sql': 'SELECT 1'}
+    lines = [
+        '# Time: 2026-01-10T00:00:00Z',
+        '# User@Host: app[app] @ 10.0.0.5 []',
+        '# Schema: shop  Last_errno: 0  Killed: 0',
+        '# Query_time: 0.5  Lock_time: 0.0  Rows_sent: 1  Rows_examined: 1',
+        'SELECT 1;',
+        '# Query_time: 0.7  Lock_time: 0.0  Rows_sent: 1  Rows_examined: 1',
+        'SELECT 2;',
+    ]
+    parsed = list(parse_slow_log(lines))
+    assert parsed[0]['database'] == 'shop' and parsed[0]['user'] == 'app'
+    assert parsed[1]['database'] == 'shop' and parsed[1]['query_time'] == 0.7
+    # 解析済みのエントリ（Ops Agent の JSON）はそのまま
+    assert list(parse_slow_log([entry])) == [entry]
+
+
+def test_aggregate_fixture_by_fingerprint():
+    report = SlowQueryAnalyzer(workers=1).analyze([str(SLOW_LOG)]).report()
+    assert report['entries'] == 5 and report['folded'] == 0
+
+    posts = report['queries'][0]
+    assert posts['database'] == 'wp_site1'
+    assert posts['fingerprint'] == (
+        'select id, post_title from wp_posts where post_status = ? and post_type in (?+) '
+        'order by post_date desc limit ?'
+    )
+    assert (posts['count'], posts['total_time'], posts['max_time'], posts['rows_examined']) == (2, 4.0, 2.5, 210000)
+    # 最も遅かったものを代表例に残す
+    assert 'LIMIT 10' in posts['sample']
+
+    assert report['databases']['wp_site1'] == {'count': 2, 'total_time': 4.0}
+    # 管理コマンドも直前の use を引き継ぐ
+    assert report['databases']['wp_site2']['count'] == 3
+    assert [q['fingerprint'] for q in report['queries']][1] == 'administrator command: quit'
+    only = SlowQueryAnalyzer(workers=1).analyze([str(SLOW_LOG)]).report(sort='count', database='wp_site2')
+    assert {q['database'] for q in only['queries']} == {'wp_site2'}
+
+
+def _entry(i, query_time, database='db'):
+    return {'database': database, 'query_time': query_time, 'sql': f'SELECT * FROM table_{i} WHERE id = {i}'}
+
+
+def test_rare_fingerprints_fold_into_other():
+    aggregate = SlowQueryAggregate(max_groups=3)
+    for i in range(7):
+        aggregate.add(_entry(i, float(i + 1)))
+
+    report = aggregate.report()
+    assert report['entries'] == 7
+    # 2倍を超えた時点で上位3件を残し、残りは (other) に
+    assert report['folded'] == 4
+    assert [q['fingerprint'] for q in report['queries']] == [
+        OTHER_FINGERPRINT, 'select * from table_6 where id = ?', 'select * from table_5 where id = ?',
+        'select * from table_4 where id = ?',
+    ]
+    other = report['queries'][0]
+    assert (other['count'], other['total_time']) == (4, 10.0)
+    # 全体の件数・時間は失わない
+    assert sum(q['count'] for q in report['queries']) == 7
+    assert report['databases']['db']['total_time'] == 28.0
+
+
+def test_merge_folds_across_workers():
+    parts = []
+    for worker in range(3):
+        part = SlowQueryAggregate(max_groups=2)
+        for i in range(worker * 5, worker * 5 + 5):
+            part.add(_entry(i, float(i + 1), database=f'db{i % 2}'))
+        parts.append(part)
+
+    total = SlowQueryAggregate(max_groups=2)
+    for part in parts:
+        total.merge(part)
+    report = total.report(top=100)
+    assert report['entries'] == 15
+    assert len(total.groups) <= 4 + 2
+    assert sum(q['count'] for q in report['queries']) == 15
+    assert sum(q['total_time'] for q in report['queries']) == pytest.approx(sum(range(1, 16)))
+    assert report['queries'][0]['fingerprint'] == OTHER_FINGERPRINT
@@ -0,0 +1,174 @@
+"""ToolRegistry のスキーマ、ToolSession のメモ化・無効化、ScriptedModel での run_agent"""
+
+import json
+from typing import Optional
+
+from agent.tools.tool_calling import ScriptedModel, ToolRegistry, ToolSession, compact_result, run_agent
+
+
+class FakeTools:
+    """GCPTools / MonitoringTools の代わり（呼び出しを記録する）"""
+
+    def __init__(self):
+        self.calls = []
+
+    def list_instances(self, zone: Optional[str] = None) -> list:
+        """
+        VMインスタンス一覧を取得
+
+        Args:
+            zone: ゾーン名（未指定の場合はデフォルトゾーン）
+        """
+        self.calls.append(('list_instances', zone))
+        return [{'name': 'web-1', 'status': 'RUNNING'}]
+
+    def get_instance(self, instance_name: str, zone: Optional[str] = None) -> dict:
+        """
+        VMインスタンスの詳細を取得
+
+        Args:
+            instance_name: インスタンス名
+            zone: ゾーン名
+        """
+        self.calls.append(('get_instance', instance_name))
+        if instance_name == 'missing':
+            raise LookupError(instance_name)
+        return {'name': instance_name}
+
+    def list_buckets(self) -> list:
+        """バケット一覧を取得"""
+        return []
+
+    def list_zones(self) -> list:
+        """ゾーン一覧を取得"""
+        return []
+
+    def start_instance(self, instance_name: str, zone: Optional[str] = None) -> bool:
+        """
+        VMインスタンスを起動
+
+        Args:
+            instance_name: インスタンス名
+            zone: ゾーン名
+        """
+        self.calls.append(('start_instance', instance_name))
+        return True
+
+    stop_instance = start_instance
+    reset_instance = start_instance
+
+    def get_cpu_utilization(self, instance_name: str, hours: int = 1) -> list:
+        """
+        CPU使用率を取得
+
+        Args:
+            instance_name: インスタンス名
+            hours: 過去何時間分のデータを取得するか
+        """
+        return [{'timestamp': f"t{i}", 'value': float(i)} for i in range(hours * 200)]
+
+
+def _use(id, name, **arguments):
+    return {'id': id, 'name': name, 'input': arguments}
+
+
+def test_schema_from_signature_and_docstring():
+    tools = FakeTools()
+    spec = ToolRegistry().register(tools.get_instance)
+    assert spec.name == 'get_instance'
+    assert spec.description == 'VMインスタンスの詳細を取得'
+    assert spec.parameters == {
+        'type': 'object',
+        'properties': {
+            'instance_name': {'type': 'string', 'description': 'インスタンス名'},
+            'zone': {'type': 'string', 'description': 'ゾーン名'},
+        },
+        'required': ['instance_name'],
+    }
+
+
+def test_mutating_tools_require_permission():
+    tools = FakeTools()
+    assert 'start_instance' not in ToolRegistry.for_agent(tools).tools
+    registry = ToolRegistry.for_agent(tools, allow_mutations=True)
+    assert registry.tools['start_instance'].mutating
+    assert [s['function']['name'] for s in registry.schemas('openai')] == list(registry.tools)
+    assert set(registry.schemas()[0]) == {'name', 'description', 'input_schema'}
+
+
+def test_session_dedupes_memoizes_and_invalidates():
+    tools = FakeTools()
+    registry = ToolRegistry.for_agent(tools, allow_mutations=True)
+    with ToolSession(registry) as session:
+        results = session.execute([
+            _use('a', 'get_instance', instance_name='web-1'),
+            _use('b', 'get_instance', instance_name='web-1'),
+            _use('c', 'list_instances'),
+        ])
+        assert [r['tool_use_id'] for r in results] == ['a', 'b', 'c']
+        assert results[0]['content'] == results[1]['content']
+        assert tools.calls.count(('get_instance', 'web-1')) == 1
+
+        session.execute([_use('d', 'get_instance', instance_name='web-1')])
+        assert tools.calls.count(('get_instance', 'web-1')) == 1
+
+        # 変更系の後は同じ読み取りをやり直す
+        session.execute([
+            _use('e', 'start_instance', instance_name='web-1'),
+            _use('f', 'get_instance', instance_name='web-1'),
+        ])
+        assert tools.calls[-2:] == [('start_instance', 'web-1'), ('get_instance', 'web-1')]
+        assert session.stats['cache_hits'] == 2
+
+
+def test_session_reports_errors_without_caching():
+    tools = FakeTools()
+    with ToolSession(ToolRegistry.for_agent(tools)) as session:
+        results = session.execute([
+            _use('a', 'get_instance'),
+            _use('b', 'get_instance', instance_name='web-1', force=True),
+            _use('c', 'delete_instance', instance_name='web-1'),
+            _use('d', 'get_instance', instance_name='missing'),
+        ])
+        assert all(r['is_error'] for r in results)
+        assert 'instance_name' in results[0]['content']
+        assert 'force' in results[1]['content']
+        assert results[3]['content'].startswith('LookupError')
+
+        session.execute([_use('e', 'get_instance', instance_name='missing')])
+        assert tools.calls.count(('get_instance', 'missing')) == 2
+
+
+def test_large_results_are_compacted():
+    tools = FakeTools()
+    registry = ToolRegistry()
+    registry.register(tools.get_cpu_utilization)
+    with ToolSession(registry, max_result_chars=1000) as session:
+        result = session.execute([_use('a', 'get_cpu_utilization', instance_name='web-1', hours=5)])[0]
+    assert len(result['content']) <= 1000 + 20
+    summary = compact_result(tools.get_cpu_utilization('web-1', hours=5))
+    assert summary['count'] == 1000 and summary['max'] == 999.0 and len(summary['points']) == 60
+
+
+def test_run_agent_with_scripted_model():
+    tools = FakeTools()
+    model = ScriptedModel([
+        [('list_instances', {}), ('get_instance', {'instance_name': 'web-1'})],
+        'web-1 は稼働中です',
+    ])
+    with ToolSession(ToolRegistry.for_agent(tools)) as session:
+        result = run_agent(model, session, 'web-1 の状態は？', system='運用担当')
+
+    assert result['text'] == 'web-1 は稼働中です'
+    assert result['turns'] == 2
+    assert model.requests[0]['system'] == '運用担当'
+    tool_results = result['messages'][2]['content']
+    assert [r['tool_use_id'] for r in tool_results] == ['toolu_100', 'toolu_101']
+    assert json.loads(tool_results[0]['content']) == [{'name': 'web-1', 'status': 'RUNNING'}]
+
+
+def test_run_agent_stops_at_max_turns():
+    model = ScriptedModel([[('list_zones', {})]] * 3)
+    with ToolSession(ToolRegistry.for_agent(FakeTools())) as session:
+        result = run_agent(model, session, 'ゾーンは？', max_turns=3)
+    assert result['text'] is None and result['turns'] == 3
@@ -0,0 +1,85 @@
+"""TriageEngine の原因候補ランキング"""
+
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from agent.tools.monitoring import FLEET_METRICS, MonitoringTools
+from agent.tools.triage import TriageEngine
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def _points(values, step=60):
+    return [
+        {'timestamp': (START + timedelta(seconds=i * step)).isoformat(), 'value': float(v)}
+        for i, v in enumerate(values)
+    ]
+
+
+def _flat(length=60, seed=0):
+    rng = np.random.default_rng(seed)
+    return 10 + rng.normal(0, 0.5, length)
+
+
+def _step(at, length=60, seed=0):
+    values = _flat(length, seed)
+    values[at:] += 50
+    return values
+
+
+def test_ranks_instances_separately_across_projects():
+    # 同じインスタンス名が別プロジェクトにあっても別の候補になる
+    series = {
+        'p1/web-1': {'cpu': _points(_step(20, seed=1)), 'disk_read:persistent-disk-0': _points(_flat(seed=2))},
+        'p1/web-2': {'cpu': _points(_step(24, seed=3))},
+        'p2/web-1': {'cpu': _points(_flat(seed=4)), 'memory': _points(_step(26, seed=5))},
+    }
+    result = TriageEngine(step_seconds=60).analyze(series)
+    ranking = {item['instance']: item for item in result['ranking']}
+
+    assert result['series_count'] == 5
+    assert set(ranking) == {'p1/web-1', 'p1/web-2', 'p2/web-1'}
+    assert ranking['p1/web-1']['metric'] == 'cpu'
+    assert ranking['p2/web-1']['metric'] == 'memory'
+    # 最初に変化した p1/web-1 が先頭で、他プロジェクトの系列とも関連付く
+    assert result['ranking'][0]['instance'] == 'p1/web-1'
+    related = {item['series'] for item in ranking['p1/web-1']['related']}
+    assert {'p1/web-2/cpu', 'p2/web-1/memory'} <= related
+
+
+def test_metric_names_with_separators_are_kept():
+    series = {
+        'web-1': {'disk_write:persistent-disk-0': _points(_step(20, seed=6))},
+        'web-2': {'cpu': _points(_step(22, seed=7))},
+    }
+    result = TriageEngine(step_seconds=60).analyze(series)
+    ranking = {item['instance']: item for item in result['ranking']}
+    assert ranking['web-1']['metric'] == 'disk_write:persistent-disk-0'
+
+
+def test_no_change_gives_empty_ranking():
+    series = {'web-1': {'cpu': _points(_flat(seed=8))}, 'web-2': {'cpu': _points(_flat(seed=9))}}
+    assert TriageEngine(step_seconds=60).analyze(series)['ranking'] == []
+
+
+def _time_series(**labels):
+    return SimpleNamespace(
+        metric=SimpleNamespace(labels=labels),
+        metadata=SimpleNamespace(system_labels=SimpleNamespace(fields={})),
+        resource=SimpleNamespace(labels={'instance_id': '123'}),
+    )
+
+
+@pytest.mark.parametrize('metric', ['disk_read', 'disk_write'])
+def test_disk_io_series_are_named_per_device(metric):
+    assert 'metric.label.device_name' in FLEET_METRICS[metric]['group_by']
+    series = _time_series(instance_name='web-1', device_name='data-disk')
+    assert MonitoringTools._series_name(series) == 'web-1:data-disk'
+
+
+def test_series_name_without_device():
+    assert MonitoringTools._series_name(_time_series(instance_name='web-1')) == 'web-1'
+    assert MonitoringTools._series_name(_time_series(instance_name='web-1', device='/dev/sda1')) == 'web-1:/dev/sda1'